@@ -1,213 +1,276 @@
 import streamlit as st
-import pickle
 import os
-import openai
-import graphviz
-import re
-from llama_index import download_loader, VectorStoreIndex, ServiceContext
-from llama_hub.github_repo import GithubClient, GithubRepositoryReader
-from llama_index.llms import OpenAI
-import io
-import pdfkit
-import base64
-import markdown
+from artifacts import ArtifactStore
+from embedding import DEFAULT_CONCURRENCY
+from graph_sandbox import GraphSandbox
+from index_cache import IndexCache
+from index_pool import IndexPool
+from jobs import DONE, FAILED, JobQueue
+from ingestion import DEFAULT_EXCLUDES, DEFAULT_MAX_FILE_SIZE, LOCAL_ROOT, resolve_local_path
+from mapreduce import SummaryCache
+from pdf_export import PdfExporter
+from pipeline import (DIAGRAM_MODES, GENERATION_MODES, SOURCES, Pipeline, Settings, document_job, make_source,
+                      parse_github_url)
+from response_cache import ResponseCache
+from slides_export import SlidesExporter, is_configured as slides_configured
+from static_graph import AnalysisCache
+from tracing import METRICS_PORT, Tracer, new_trace_id, serve_metrics
+from warmup import is_ready, start_warmup
+import functools
+import json
+import time
+import uuid
 
 st.set_page_config(page_title="GitDoc", page_icon="✨", layout="wide", menu_items=None)
 
 
 @st.cache_resource(show_spinner=False)
-def get_loader():
-    download_loader("GithubRepositoryReader")
+def get_warmup():
+    # llama_index, openai and the pdf libraries are imported on first use, this loads them ahead of the first
+    # generation without blocking the first page
+    return start_warmup(tracer=get_tracer())
 
 
-def load_index(docs):
-    service_context = ServiceContext.from_defaults(llm=OpenAI(model=st.session_state.model, temperature=0,
-                                                              system_prompt="You are a software development expert who is helping write code documentation for different audiences"))
+@st.cache_resource(show_spinner=False)
+def get_artifact_store():
+    return ArtifactStore()
 
-    index = VectorStoreIndex.from_documents(docs, service_context=service_context)
-    return index
 
+@st.cache_resource(show_spinner=False)
+def get_pdf_exporter():
+    return PdfExporter(tracer=get_tracer())
 
-@st.cache_data
-def load_docs(owner, repo, branch):
-    """
-    Load the documents from the Github repository.
-    """
-    github_client = GithubClient(os.getenv("GITHUB_TOKEN"))
-    loader = GithubRepositoryReader(
-        github_client,
-        owner=owner,
-        repo=repo,
-        filter_file_extensions=([".py"], GithubRepositoryReader.FilterType.INCLUDE),
-        verbose=True,
-        concurrent_requests=10,
-    )
 
-    docs = loader.load_data(branch=branch)
+@st.cache_resource(show_spinner=False)
+def get_slides_exporter():
+    return SlidesExporter(tracer=get_tracer())
 
-    return docs
 
+@st.cache_resource(show_spinner=False)
+def get_tracer():
+    tracer = Tracer()
+    if METRICS_PORT:
+        # spans of all sessions, scraped by Prometheus from GITDOC_METRICS_PORT
+        serve_metrics(tracer, METRICS_PORT, ready=is_ready)
+    return tracer
 
-def _process_code_block(block):
-    """
-    Process a code block so it can be executed by Streamlit.
-    Args:
-    - block (str): The extracted code block
-    Returns:
-    - str: Processed code block
-    """
 
-    block = block.replace('python', '').strip()
+@st.cache_resource(show_spinner=False)
+def get_graph_sandbox():
+    return GraphSandbox()
+
 
-    # if there are lines that start with dot.save, dot.render or dot.view, remove them
-    block = re.sub(r'dot\.(save|render|view)\(.*?\)', '', block)
+@st.cache_resource(show_spinner=False)
+def get_analysis_cache():
+    return AnalysisCache()
 
-    # add st.header('Flowchart Diagram') as the first line of the extracted code
-    block = 'st.write("")\n' + 'st.header("Flowchart Diagram")\n' + block
 
-    # add the following lines to the end of the extracted code to save the graphviz as png
-    block += "\nimage_filename = 'flowchart'"
-    block += "\ndot.format = 'png'"
-    block += "\ndot.render(filename=image_filename, view=False)"
+@st.cache_resource(show_spinner=False)
+def get_index_cache():
+    return IndexCache()
 
-    if 'st.graphviz_chart(dot, use_container_width=True)' not in block:
-        # add to the end of the extracted code
-        # show the graphviz chart in Streamlit
-        block += '\nst.graphviz_chart(dot, use_container_width=True)'
-        # save dot object to session state
-        block += '\nst.session_state.dot = dot'
 
-    return block
+@st.cache_resource(show_spinner=False)
+def get_index_pool():
+    return IndexPool()
 
 
-def extract_code(gpt_response):
+def get_settings():
     """
-    Extract code or SQL query from a GPT response.
-    Args:
-    - gpt_response (str): The string response from GPT
-    Returns:
-    - str: Extracted code or SQL query
+    Return the documentation settings selected in the sidebar.
     """
+    return Settings(model=st.session_state.model, audience=st.session_state.audience,
+                    file_types=st.session_state.file_types, excludes=st.session_state.excludes,
+                    max_file_size=st.session_state.max_file_size,
+                    embed_concurrency=st.session_state.embed_concurrency,
+                    generation_mode=st.session_state.generation_mode,
+                    diagram_mode=st.session_state.diagram_mode,
+                    refine_diagram=st.session_state.refine_diagram,
+                    use_response_cache=st.session_state.use_response_cache)
 
-    # Search for text blocks enclosed by ```
-    pattern = r'```(.*?)```'
-    extracted_code_list = re.findall(pattern, gpt_response, re.DOTALL)
 
-    # If no code blocks are found, return an empty string
-    if not extracted_code_list:
-        return ""
+def get_pipeline(settings=None, trace_id=None):
+    """
+    Build the documentation pipeline with the caches shared by all sessions.
+    """
+    return Pipeline(settings or get_settings(), trace_id=trace_id, api_key=st.session_state.gpt_key or None,
+                    **get_shared_caches())
 
-    # If there's only one block, process and return it
-    if len(extracted_code_list) == 1:
-        return _process_code_block(extracted_code_list[0])
 
-    # If bash is in the first code block (indicating pip install or similar commands),
-    # and there's a second block, return the second block
-    if "bash" in extracted_code_list[0] and len(extracted_code_list) > 1:
-        return _process_code_block(extracted_code_list[1])
+def get_shared_caches():
+    return dict(index_cache=get_index_cache(), response_cache=get_response_cache(),
+                summary_cache=get_summary_cache(), analysis_cache=get_analysis_cache(),
+                graph_sandbox=get_graph_sandbox(), index_pool=get_index_pool(), tracer=get_tracer())
 
-    # In other cases, just return the first block
-    return _process_code_block(extracted_code_list[0])
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    return ResponseCache()
+
+
+@st.cache_resource(show_spinner=False)
+def get_summary_cache():
+    return SummaryCache()
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    # the runner gets the shared caches here, job threads have no Streamlit script context
+    return JobQueue(functools.partial(document_job, **get_shared_caches()))
 
 
 def on_submit_button_click():
 
-    # set the openai api key and github token
-    openai.api_key = st.session_state.gpt_key
-    os.environ['GITHUB_TOKEN'] = st.session_state.github_token
+    if st.session_state.source == 'Local Path':
+        # only directories under GITDOC_LOCAL_ROOT, the app is open to anyone who can reach it
+        local_path = resolve_local_path(st.session_state.local_path)
+        if local_path is None:
+            st.error(f"Please enter an existing directory under {LOCAL_ROOT}.")
+            return
+        st.session_state.local_path = local_path
+        st.session_state.owner = 'local'
+        st.session_state.repo = os.path.basename(local_path)
+        st.session_state.branch = 'local'
+    else:
+        # parse the github url
+        try:
+            st.session_state.owner, st.session_state.repo, st.session_state.branch = \
+                parse_github_url(st.session_state['github_url'])
+        except:
+            st.error("Please enter a valid Github URL.")
+            return
+
+    if not st.session_state.file_types:
+        st.error("Please select at least one file type.")
+        return
 
-    # parse the github url
+    # resolve the branch here, so the job is pinned to a commit and duplicate requests share one job
+    trace_id = new_trace_id()
+    source = make_source(st.session_state.source, st.session_state.owner, st.session_state.repo,
+                         st.session_state.branch, local_path=st.session_state.local_path,
+                         token=st.session_state.github_token or None)
     try:
-        parse_github_url(st.session_state['github_url'])
-    except:
-        st.error("Please enter a valid Github URL.")
+        with get_tracer().span('resolve', trace_id=trace_id):
+            commit_sha = source.resolve()
+    except Exception as e:
+        # e.g. a missing branch or repository, or a token without access to it
+        st.error(f"Could not resolve {source.owner}/{source.repo}@{st.session_state.branch}: {e}")
         return
+    settings = get_settings().to_dict()
+    params = {"settings": settings, "source": st.session_state.source, "owner": st.session_state.owner,
+              "repo": st.session_state.repo, "branch": st.session_state.branch,
+              "local_path": st.session_state.local_path, "commit_sha": commit_sha, "trace_id": trace_id}
+    # sessions asking for the same commit and settings join one job, which runs on the keys of the first.
+    # The commit was resolved with this session's token, so it has access to the repository
+    secrets = {"openai_api_key": st.session_state.gpt_key or None,
+               "github_token": st.session_state.github_token or None}
+    key = JobQueue.make_key(st.session_state.source, source.owner, source.repo, commit_sha,
+                            json.dumps(settings, sort_keys=True))
+
+    # a new generation needs a new diagram and pdf, the exports must not pick up the previous diagram.
+    # Only reset once the request is valid, an invalid one keeps showing the previous documentation
+    st.session_state.generated_graph = False
+    st.session_state.graph_error = None
+    st.session_state.pdf_requested = False
+    st.session_state.slides_requested = False
+    get_artifact_store().delete(st.session_state.session_id, 'flowchart.png')
+    st.session_state.pop('output_text', None)
 
-    docs = load_docs(owner=st.session_state.owner, repo=st.session_state.repo, branch=st.session_state.branch)
+    # the work runs on the job queue, the script only polls the job, see poll_job
+    # the keys stay in memory with the job instead of the process-wide openai module and environment
+    st.session_state.job_id = get_job_queue().submit(key, params, secrets=secrets)
+    st.session_state.commit_sha = commit_sha
 
-    index = load_index(docs)
-    chat_engine = index.as_chat_engine(chat_mode='context')
-    # save chat engine to session state
-    st.session_state.chat_engine = chat_engine
 
-    doc_prompt = f"""
-    Generate clear, concise, and comprehensive documentation for the code in context ensuring you explain its
-    functionality, usage, parameters, and any potential edge cases or limitations. Also, make sure to include any dependencies,
-    data sources or APIs that are used.
-    The documentation should be written for a {st.session_state.audience} audience.
+def poll_job():
     """
-
-    doc_response = chat_engine.stream_chat(doc_prompt)
-
-    full_response = []
-
-    for token in doc_response.response_gen:
-        full_response.append(token)
-        result = "".join(full_response).strip()
+    Show the progress and the streamed text of this session's generation job, and pick up its result.
+    """
+    job = get_job_queue().get(st.session_state.job_id)
+    if job is None:
+        st.session_state.job_id = None
+        st.error("The documentation job has expired, please generate again.")
+    elif job['status'] == FAILED:
+        st.session_state.job_id = None
+        st.error(f"Documentation failed: {job['error']}")
+    elif job['status'] == DONE:
+        st.session_state.job_id = None
+        result = job['result']
+        # a duplicate request gets the result of the job that ran, and continues its trace
+        st.session_state.trace_id = result.get('trace_id')
+        pipeline = get_pipeline(Settings(**job['params']['settings']), trace_id=result.get('trace_id'))
+        # the index is shared with other sessions through the index pool, the session only keeps its key
+        index = pipeline.cached_index(result['index_key'], holder=st.session_state.session_id)
+        if index is None:
+            st.error("The index of this job was evicted from the cache, please generate again.")
+            return
+        get_index_pool().release(st.session_state.session_id, keep=result['index_key'])
+        st.session_state.index_key = result['index_key']
+        st.session_state.chat_engine = pipeline.chat_engine(index)
+        st.session_state.output_text = job['output']
+        st.session_state.stream_metrics = result['metrics']
+    else:
         with streaming_box.container():
-            st.markdown(result)
+            st.progress(job['progress'], text=job['message'] or 'Waiting for a free worker...⏳')
+            # map-reduce shows its file and package summaries until the documentation streams
+            if job['summary'] is not None and not job['output']:
+                summary = job['summary']
+                with st.expander(f"{summary['kind'].capitalize()} summary: {summary['name']}", expanded=True):
+                    st.markdown(summary['text'])
+            st.markdown(job['output'])
+        time.sleep(0.5)
+        st.rerun()
+
 
-    # Concatenate and store the streamed chunks to a full response
-    st.session_state.output_text = "".join(full_response).strip()
+def on_retry_graph_click():
+    st.session_state.graph_error = None
 
 
 def generate_graph():
     with st.spinner('Generating flowchart diagram...⏳'):
-        diagram_prompt = f"""
-        Create flowchart diagram for the code in context using Graphviz in Python.
-        Ensure that the diagram is clear and shows the most important parts of the code.
-        Use common naming conventions, and DO NOT render the dot variable.
-        DO NOT include pip install steps.
-        The diagram should be written for a {st.session_state.audience} audience.
-        """
-
-        # call LLM to get the diagram response
-        diagram_response = st.session_state.chat_engine.chat(diagram_prompt)
-
-        # extract code from response
-        extracted_code = extract_code(diagram_response.response)
-
-        try:
-            exec(extracted_code)
+        pipeline = get_pipeline(trace_id=st.session_state.trace_id)
+        index = pipeline.cached_index(st.session_state.index_key, holder=st.session_state.session_id)
+        if index is None:
+            get_artifact_store().delete(st.session_state.session_id, 'flowchart.png')
+            st.session_state.graph_error = "The index was evicted from the cache, please generate again."
+            return
+        result = pipeline.generate_graph(index, st.session_state.chat_engine, st.session_state.output_text)
+
+        if result['ok']:
+            st.session_state.dot_source = result['dot_source']
+            # keep the png in memory for this session instead of a shared file in the working directory
+            get_artifact_store().put(st.session_state.session_id, 'flowchart.png', result['png'])
             st.session_state['generated_graph'] = True
-        except Exception as e:
-            pass
-
-
-def get_binary_file_downloader_html(bin_file, file_label='File'):
-    """function to create a URL for the user to download a file"""
-
-    with open(bin_file, 'rb') as f:
-        data = f.read()
-    bin_str = base64.b64encode(data).decode()
-    href = f'<a href="data:application/octet-stream;base64,' \
-           f'{bin_str}" download="{os.path.basename(bin_file)}">{file_label}</a>'
-
-    return href
-
-
-def parse_github_url(url):
-    # Regex pattern to match the structure of GitHub URL
-    pattern = re.compile(r"https?://github\.com/(?P<owner>[^/]+)/(?P<repo>[^/]+)(/tree/(?P<branch>[^/]+))?")
 
-    match = pattern.match(url)
-    if not match:
-        raise ValueError("Invalid GitHub URL")
-
-    # Extract the components from the URL
-    st.session_state.owner = match.group('owner')
-    st.session_state.repo = match.group('repo')
-    st.session_state.branch = match.group('branch') if match.group('branch') else 'main'
+            st.write("")
+            st.header("Flowchart Diagram")
+            st.graphviz_chart(result['dot_source'], use_container_width=True)
+        else:
+            get_artifact_store().delete(st.session_state.session_id, 'flowchart.png')
+            # kept in the session, so the reruns of the export polling do not generate it again
+            st.session_state.graph_error = f"Could not generate the flowchart diagram: {result['error']}"
 
 
-# download github loader
-get_loader()
+# load the heavy dependencies and shared resources in the background
+get_warmup()
 
 # check if the session state variables are initialized
+if "pdf_requested" not in st.session_state:
+    st.session_state.pdf_requested = False
+if "slides_requested" not in st.session_state:
+    st.session_state.slides_requested = False
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+if "trace_id" not in st.session_state:
+    st.session_state.trace_id = None
 if "chat_engine" not in st.session_state:
     st.session_state.chat_engine = None
 if "generated_graph" not in st.session_state:
     st.session_state.generated_graph = False
+if "graph_error" not in st.session_state:
+    st.session_state.graph_error = None
 if 'owner' not in st.session_state:
     st.session_state.owner = None
 if 'repo' not in st.session_state:
@@ -220,6 +283,28 @@ if 'github_token' not in st.session_state:
     st.session_state.github_token = None
 if 'model' not in st.session_state:
     st.session_state.model = None
+if 'embed_concurrency' not in st.session_state:
+    st.session_state.embed_concurrency = DEFAULT_CONCURRENCY
+if 'generation_mode' not in st.session_state:
+    st.session_state.generation_mode = 'Retrieval'
+if 'index_key' not in st.session_state:
+    st.session_state.index_key = None
+if 'use_response_cache' not in st.session_state:
+    st.session_state.use_response_cache = True
+if 'diagram_mode' not in st.session_state:
+    st.session_state.diagram_mode = 'LLM Flowchart'
+if 'refine_diagram' not in st.session_state:
+    st.session_state.refine_diagram = False
+if 'source' not in st.session_state:
+    st.session_state.source = 'GitHub API'
+if 'local_path' not in st.session_state:
+    st.session_state.local_path = None
+if 'file_types' not in st.session_state:
+    st.session_state.file_types = ['.py']
+if 'excludes' not in st.session_state:
+    st.session_state.excludes = DEFAULT_EXCLUDES
+if 'max_file_size' not in st.session_state:
+    st.session_state.max_file_size = DEFAULT_MAX_FILE_SIZE
 
 st.title('GitDoc - Generate Code Documentation In a Snap')
 
@@ -246,12 +331,73 @@ with st.sidebar:
 
     st.subheader('GitHub Repository')
     st.session_state['github_url'] = st.text_input("GitHub URL",  help="Enter the URL of the GitHub repository you want to generate documentation for.")
+    # Local Path reads from the server's disk and is only offered when an operator set GITDOC_LOCAL_ROOT
+    sources = SOURCES if LOCAL_ROOT else [source for source in SOURCES if source != 'Local Path']
+    st.session_state.source = st.radio('Source', sources, horizontal=True,
+                                       help="GitHub API fetches files one by one, Archive Download fetches a single "
+                                            "tarball of the commit, Local Path reads an existing checkout on the server.")
+    if st.session_state.source == 'Local Path':
+        st.session_state.local_path = st.text_input("Local Path", help=f"Directory of a checkout under {LOCAL_ROOT} "
+                                                                       f"on the server.")
 
     st.write('')
     with st.expander('Advanced'):
-        file_types = st.multiselect(label='File Types', options=file_types_list, default='.py')
+        st.session_state.file_types = st.multiselect(label='File Types', options=file_types_list, default='.py')
+        excludes = st.text_area('Exclude Paths', value='\n'.join(DEFAULT_EXCLUDES),
+                                help="Glob patterns of files to skip, one per line.")
+        st.session_state.excludes = [line.strip() for line in excludes.splitlines() if line.strip()]
+        st.session_state.max_file_size = st.number_input('Max File Size (KB)', min_value=1,
+                                                         value=DEFAULT_MAX_FILE_SIZE // 1024) * 1024
+        st.session_state.embed_concurrency = st.number_input('Embedding Concurrency', min_value=1, max_value=16,
+                                                             value=DEFAULT_CONCURRENCY,
+                                                             help="Number of embedding requests sent at once.")
         st.session_state.model = st.selectbox('Model', ['gpt-4', 'gpt-4-1106-preview', 'gpt-3.5-turbo'])
         st.session_state.audience = st.selectbox('Audience', ['technical', 'non-technical'])
+        st.session_state.generation_mode = st.selectbox('Generation Mode', GENERATION_MODES,
+                                                        help="Retrieval documents the most relevant chunks in one "
+                                                             "request. Map-Reduce summarizes every file, then every "
+                                                             "package, then the whole repository.")
+        st.session_state.diagram_mode = st.selectbox('Diagram', DIAGRAM_MODES,
+                                                     help="Static graphs are built instantly from the Python AST "
+                                                          "of the indexed files.")
+        st.session_state.refine_diagram = st.checkbox('Refine Static Diagram with LLM', value=False,
+                                                      help="Let the LLM relabel and prune the static graph.")
+        st.session_state.use_response_cache = st.checkbox('Use Response Cache', value=True,
+                                                          help="Replay stored responses for the same repo, model, "
+                                                               "audience and prompt. Uncheck to regenerate.")
+        response_cache_stats = get_response_cache().stats()
+        st.caption(f"Response cache: {response_cache_stats['hits']} hits, {response_cache_stats['misses']} misses, "
+                   f"{response_cache_stats['entries']} responses stored")
+        if 'stream_metrics' in st.session_state:
+            stream_metrics = st.session_state.stream_metrics
+            st.caption(f"Last generation: {stream_metrics['tokens']} tokens at "
+                       f"{stream_metrics['tokens_per_sec']:.1f} tokens/s, {stream_metrics['renders']} renders")
+        index_cache_stats = get_index_cache().stats()
+        st.caption(f"Index cache: {index_cache_stats['hits']} hits, {index_cache_stats['misses']} misses, "
+                   f"{index_cache_stats['updates']} incremental updates, {index_cache_stats['entries']} indexes stored")
+        index_pool_stats = get_index_pool().stats()
+        st.caption(f"Index pool: {index_pool_stats['entries']} indexes in memory, "
+                   f"{index_pool_stats['bytes'] / 1024 ** 2:,.0f} of {index_pool_stats['max_bytes'] / 1024 ** 2:,.0f} MB, "
+                   f"{index_pool_stats['evictions']} evicted")
+        if index_pool_stats['indexes']:
+            st.dataframe([{'Index': index['label'], 'MB': round(index['bytes'] / 1024 ** 2, 1),
+                           'Sessions': index['refs']} for index in index_pool_stats['indexes']],
+                         hide_index=True, use_container_width=True)
+        job_stats = get_job_queue().stats()
+        st.caption(f"Jobs: {job_stats['running']} running, {job_stats['queued']} queued")
+        if st.checkbox('Show Trace', value=False,
+                       help="Time, tokens, bytes, cache hits and errors of each step of the last generation."):
+            spans = get_tracer().spans(st.session_state.trace_id) if st.session_state.trace_id else []
+            if spans:
+                st.dataframe([{'Step': span['name'], 'ms': round(span['seconds'] * 1000),
+                               'First Token ms': round(span['first_item_seconds'] * 1000)
+                               if 'first_item_seconds' in span and span.get('tokens') else None,
+                               'Cache Hit': span.get('cache_hit'), 'Tokens': span.get('tokens'),
+                               'KB': round(span['bytes'] / 1024, 1) if span.get('bytes') else None,
+                               'Error': span['error']} for span in spans],
+                             hide_index=True, use_container_width=True)
+            else:
+                st.caption("No generation traced yet.")
 
     st.write('')
     run_button = st.button('Generate Documentation', on_click=on_submit_button_click)
@@ -259,6 +405,10 @@ with st.sidebar:
 # For Showing the Streaming Output
 streaming_box = st.empty()
 
+# Poll the running generation job
+if st.session_state.job_id is not None:
+    poll_job()
+
 # For Showing the Completed Output
 if 'output_text' in st.session_state:
     st.markdown(st.session_state['output_text'])
@@ -269,48 +419,64 @@ if 'output_text' in st.session_state:
             st.write('')
             st.header("Flowchart Diagram")
             st.write('')
-            st.graphviz_chart(st.session_state.dot, use_container_width=True)
-        except:
-            pass
+            st.graphviz_chart(st.session_state.dot_source, use_container_width=True)
+        except Exception as e:
+            # recorded instead of skipped, so failed diagrams show up in the trace and the metrics
+            get_tracer().record('display_graph', 0.0, trace_id=st.session_state.trace_id,
+                                error=f"{type(e).__name__}: {e}")
+            st.warning(f"Could not display the flowchart diagram: {e}")
     else:
         st.write('')
-        generate_graph()
+        if st.session_state.graph_error is None:
+            generate_graph()
+        if st.session_state.graph_error is not None:
+            st.warning(st.session_state.graph_error)
+            st.button('Retry Diagram', on_click=on_retry_graph_click)
 
     # download pdf button
     with st.sidebar:
-        download_button = st.button('Download PDF')
-
-        if download_button:
-
-            #config = pdfkit.configuration(wkhtmltopdf="C:\\Program Files\\wkhtmltopdf\\bin\\wkhtmltopdf.exe")
-
-            # convert markdown to html for pdf export
-            html_output = markdown.markdown(st.session_state['output_text'])
-
-            # check if flowchart.png exists
-            if os.path.exists('flowchart.png'):
-                #append diagram image to html
-                image_path = "flowchart.png"
-
-                # Convert image to base64 encoding
-                with open(image_path, "rb") as image_file:
-                    encoded_image_data = base64.b64encode(image_file.read()).decode('utf-8')
-
-                # Embed the base64 encoded image in HTML
-                html_output += f'<img src="data:image/png;base64,{encoded_image_data}" alt="Flowchart diagram" />'
-
-            file_name = f"{st.session_state.owner}_{st.session_state.repo}_{st.session_state.branch}.pdf"
-            pdfkit.from_string(html_output, file_name)
-
-            # with open('output.pdf', 'rb') as f:
-            #     st.download_button(label="Download PDF", data=f, file_name='output.pdf', mime='application/pdf')
-
-            st.markdown(get_binary_file_downloader_html(file_name, file_name), unsafe_allow_html=True)
-
-            # clean up
-            os.remove(file_name)
-            os.remove('flowchart.png')
-            os.remove('flowchart')
+        if st.button('Download PDF'):
+            st.session_state.pdf_requested = True
+
+        if st.session_state.pdf_requested:
+            # rendering runs on the exporter's worker pool, the script only polls for the result
+            flowchart_png = get_artifact_store().get(st.session_state.session_id, 'flowchart.png')
+            pdf_future = get_pdf_exporter().submit(st.session_state['output_text'], flowchart_png,
+                                                   trace_id=st.session_state.trace_id)
+
+            if not pdf_future.done():
+                st.caption('Preparing PDF...⏳')
+                time.sleep(0.5)
+                st.rerun()
+            elif pdf_future.exception() is not None:
+                st.error(f"PDF export failed: {pdf_future.exception()}")
+                st.session_state.pdf_requested = False
+            else:
+                file_name = f"{st.session_state.owner}_{st.session_state.repo}_{st.session_state.branch}.pdf"
+                st.download_button('Save PDF', data=pdf_future.result(), file_name=file_name,
+                                   mime='application/pdf')
+
+        # only offered when a template deck and a service account are configured, see slides_export
+        if slides_configured():
+            if st.button('Export to Slides'):
+                st.session_state.slides_requested = True
+
+            if st.session_state.slides_requested:
+                # the deck is built on the exporter's worker pool with one batchUpdate
+                flowchart_png = get_artifact_store().get(st.session_state.session_id, 'flowchart.png')
+                title = f"{st.session_state.owner}/{st.session_state.repo} ({st.session_state.branch})"
+                slides_future = get_slides_exporter().submit(title, st.session_state['output_text'], flowchart_png,
+                                                             trace_id=st.session_state.trace_id)
+
+                if not slides_future.done():
+                    st.caption('Building slides...⏳')
+                    time.sleep(0.5)
+                    st.rerun()
+                elif slides_future.exception() is not None:
+                    st.error(f"Slides export failed: {slides_future.exception()}")
+                    st.session_state.slides_requested = False
+                else:
+                    st.link_button('Open Slides', slides_future.result()['url'])
 
 
 
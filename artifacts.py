@@ -0,0 +1,71 @@
+import threading
+import time
+
+
+DEFAULT_TTL = 3600
+CLEANUP_INTERVAL = 300
+
+
+class ArtifactStore:
+    """
+    Keeps rendered artifacts (flowchart PNGs, PDFs) per browser session.
+
+    Artifacts are held as in-memory bytes, so concurrent sessions never share files in the
+    working directory. A background thread drops sessions that have been idle for longer than the TTL.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, cleanup_interval=CLEANUP_INTERVAL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._cleaner = threading.Thread(target=self._cleanup_loop, args=(cleanup_interval,), daemon=True)
+        self._cleaner.start()
+
+    def _session(self, session_id):
+        # caller must hold the lock
+        session = self._sessions.setdefault(session_id, {"artifacts": {}, "last_access": 0.0})
+        session["last_access"] = time.monotonic()
+        return session
+
+    def put(self, session_id, name, data):
+        """
+        Store artifact bytes for a session.
+        Args:
+        - session_id (str): Id of the browser session
+        - name (str): Artifact name, e.g. "flowchart.png"
+        - data (bytes): Artifact content
+        """
+        with self._lock:
+            self._session(session_id)["artifacts"][name] = data
+
+    def get(self, session_id, name):
+        """
+        Return artifact bytes, or None if the session has no such artifact.
+        """
+        with self._lock:
+            return self._session(session_id)["artifacts"].get(name)
+
+    def delete(self, session_id, name):
+        """
+        Drop an artifact, e.g. a diagram that no longer belongs to the session's documentation.
+        """
+        with self._lock:
+            self._session(session_id)["artifacts"].pop(name, None)
+
+    def cleanup(self):
+        """
+        Drop sessions that have been idle for longer than the TTL.
+        Returns:
+        - int: Number of sessions removed
+        """
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if session["last_access"] < cutoff]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+    def _cleanup_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self.cleanup()
@@ -0,0 +1,15 @@
+import os
+import platform
+import subprocess
+import time
+
+
+def environment():
+    """Describe the machine and revision a benchmark ran on, stored with its results."""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {"revision": revision, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "timestamp": time.time()}
@@ -0,0 +1,344 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from llama_index import ServiceContext
+from llama_index.bridge.pydantic import Field
+from llama_index.embeddings.base import BaseEmbedding
+from llama_index.llms import CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.llms.base import llm_completion_callback
+
+from chunking import CodeNodeParser
+from ingestion import _blob_sha
+from pipeline import Pipeline
+
+
+_WORDS = ("the", "function", "returns", "module", "class", "parameter", "request", "cache", "index", "file",
+          "value", "error", "when", "each", "list", "string", "configuration", "is", "called", "with", "and")
+
+
+def _seed(text):
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def synthetic_repo(root, files=50, lines_per_file=200, packages=5, seed=0):
+    """
+    Write a Python repository of a given size: packages of modules that import each other,
+    with classes and functions calling functions of the imported modules.
+    Args:
+    - root (str): Directory to write into
+    - files (int): Number of modules
+    - lines_per_file (int): Approximate number of lines per module
+    - packages (int): Number of packages the modules are spread over
+    - seed (int): Same seed, same repository
+    Returns:
+    - list: Paths of the written files, relative to root
+    """
+    rng = random.Random(seed)
+    modules = [(f"pkg_{i % packages}", f"mod_{i}") for i in range(files)]
+    paths = []
+    for package in sorted({package for package, _ in modules}):
+        os.makedirs(os.path.join(root, package), exist_ok=True)
+        with open(os.path.join(root, package, "__init__.py"), "w") as f:
+            f.write(f'"""Package {package}."""\n')
+        paths.append(f"{package}/__init__.py")
+
+    # each function is about 8 lines
+    functions = max(1, lines_per_file // 8)
+    for i, (package, module) in enumerate(modules):
+        imported = rng.sample([m for m in modules if m[1] != module], min(2, len(modules) - 1))
+        lines = [f'"""Module {module}: synthetic code for benchmarks."""', "import os", ""]
+        lines += [f"from {p} import {m}" for p, m in imported]
+        lines += ["", "", f"class {module.title().replace('_', '')}Handler:",
+                  "    def __init__(self, name):", "        self.name = name", "",
+                  "    def handle(self, value):", "        return f_0(value) + len(self.name)", "", ""]
+        for j in range(functions):
+            callee = f"{rng.choice(imported)[1]}.f_{rng.randrange(functions)}(value - 1)" if imported else "value"
+            lines += [f"def f_{j}(value):",
+                      f'    """Compute step {j} of {module} for a value."""',
+                      "    if value <= 0:",
+                      f"        return {j}",
+                      f"    total = value * {rng.randint(2, 9)} + len(os.sep)",
+                      f"    return total + {callee}",
+                      "", ""]
+        path = f"{package}/{module}.py"
+        with open(os.path.join(root, path), "w") as f:
+            f.write("\n".join(lines))
+        paths.append(path)
+
+    with open(os.path.join(root, "README.md"), "w") as f:
+        f.write("# Synthetic repository\n")
+    paths.append("README.md")
+    return paths
+
+
+class FakeGithubServer:
+    """
+    Local HTTP server answering the Github REST API calls made by the ingestion sources.
+
+    Serves the branch, commit, tree, blob and tarball endpoints for the files of a directory,
+    so GithubApiSource and ArchiveSource run without network access. Pass `url` as the
+    base_url of the GithubClient. An optional latency is added to every response, and
+    `max_tree_entries` truncates recursive tree listings like Github does for large trees.
+    """
+
+    def __init__(self, root, owner="bench", repo="synthetic", branch="main", latency=0.0, max_tree_entries=100000):
+        self.root = os.path.abspath(root)
+        self.owner = owner
+        self.repo = repo
+        self.branch = branch
+        self.latency = latency
+        self.max_tree_entries = max_tree_entries
+        self.requests = 0
+        self._blobs = {}  # sha -> content
+        self._trees = {}  # sha -> tree entries
+        self.tree_sha = self._add_tree(self.root)
+        self.commit_sha = hashlib.sha1(f"commit {self.tree_sha}".encode("utf-8")).hexdigest()
+        self._tarball = None
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def _add_tree(self, directory):
+        entries = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                entries.append({"path": name, "mode": "040000", "type": "tree", "sha": self._add_tree(path)})
+            else:
+                with open(path, "rb") as f:
+                    content = f.read()
+                sha = _blob_sha(content)
+                self._blobs[sha] = content
+                entries.append({"path": name, "mode": "100644", "type": "blob", "sha": sha, "size": len(content)})
+        sha = hashlib.sha1(json.dumps(entries, sort_keys=True).encode("utf-8")).hexdigest()
+        self._trees[sha] = entries
+        return sha
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _api(self, kind, sha):
+        return f"{self.url}/repos/{self.owner}/{self.repo}/{kind}/{sha}"
+
+    def tarball(self):
+        """Return the gzipped tarball of the files, wrapped in one directory like Github's."""
+        with self._lock:
+            if self._tarball is None:
+                buffer = io.BytesIO()
+                with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+                    archive.add(self.root, arcname=f"{self.owner}-{self.repo}-{self.commit_sha[:7]}")
+                self._tarball = buffer.getvalue()
+            return self._tarball
+
+    def _flat_tree(self, sha, prefix=""):
+        entries = []
+        for entry in self._trees[sha]:
+            entries.append({**entry, "path": prefix + entry["path"]})
+            if entry["type"] == "tree":
+                entries.extend(self._flat_tree(entry["sha"], prefix + entry["path"] + "/"))
+        return entries
+
+    def respond(self, path):
+        """
+        Return (status, content type, body) for a request path, with an optional query string.
+        """
+        path, _, query = path.partition("?")
+        prefix = f"/repos/{self.owner}/{self.repo}/"
+        if not path.startswith(prefix):
+            return 404, "application/json", b'{"message": "Not Found"}'
+        kind, _, name = path[len(prefix):].rpartition("/")
+
+        if kind == "branches" and name == self.branch:
+            body = {"name": self.branch,
+                    "commit": {"sha": self.commit_sha, "commit": {"tree": {"sha": self.tree_sha}}},
+                    "_links": {"self": self._api("branches", name), "html": self._api("branches", name)}}
+        elif kind == "commits" and name == self.commit_sha:
+            body = {"sha": self.commit_sha, "url": self._api("commits", name),
+                    "commit": {"tree": {"sha": self.tree_sha}}}
+        elif kind == "git/trees" and name in self._trees:
+            entries, truncated = self._trees[name], False
+            if "recursive=1" in query.split("&"):
+                entries = self._flat_tree(name)
+                truncated = len(entries) > self.max_tree_entries
+                entries = entries[:self.max_tree_entries]
+            tree = [{**entry, "url": self._api("git/" + entry["type"] + "s", entry["sha"])} for entry in entries]
+            body = {"sha": name, "url": self._api(kind, name), "tree": tree, "truncated": truncated}
+        elif kind == "git/blobs" and name in self._blobs:
+            content = self._blobs[name]
+            body = {"sha": name, "url": self._api(kind, name), "node_id": name, "size": len(content),
+                    "encoding": "base64", "content": base64.b64encode(content).decode("ascii")}
+        elif kind == "tarball" and name == self.commit_sha:
+            return 200, "application/gzip", self.tarball()
+        else:
+            return 404, "application/json", b'{"message": "Not Found"}'
+        return 200, "application/json", json.dumps(body).encode("utf-8")
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                status, content_type, body = server.respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakeEmbedding(BaseEmbedding):
+    """
+    Deterministic embedding model: identifiers of the text are hashed into the dimensions,
+    so texts sharing names get similar vectors and retrieval still behaves like with real embeddings.
+    """
+
+    dim: int = Field(default=1536, description="Embedding dimension")
+    latency: float = Field(default=0.0, description="Seconds added to every request")
+
+    @classmethod
+    def class_name(cls):
+        return "FakeEmbedding"
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = _seed(token)
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if not norm:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def _get_query_embedding(self, query):
+        return self._embed(query)
+
+    def _get_text_embedding(self, text):
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def _aget_query_embedding(self, query):
+        return self._embed(query)
+
+    async def _aget_text_embeddings(self, texts):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+
+class FakeLLM(CustomLLM):
+    """
+    Deterministic LLM: the same prompt always gets the same response.
+
+    Documentation prompts get markdown of a fixed number of tokens built from the identifiers in
+    the prompt, flowchart prompts a Graphviz code block and refine prompts their DOT graph back.
+    An optional delay per token simulates generation speed.
+    """
+
+    tokens: int = Field(default=400, description="Tokens per documentation response")
+    token_delay: float = Field(default=0.0, description="Seconds between streamed tokens")
+    model_name: str = Field(default="fake-llm")
+
+    @classmethod
+    def class_name(cls):
+        return "FakeLLM"
+
+    @property
+    def metadata(self):
+        return LLMMetadata(context_window=8192, num_output=self.tokens, model_name=self.model_name)
+
+    def _tokens(self, prompt):
+        names = sorted(set(re.findall(r"def (\w+)|class (\w+)", prompt)) - {("", "")})
+        names = ["".join(name) for name in names][:40]
+        if "Graphviz DOT graph" in prompt:
+            match = re.search(r"((?:strict\s+)?(?:di)?graph\b.*\})", prompt, re.DOTALL)
+            return ["```dot\n", match.group(1) if match else "digraph {}", "\n```"]
+        if "Graphviz" in prompt:
+            nodes = names[:12] or ["start", "end"]
+            code = ["import graphviz", "dot = graphviz.Digraph()"]
+            code += [f"dot.node({name!r})" for name in nodes]
+            code += [f"dot.edge({a!r}, {b!r})" for a, b in zip(nodes, nodes[1:])]
+            return ["```python\n", "\n".join(code), "\n```"]
+
+        rng = random.Random(_seed(prompt))
+        vocabulary = list(_WORDS) + [f"`{name}`" for name in names]
+        tokens = []
+        for i in range(self.tokens):
+            if i % 80 == 0:
+                tokens.append(f"\n\n## {rng.choice(names) if names else 'Overview'}\n\n")
+            else:
+                tokens.append(" " + rng.choice(vocabulary))
+        return tokens
+
+    @llm_completion_callback()
+    def complete(self, prompt, formatted=False, **kwargs):
+        return CompletionResponse(text="".join(self._tokens(prompt)))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        def gen():
+            text = ""
+            for token in self._tokens(prompt):
+                if self.token_delay:
+                    time.sleep(self.token_delay)
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+
+        return gen()
+
+
+class FakePipeline(Pipeline):
+    """Pipeline using FakeLLM and FakeEmbedding instead of the OpenAI models."""
+
+    def __init__(self, settings, llm=None, embed_model=None, **kwargs):
+        super().__init__(settings, **kwargs)
+        self.llm = llm if llm is not None else FakeLLM()
+        self.embed_model = embed_model if embed_model is not None else FakeEmbedding()
+
+    def service_context(self):
+        if self._service_context is None:
+            self._service_context = ServiceContext.from_defaults(
+                llm=self.llm, embed_model=self.embed_model, node_parser=CodeNodeParser())
+        return self._service_context
@@ -0,0 +1,317 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from llama_hub.github_repo import GithubClient
+
+from benchmarks import environment
+from benchmarks.fakes import FakeEmbedding, FakeGithubServer, FakeLLM, FakePipeline, synthetic_repo
+from graph_sandbox import GraphSandbox
+from index_cache import IndexCache
+from ingestion import ArchiveSource, GithubApiSource, LocalSource
+from mapreduce import SummaryCache
+from pdf_export import render_pdf
+from pipeline import DIAGRAM_PROMPT, DOC_PROMPT, Settings, extract_code
+from response_cache import ResponseCache
+from static_graph import AnalysisCache
+from streaming import StreamRenderer
+
+
+class NullPlaceholder:
+    """Stands in for a Streamlit placeholder and only counts the rendered characters."""
+
+    def __init__(self):
+        self.chars = 0
+
+    def markdown(self, text):
+        self.chars += len(text)
+
+
+def _percentiles(samples, scale=1000):
+    samples = np.asarray(samples, dtype=np.float64) * scale
+    return {"p50": float(np.percentile(samples, 50)), "p95": float(np.percentile(samples, 95)),
+            "p99": float(np.percentile(samples, 99)), "mean": float(samples.mean()), "max": float(samples.max())}
+
+
+def _peak_rss():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def measure(run, config, unit, **extra):
+    """
+    Call run() for the warmup and timed iterations.
+    Args:
+    - run (callable): Does one iteration and returns the number of items processed
+    - config (dict): Benchmark configuration, see main
+    - unit (str): What the items are, e.g. files or tokens
+    Returns:
+    - dict: Items per iteration, throughput in items per second, latency percentiles in ms and extra fields
+    """
+    warmup = [_timed(run)[0] for _ in range(config["warmup"])]
+    samples, items = [], 0
+    for _ in range(config["iterations"]):
+        seconds, items = _timed(run)
+        samples.append(seconds)
+    return {"unit": unit, "items": items, "iterations": len(samples),
+            "throughput": items / float(np.mean(samples)) if samples and np.mean(samples) > 0 else 0.0,
+            "latency_ms": _percentiles(samples), "warmup_ms": [seconds * 1000 for seconds in warmup], **extra}
+
+
+def _timed(run):
+    started = time.perf_counter()
+    items = run()
+    return time.perf_counter() - started, items
+
+
+def _pipeline(config, cache_dir, **settings):
+    settings = Settings(file_types=[".py"], excludes=[], max_file_size=None, use_response_cache=False, **settings)
+    llm = FakeLLM(tokens=config["tokens"], token_delay=config["token_delay"])
+    return FakePipeline(settings, llm=llm, embed_model=FakeEmbedding(dim=config["embed_dim"]),
+                        index_cache=IndexCache(cache_dir), response_cache=ResponseCache(
+                            os.path.join(cache_dir, "responses.sqlite3")),
+                        summary_cache=SummaryCache(cache_dir), analysis_cache=AnalysisCache(cache_dir),
+                        graph_sandbox=GraphSandbox(workers=1))
+
+
+def _documents(source):
+    return list(source.iter_documents(source.list_files([".py"])))
+
+
+def _doc_prompt(config):
+    # a documentation prompt with some code of the repository as context, like the chat engine sends
+    context = []
+    for path in sorted(os.listdir(config["repo"]))[:3]:
+        module = os.path.join(config["repo"], path, "mod_0.py")
+        if os.path.exists(module):
+            with open(module, "r") as f:
+                context.append(f.read())
+    return "\n".join(context) + DOC_PROMPT.format(audience="technical")
+
+
+def bench_load_docs_local(config, cache_dir):
+    source = LocalSource(config["repo"], repo="synthetic")
+    docs = _documents(source)
+    return measure(lambda: len(_documents(source)), config, "files",
+                   bytes=sum(len(doc.text.encode("utf-8")) for doc in docs))
+
+
+def bench_load_docs_api(config, cache_dir):
+    with FakeGithubServer(config["repo"], latency=config["server_latency"]) as server:
+        client = GithubClient("offline", base_url=server.url)
+
+        def run():
+            return len(_documents(GithubApiSource(client, server.owner, server.repo, server.branch)))
+
+        result = measure(run, config, "files")
+        result["requests_per_iteration"] = server.requests / (config["warmup"] + config["iterations"])
+    return result
+
+
+def bench_load_docs_archive(config, cache_dir):
+    with FakeGithubServer(config["repo"], latency=config["server_latency"]) as server:
+        client = GithubClient("offline", base_url=server.url)
+
+        def run():
+            source = ArchiveSource(client, server.owner, server.repo, server.branch, base_url=server.url)
+            try:
+                return len(_documents(source))
+            finally:
+                source.close()
+
+        result = measure(run, config, "files")
+        result["archive_bytes"] = len(server.tarball())
+    return result
+
+
+def bench_load_index(config, cache_dir):
+    pipeline = _pipeline(config, cache_dir)
+    docs = _documents(LocalSource(config["repo"], repo="synthetic"))
+    progress = {}
+
+    def on_progress(p):
+        if p is not None:
+            progress.update(nodes=p.nodes, tokens=p.tokens, embedding_requests=p.requests)
+
+    def run():
+        pipeline.load_index(docs, len(docs))
+        return len(docs)
+
+    pipeline.on_progress = on_progress
+    result = measure(run, config, "files")
+    result.update(progress)
+    return result
+
+
+def bench_stream_render(config, cache_dir):
+    llm = FakeLLM(tokens=config["tokens"], token_delay=config["token_delay"])
+    prompt = _doc_prompt(config)
+    writes, metrics = [], {}
+
+    def run():
+        renderer = StreamRenderer(NullPlaceholder())
+        for response in llm.stream_complete(prompt):
+            started = time.perf_counter()
+            renderer.write(response.delta)
+            writes.append(time.perf_counter() - started)
+        renderer.close()
+        metrics.update(renderer.metrics())
+        return renderer.tokens
+
+    result = measure(run, config, "tokens")
+    result.update(renders=metrics["renders"], time_to_first_token=metrics["time_to_first_token"],
+                  write_latency_us=_percentiles(writes, scale=1e6))
+    return result
+
+
+def bench_extract_code(config, cache_dir):
+    diagram = FakeLLM().complete(_doc_prompt(config) + DIAGRAM_PROMPT.format(audience="technical")).text
+    # a plain response, one with an install step first and one without code
+    responses = [diagram, "```bash\npip install graphviz\n```\n" + diagram, "No diagram. " * 50] * 100
+
+    def run():
+        for response in responses:
+            extract_code(response)
+        return len(responses)
+
+    return measure(run, config, "responses")
+
+
+def _graph(config, cache_dir, diagram_mode):
+    pipeline = _pipeline(config, cache_dir, diagram_mode=diagram_mode)
+    docs = _documents(LocalSource(config["repo"], repo="synthetic"))
+    index = pipeline.load_index(docs, len(docs))
+    chat_engine = pipeline.chat_engine(index)
+    markdown = "".join(pipeline.generate_docs(index, chat_engine))
+    stages = {}
+
+    def run():
+        chat_engine.reset()
+        graph = pipeline.generate_graph(index, chat_engine, markdown)
+        if not graph["ok"]:
+            raise RuntimeError(graph["error"])
+        stages.update(sandbox_ms={name: graph[name] * 1000 for name in ("wait", "total")},
+                      png_bytes=len(graph["png"]))
+        return 1
+
+    try:
+        result = measure(run, config, "graphs")
+    finally:
+        pipeline.graph_sandbox.close()
+    result.update(stages)
+    return result
+
+
+def bench_generate_graph_llm(config, cache_dir):
+    return _graph(config, cache_dir, "LLM Flowchart")
+
+
+def bench_generate_graph_static(config, cache_dir):
+    # the AST analysis is cached per file after the warmup run, as in the app
+    return _graph(config, cache_dir, "Static Call Graph")
+
+
+def bench_pdf_export(config, cache_dir):
+    markdown = FakeLLM(tokens=config["tokens"]).complete(_doc_prompt(config)).text
+    sizes = []
+
+    def run():
+        sizes.append(len(render_pdf(markdown)))
+        return 1
+
+    result = measure(run, config, "documents")
+    result.update(markdown_chars=len(markdown), pdf_bytes=sizes[-1])
+    return result
+
+
+BENCHMARKS = {
+    "load_docs_local": bench_load_docs_local,
+    "load_docs_api": bench_load_docs_api,
+    "load_docs_archive": bench_load_docs_archive,
+    "load_index": bench_load_index,
+    "stream_render": bench_stream_render,
+    "extract_code": bench_extract_code,
+    "generate_graph_static": bench_generate_graph_static,
+    "generate_graph_llm": bench_generate_graph_llm,
+    "pdf_export": bench_pdf_export,
+}
+
+
+def run_benchmark(name, config):
+    """
+    Run one benchmark, in a fresh process so that its peak RSS is its own.
+    Returns:
+    - dict: Result of the benchmark with ok, error, baseline and peak RSS in bytes
+    """
+    baseline_rss = _peak_rss()
+    with tempfile.TemporaryDirectory(prefix="gitdoc-bench-") as cache_dir:
+        try:
+            result = {"ok": True, "error": None, **BENCHMARKS[name](config, cache_dir)}
+        except Exception:
+            result = {"ok": False, "error": traceback.format_exc(limit=-1).strip().splitlines()[-1]}
+    # the baseline is the interpreter with all modules imported; graph sandbox workers are
+    # separate processes with their own memory limit and are not included
+    result.update(baseline_rss_bytes=baseline_rss, peak_rss_bytes=_peak_rss())
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion, indexing, generation, diagram and PDF "
+                                                 "stages on a synthetic repository, with a local fake GitHub API, "
+                                                 "LLM and embedding model. Needs no network access.")
+    parser.add_argument("--files", type=int, default=50, help="Modules in the synthetic repository")
+    parser.add_argument("--lines", type=int, default=200, help="Approximate lines per module")
+    parser.add_argument("--packages", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--tokens", type=int, default=2000, help="Tokens per generated documentation")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--server-latency", type=float, default=0.0, help="Seconds added to each fake API response")
+    parser.add_argument("--embed-dim", type=int, default=1536)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run, default all")
+    parser.add_argument("-o", "--output", help="JSON result file, default stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="gitdoc-bench-repo-") as repo:
+        paths = synthetic_repo(repo, files=args.files, lines_per_file=args.lines, packages=args.packages,
+                               seed=args.seed)
+        config = {"repo": repo, "iterations": args.iterations, "warmup": args.warmup, "tokens": args.tokens,
+                  "token_delay": args.token_delay, "server_latency": args.server_latency,
+                  "embed_dim": args.embed_dim}
+        results = {}
+        for name in args.only or BENCHMARKS:
+            # spawn, like the graph sandbox and the batch CLI, and one process per benchmark
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                try:
+                    results[name] = pool.submit(run_benchmark, name, config).result()
+                except Exception as e:
+                    # the benchmark process died, e.g. it was killed for running out of memory
+                    results[name] = {"ok": False, "error": repr(e)}
+            status = "ok" if results[name]["ok"] else f"failed: {results[name]['error']}"
+            print(f"{name}: {status}", file=sys.stderr)
+
+    report = {"environment": environment(),
+              "config": {**{k: v for k, v in config.items() if k != "repo"}, "files": len(paths),
+                         "lines_per_file": args.lines, "packages": args.packages, "seed": args.seed},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0 if all(result["ok"] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
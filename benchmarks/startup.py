@@ -0,0 +1,123 @@
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+from benchmarks import environment
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# dependencies that must not be imported before they are needed, see warmup.HEAVY_MODULES
+HEAVY_PACKAGES = ("llama_index", "llama_hub", "openai", "graphviz", "pdfkit", "markdown", "tiktoken", "langchain",
+                  "googleapiclient")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$")
+
+
+def script_imports(path):
+    """
+    Return the modules a script imports at the top level, in order.
+    Args:
+    - path (str): Python file, e.g. app.py
+    Returns:
+    - list: Module names
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def parse_importtime(output):
+    """
+    Parse the output of python -X importtime.
+    Args:
+    - output (str): stderr of the profiled interpreter
+    Returns:
+    - list: {"module", "self_us", "cumulative_us", "depth"} in the order the imports finished
+    """
+    modules = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append({"module": module, "self_us": int(self_us), "cumulative_us": int(cumulative_us),
+                            "depth": (len(indent) - 1) // 2})
+    return modules
+
+
+def profile_imports(modules, python=sys.executable, cwd=ROOT):
+    """
+    Import modules in a fresh interpreter with -X importtime.
+    Args:
+    - modules (list): Modules to import, in order
+    - python (str): Interpreter to profile
+    - cwd (str): Working directory, the repository root by default
+    Returns:
+    - dict: Total time, the imported modules and the time per top-level package
+    """
+    code = "\n".join(f"import {module}" for module in modules)
+    result = subprocess.run([python, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=cwd)
+    imported = parse_importtime(result.stderr)
+    error = None
+    if result.returncode:
+        error = [line for line in result.stderr.splitlines() if not line.startswith("import time:")][-1:]
+        error = error[0] if error else f"exit code {result.returncode}"
+
+    packages = {}
+    for entry in imported:
+        package = entry["module"].split(".")[0]
+        packages[package] = packages.get(package, 0) + entry["self_us"]
+    return {"modules": modules, "error": error,
+            "seconds": sum(entry["self_us"] for entry in imported) / 1e6, "imported": len(imported),
+            "packages": {name: us / 1e6 for name, us in sorted(packages.items(), key=lambda item: -item[1])},
+            "heavy": sorted(set(packages) & set(HEAVY_PACKAGES)), "entries": imported}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the imports done when the app starts with python -X "
+                                                 "importtime and report them as JSON, to catch regressions in "
+                                                 "cold start time.")
+    parser.add_argument("modules", nargs="*", help="Modules to import, default the top-level imports of the script")
+    parser.add_argument("--script", default=os.path.join(ROOT, "app.py"),
+                        help="Script whose top-level imports are profiled, default app.py")
+    parser.add_argument("--top", type=int, default=25, help="Slowest modules to report by cumulative time")
+    parser.add_argument("--max-seconds", type=float, help="Fail if the imports take longer")
+    parser.add_argument("--allow-heavy", action="store_true",
+                        help="Do not fail when a dependency in HEAVY_PACKAGES is imported at startup")
+    parser.add_argument("-o", "--output", help="JSON result file, default stdout")
+    args = parser.parse_args(argv)
+
+    profile = profile_imports(args.modules or script_imports(args.script))
+    entries = profile.pop("entries")
+    profile["slowest"] = sorted(entries, key=lambda entry: -entry["cumulative_us"])[:args.top]
+    report = {"environment": environment(), "results": profile}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    failures = []
+    if profile["error"]:
+        failures.append(f"import failed: {profile['error']}")
+    if profile["heavy"] and not args.allow_heavy:
+        failures.append(f"imported at startup: {', '.join(profile['heavy'])}")
+    if args.max_seconds is not None and profile["seconds"] > args.max_seconds:
+        failures.append(f"imports took {profile['seconds']:.2f}s, more than {args.max_seconds:.2f}s")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
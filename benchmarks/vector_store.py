@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from llama_index.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.vector_stores import SimpleVectorStore
+from llama_index.vector_stores.types import VectorStoreQuery
+
+from vector_store import DTYPES, NumpyVectorStore
+
+
+def synthetic_embeddings(count, dim, clusters=64, noise=0.5, seed=0):
+    """
+    Generate normalized embeddings grouped around random centers, like chunks of related code.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + noise * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_nodes(vectors, nodes_per_doc=20):
+    return [
+        TextNode(id_=f"node-{i}", text="", embedding=vector.tolist(),
+                 relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc-{i // nodes_per_doc}")})
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def _percentiles(samples):
+    return {f"p{p}": float(np.percentile(samples, p)) * 1000 for p in (50, 95, 99)}
+
+
+def measure(name, make_store, load_store, nodes, queries, exact, top_k):
+    store = make_store()
+    store.add(nodes)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "default__vector_store.json")
+        store.persist(path)
+        disk_bytes = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        del store
+
+        # loaded twice: tracemalloc slows down the JSON parsing of SimpleVectorStore a lot
+        started = time.perf_counter()
+        store = load_store(path)
+        load_seconds = time.perf_counter() - started
+        del store
+        tracemalloc.start()
+        store = load_store(path)
+        heap_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        latencies, found = [], 0
+        for query, expected in zip(queries, exact):
+            started = time.perf_counter()
+            result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k))
+            latencies.append(time.perf_counter() - started)
+            found += len(set(result.ids) & expected)
+
+    return {
+        "store": name,
+        "heap_bytes": heap_bytes,
+        # memory-mapped embeddings, only resident while the pages are in the page cache
+        "mapped_bytes": getattr(store, "nbytes", 0),
+        "disk_bytes": disk_bytes,
+        "load_seconds": load_seconds,
+        "query_ms": _percentiles(latencies),
+        f"recall_at_{top_k}": found / (len(queries) * top_k),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare SimpleVectorStore with NumpyVectorStore on synthetic "
+                                                 "embeddings: memory, disk size, load time, query latency, recall.")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536, help="1536 for text-embedding-ada-002")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=2, help="The chat engine retrieves 2 chunks by default")
+    parser.add_argument("--skip-simple", action="store_true", help="Skip the slow SimpleVectorStore run")
+    args = parser.parse_args(argv)
+
+    vectors = synthetic_embeddings(args.vectors + args.queries, args.dim)
+    vectors, queries = vectors[:args.vectors], vectors[args.vectors:]
+    exact_scores = queries.astype(np.float64) @ vectors.astype(np.float64).T
+    exact = [{f"node-{i}" for i in np.argsort(-row)[:args.top_k]} for row in exact_scores]
+    nodes = make_nodes(vectors)
+
+    results = []
+    if not args.skip_simple:
+        results.append(measure("simple", SimpleVectorStore, SimpleVectorStore.from_persist_path,
+                               nodes, queries, exact, args.top_k))
+    for dtype in DTYPES:
+        results.append(measure(f"numpy-{dtype}", lambda: NumpyVectorStore(dtype), NumpyVectorStore.from_persist_path,
+                               nodes, queries, exact, args.top_k))
+
+    json.dump({"vectors": args.vectors, "dim": args.dim, "queries": args.queries, "top_k": args.top_k,
+               "results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import ast
+import os
+import re
+
+from llama_index.bridge.pydantic import Field
+from llama_index.node_parser import NodeParser
+from llama_index.schema import NodeRelationship, TextNode
+
+
+# roughly 750 tokens, large enough for most functions and small enough to keep prompts tight
+DEFAULT_MAX_CHARS = 3000
+
+# lines that start a top-level symbol in languages without a parser available here
+_BOUNDARY_PATTERNS = {
+    ".js": r"^(export\s+)?(default\s+)?(async\s+)?(function|class|const|let|var)\s+(?P<name>[\w$]+)",
+    ".ts": r"^(export\s+)?(default\s+)?(abstract\s+)?(async\s+)?(function|class|interface|type|enum|const|let)\s+(?P<name>[\w$]+)",
+    ".java": r"^\s{0,4}(public|private|protected|static|final|abstract|\s)*(class|interface|enum|record|[\w<>\[\],\s]+)\s+(?P<name>\w+)\s*[({]",
+    ".c": r"^[A-Za-z_][\w\s\*]*?\b(?P<name>\w+)\s*\([^;]*$",
+    ".cpp": r"^(template\s*<.*>\s*)?(class|struct|namespace)?\s*[A-Za-z_][\w:<>\s\*&]*?\b(?P<name>[\w:~]+)\s*[({][^;]*$",
+    ".php": r"^\s*(abstract\s+|final\s+)?(public\s+|private\s+|protected\s+)?(static\s+)?(function|class|interface|trait)\s+(?P<name>\w+)",
+    ".rb": r"^\s{0,2}(def|class|module)\s+(?P<name>[\w.:?!]+)",
+    ".md": r"^#{1,3}\s+(?P<name>.+)",
+    ".css": r"^(?P<name>[^\s{][^{]*)\{",
+}
+
+
+class _Chunk:
+    def __init__(self, symbol, symbol_type, start, end, text=None):
+        self.symbol = symbol
+        self.symbol_type = symbol_type
+        # 1-based, inclusive line numbers
+        self.start = start
+        self.end = end
+        # only set for a piece of a line that is too long on its own
+        self.text = text
+
+    def get_text(self, lines):
+        return self.text if self.text is not None else "".join(lines[self.start - 1:self.end])
+
+
+def _python_chunks(text, lines, max_chars):
+    tree = ast.parse(text)
+    chunks = []
+    module_start = None
+
+    def _flush_module(end):
+        nonlocal module_start
+        if module_start is not None and module_start <= end:
+            chunks.append(_Chunk("<module>", "module", module_start, end))
+        module_start = None
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            _flush_module(start - 1)
+            symbol_type = "class" if isinstance(node, ast.ClassDef) else "function"
+            size = sum(len(line) for line in lines[start - 1:node.end_lineno])
+            if symbol_type == "class" and size > max_chars:
+                chunks.extend(_class_chunks(node, start))
+            else:
+                chunks.append(_Chunk(node.name, symbol_type, start, node.end_lineno))
+        elif module_start is None:
+            module_start = node.lineno
+    _flush_module(len(lines))
+
+    # attach comments and blank lines between statements to the following chunk
+    prev_end = 0
+    for chunk in chunks:
+        chunk.start = prev_end + 1
+        prev_end = chunk.end
+    if chunks:
+        chunks[-1].end = len(lines)
+    return chunks
+
+
+def _class_chunks(node, start):
+    # split a large class into its header (docstring, attributes) and one chunk per method
+    chunks = []
+    header_end = node.end_lineno
+    for child in node.body:
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            child_start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+            header_end = min(header_end, child_start - 1)
+            chunks.append(_Chunk(f"{node.name}.{child.name}", "method", child_start, child.end_lineno))
+    if chunks and chunks[-1].end < node.end_lineno:
+        # statements after the last method, e.g. class attributes, stay with the class
+        chunks.append(_Chunk(node.name, "class", chunks[-1].end + 1, node.end_lineno))
+    chunks.insert(0, _Chunk(node.name, "class", start, header_end))
+    return chunks
+
+
+def _pattern_chunks(lines, pattern):
+    regex = re.compile(pattern)
+    chunks = []
+    current = _Chunk("<module>", "module", 1, len(lines))
+    for lineno, line in enumerate(lines, start=1):
+        match = regex.match(line)
+        if match and lineno > 1:
+            current.end = lineno - 1
+            chunks.append(current)
+            current = _Chunk(match.group("name").strip(), "symbol", lineno, len(lines))
+        elif match:
+            current = _Chunk(match.group("name").strip(), "symbol", 1, len(lines))
+    chunks.append(current)
+    return chunks
+
+
+def _split_chunk(chunk, lines, max_chars):
+    # break a chunk that is still too large at line boundaries, preferring blank lines,
+    # and lines that are too large on their own, e.g. minified code or data literals, into pieces
+    parts = []
+    start = chunk.start
+    size = 0
+    last_blank = None
+    for lineno in range(chunk.start, chunk.end + 1):
+        line = lines[lineno - 1]
+        if len(line) > max_chars:
+            if start < lineno:
+                parts.append(_Chunk(chunk.symbol, chunk.symbol_type, start, lineno - 1))
+            parts.extend(_Chunk(chunk.symbol, chunk.symbol_type, lineno, lineno, line[i:i + max_chars])
+                         for i in range(0, len(line), max_chars))
+            start, size, last_blank = lineno + 1, 0, None
+            continue
+        size += len(line)
+        if not line.strip():
+            last_blank = lineno
+        if size > max_chars and lineno > start:
+            end = last_blank if last_blank and last_blank > start else lineno - 1
+            parts.append(_Chunk(chunk.symbol, chunk.symbol_type, start, end))
+            start = end + 1
+            size = sum(len(l) for l in lines[start - 1:lineno])
+            last_blank = None
+    if start <= chunk.end:
+        parts.append(_Chunk(chunk.symbol, chunk.symbol_type, start, chunk.end))
+    return parts
+
+
+def _merge_small(chunks, lines, max_chars):
+    # adjacent pieces of module-level code (imports, constants) are merged, symbols are kept apart
+    merged = []
+    for chunk in chunks:
+        prev = merged[-1] if merged else None
+        if (prev is not None and prev.symbol_type == chunk.symbol_type == "module"
+                and sum(len(l) for l in lines[prev.start - 1:chunk.end]) <= max_chars):
+            prev.end = chunk.end
+        else:
+            merged.append(chunk)
+    return merged
+
+
+class CodeNodeParser(NodeParser):
+    """
+    Node parser that splits source files on module, class and function boundaries.
+
+    Python files are parsed with the ast module. Other languages use a line-based
+    boundary pattern and fall back to blank-line splitting. Every node carries the
+    file path, symbol name and line range in its metadata.
+    """
+
+    max_chars: int = Field(default=DEFAULT_MAX_CHARS, description="Maximum characters per chunk")
+    # nodes are linked to their file, not to the chunks of the neighbouring files
+    include_prev_next_rel: bool = Field(default=False, description="Include prev/next node relationships")
+
+    @classmethod
+    def class_name(cls):
+        return "CodeNodeParser"
+
+    def get_chunks(self, text, extension):
+        """
+        Split a file into symbol chunks.
+        Args:
+        - text (str): File content
+        - extension (str): File extension, e.g. ".py"
+        Returns:
+        - list: _Chunk objects with 1-based line ranges
+        """
+        lines = text.splitlines(keepends=True)
+        if not lines:
+            return []
+
+        chunks = None
+        if extension == ".py":
+            try:
+                chunks = _python_chunks(text, lines, self.max_chars)
+            except SyntaxError:
+                chunks = None
+        if chunks is None and extension in _BOUNDARY_PATTERNS:
+            chunks = _pattern_chunks(lines, _BOUNDARY_PATTERNS[extension])
+        if chunks is None:
+            chunks = [_Chunk("<module>", "module", 1, len(lines))]
+
+        chunks = [c for c in chunks if "".join(lines[c.start - 1:c.end]).strip()]
+        chunks = _merge_small(chunks, lines, self.max_chars)
+        return [part for chunk in chunks for part in _split_chunk(chunk, lines, self.max_chars)]
+
+    def _parse_nodes(self, documents, show_progress=False, **kwargs):
+        """
+        Split documents into TextNodes, called by NodeParser.get_nodes_from_documents.
+        Args:
+        - documents (list): Documents to split
+        Returns:
+        - list: TextNodes linked to their source document
+        """
+        nodes = []
+        for doc in documents:
+            file_path = doc.metadata.get("file_path", "")
+            text = doc.get_content()
+            lines = text.splitlines(keepends=True)
+            for chunk in self.get_chunks(text, os.path.splitext(file_path)[1]):
+                node = TextNode(
+                    text=chunk.get_text(lines),
+                    metadata={
+                        **doc.metadata,
+                        "symbol": chunk.symbol,
+                        "symbol_type": chunk.symbol_type,
+                        "start_line": chunk.start,
+                        "end_line": chunk.end,
+                    },
+                    excluded_embed_metadata_keys=["url", "file_name", "symbol_type", "start_line", "end_line"],
+                    excluded_llm_metadata_keys=["url", "file_name", "symbol_type"],
+                )
+                node.relationships[NodeRelationship.SOURCE] = doc.as_related_node_info()
+                nodes.append(node)
+        return nodes
@@ -0,0 +1,243 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from embedding import DEFAULT_CONCURRENCY
+from graph_sandbox import GraphSandbox
+from index_cache import IndexCache
+from ingestion import DEFAULT_EXCLUDES, DEFAULT_MAX_FILE_SIZE
+from mapreduce import SummaryCache
+from pipeline import Pipeline, Settings, make_source, parse_github_url
+from response_cache import ResponseCache
+from slides_export import build_services, export_to_slides
+from static_graph import AnalysisCache
+from tracing import Tracer
+
+
+STAGES = ["index", "generate", "diagram", "pdf"]
+
+DEFAULT_LIMITS = {"index": 4, "generate": 4, "diagram": 2, "pdf": 2}
+
+DIAGRAMS = {"llm": "LLM Flowchart", "call": "Static Call Graph", "import": "Static Import Graph", "none": None}
+GENERATION_MODES = {"retrieval": "Retrieval", "map-reduce": "Map-Reduce"}
+SOURCES = {"api": "GitHub API", "archive": "Archive Download"}
+
+# set once per worker process by _init_worker
+_worker = {}
+
+
+def parse_repo_list(lines):
+    """
+    Parse repository entries, one per line: a GitHub URL, optionally followed by a branch.
+    Blank lines and lines starting with # are skipped, duplicates are dropped.
+    Args:
+    - lines (iterable): Lines of a repository list
+    Returns:
+    - list: (owner, repo, branch) tuples
+    """
+    repos = []
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        url, _, branch = line.partition(" ")
+        owner, repo, url_branch = parse_github_url(url)
+        entry = (owner, repo, branch.strip() or url_branch)
+        if entry not in repos:
+            repos.append(entry)
+    return repos
+
+
+def _output_name(owner, repo, branch):
+    return re.sub(r"[^\w.-]", "_", f"{owner}_{repo}_{branch}")
+
+
+def _init_worker(settings, limits, source, slides=False):
+    # caches are opened once per worker and shared with the other workers through the cache directory
+    _worker.update(settings=settings, limits=limits, source=source, slides=slides, index_cache=IndexCache(),
+                   response_cache=ResponseCache(), summary_cache=SummaryCache(),
+                   analysis_cache=AnalysisCache(), graph_sandbox=GraphSandbox(workers=1), tracer=Tracer())
+
+
+def _document(owner, repo, branch, out_dir, pdf):
+    started = time.perf_counter()
+    pipeline = Pipeline(_worker["settings"], index_cache=_worker["index_cache"],
+                        response_cache=_worker["response_cache"], summary_cache=_worker["summary_cache"],
+                        analysis_cache=_worker["analysis_cache"], graph_sandbox=_worker["graph_sandbox"],
+                        limits=_worker["limits"], tracer=_worker["tracer"])
+    report = {"owner": owner, "repo": repo, "branch": branch, "ok": False, "error": None, "outputs": {}}
+    try:
+        result = pipeline.run(make_source(_worker["source"], owner, repo, branch), pdf=pdf)
+    except Exception:
+        report["error"] = traceback.format_exc(limit=-1).strip().splitlines()[-1]
+    else:
+        name = os.path.join(out_dir, _output_name(owner, repo, branch))
+        outputs = {"markdown": (".md", result["markdown"].encode("utf-8")), "flowchart": (".png", result["png"]),
+                   "dot": (".dot", result["dot_source"] and result["dot_source"].encode("utf-8")),
+                   "pdf": (".pdf", result["pdf"])}
+        for kind, (ext, data) in outputs.items():
+            if data is not None:
+                with open(name + ext, "wb") as f:
+                    f.write(data)
+                report["outputs"][kind] = name + ext
+        report.update(ok=True, commit_sha=result["commit_sha"], tokens=result["tokens"],
+                      diagram_error=result["diagram_error"])
+        if _worker["slides"]:
+            report["outputs"]["slides"] = _export_slides(pipeline, f"{owner}/{repo} ({branch})", result)
+    report["timings"] = pipeline.timings
+    report["spans"] = _worker["tracer"].spans(pipeline.trace_id)
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def _export_slides(pipeline, title, result):
+    if "slides_services" not in _worker:
+        _worker["slides_services"] = build_services()
+    # a failed export does not fail the repository, the error is kept in the report
+    try:
+        with pipeline.span("slides_export"):
+            return export_to_slides(*_worker["slides_services"], title, result["markdown"], result["png"])["url"]
+    except Exception as e:
+        return f"failed: {type(e).__name__}: {e}"
+
+
+def _summarize(reports):
+    stages = {}
+    for report in reports:
+        for stage, timing in report["timings"].items():
+            summary = stages.setdefault(stage, {"runs": 0, "seconds": 0.0, "max_seconds": 0.0, "wait": 0.0})
+            summary["runs"] += 1
+            summary["seconds"] += timing["seconds"]
+            summary["max_seconds"] = max(summary["max_seconds"], timing["seconds"])
+            summary["wait"] += timing["wait"]
+    spans = {}
+    for report in reports:
+        for span in report.get("spans", []):
+            summary = spans.setdefault(span["name"], {"count": 0, "seconds": 0.0, "errors": 0, "cache_hits": 0})
+            summary["count"] += 1
+            summary["seconds"] += span["seconds"]
+            summary["errors"] += span["error"] is not None
+            summary["cache_hits"] += span.get("cache_hit") is True
+    return {"ok": sum(report["ok"] for report in reports), "failed": sum(not report["ok"] for report in reports),
+            "stages": stages, "spans": spans}
+
+
+def run_batch(repos, out_dir, settings, workers=4, limits=None, source="GitHub API", pdf=True, slides=False,
+              log=None):
+    """
+    Document many repositories on a process pool.
+    Args:
+    - repos (list): (owner, repo, branch) tuples
+    - out_dir (str): Directory for the markdown, diagram and PDF outputs
+    - settings (pipeline.Settings): Settings used for every repository
+    - workers (int): Number of worker processes
+    - limits (dict): Maximum number of repositories in each stage at once, see STAGES
+    - source (str): pipeline.SOURCES entry used to fetch the repositories
+    - pdf (bool): Whether to render PDFs
+    - slides (bool): Whether to export a Google Slides deck of each repository, see slides_export
+    - log (callable): Called with a line of text as each repository finishes
+    Returns:
+    - dict: Run report with per-repository results, per-stage timings and spans
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    limits = {**DEFAULT_LIMITS, **(limits or {})}
+    # spawn, like the graph sandbox: the workers start their own threads and processes
+    context = multiprocessing.get_context("spawn")
+    semaphores = {stage: context.BoundedSemaphore(limit) for stage, limit in limits.items()}
+
+    started = time.time()
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(settings, semaphores, source, slides)) as pool:
+        futures = {pool.submit(_document, owner, repo, branch, out_dir, pdf): (owner, repo, branch)
+                   for owner, repo, branch in repos}
+        for future in as_completed(futures):
+            owner, repo, branch = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                # the worker process died, e.g. it was killed for running out of memory
+                report = {"owner": owner, "repo": repo, "branch": branch, "ok": False, "error": repr(e),
+                          "outputs": {}, "timings": {}}
+            reports.append(report)
+            if log is not None:
+                status = "ok" if report["ok"] else f"failed: {report['error']}"
+                log(f"[{len(reports)}/{len(repos)}] {owner}/{repo}@{branch} {status}")
+
+    return {
+        "started": started,
+        "seconds": time.time() - started,
+        "workers": workers,
+        "limits": limits,
+        "settings": settings.to_dict(),
+        "summary": _summarize(reports),
+        "repos": reports,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate documentation for many GitHub repositories without the UI. "
+                                                 "Reads OPENAI_API_KEY and GITHUB_TOKEN from the environment.")
+    parser.add_argument("repos", nargs="*", help="GitHub URLs, https://github.com/owner/repo[/tree/branch]")
+    parser.add_argument("-f", "--repos-file", help="File with one GitHub URL per line, optionally followed by a branch")
+    parser.add_argument("-o", "--out", default="gitdoc_output", help="Output directory")
+    parser.add_argument("--report", help="Path of the JSON run report, defaults to <out>/report.json")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Number of worker processes")
+    for stage in STAGES:
+        parser.add_argument(f"--max-{stage}", type=int, default=DEFAULT_LIMITS[stage], metavar="N",
+                            help=f"Repositories in the {stage} stage at once")
+    parser.add_argument("--source", choices=sorted(SOURCES), default="api")
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--audience", default="technical", choices=["technical", "non-technical"])
+    parser.add_argument("--file-types", nargs="+", default=[".py"])
+    parser.add_argument("--exclude", nargs="*", default=DEFAULT_EXCLUDES, help="Glob patterns of files to skip")
+    parser.add_argument("--max-file-size", type=int, default=DEFAULT_MAX_FILE_SIZE // 1024, help="In KB")
+    parser.add_argument("--embed-concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Embedding requests sent at once by each worker")
+    parser.add_argument("--generation-mode", choices=sorted(GENERATION_MODES), default="retrieval")
+    parser.add_argument("--diagram", choices=sorted(DIAGRAMS), default="llm")
+    parser.add_argument("--refine-diagram", action="store_true", help="Let the LLM relabel and prune static graphs")
+    parser.add_argument("--no-pdf", action="store_true")
+    parser.add_argument("--slides", action="store_true",
+                        help="Export a Google Slides deck per repository, needs GITDOC_SLIDES_TEMPLATE_ID and a "
+                             "service account file")
+    parser.add_argument("--no-response-cache", action="store_true", help="Regenerate instead of replaying responses")
+    args = parser.parse_args(argv)
+
+    lines = list(args.repos)
+    if args.repos_file:
+        with open(args.repos_file, "r") as f:
+            lines.extend(f)
+    try:
+        repos = parse_repo_list(lines)
+    except ValueError as e:
+        parser.error(str(e))
+    if not repos:
+        parser.error("no repositories given")
+
+    settings = Settings(model=args.model, audience=args.audience, file_types=args.file_types,
+                        excludes=args.exclude, max_file_size=args.max_file_size * 1024,
+                        embed_concurrency=args.embed_concurrency,
+                        generation_mode=GENERATION_MODES[args.generation_mode], diagram_mode=DIAGRAMS[args.diagram],
+                        refine_diagram=args.refine_diagram, use_response_cache=not args.no_response_cache)
+    limits = {stage: getattr(args, f"max_{stage}") for stage in STAGES}
+
+    report = run_batch(repos, args.out, settings, workers=args.workers, limits=limits, source=SOURCES[args.source],
+                       pdf=not args.no_pdf, slides=args.slides, log=lambda line: print(line, file=sys.stderr))
+
+    report_path = args.report or os.path.join(args.out, "report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"{report['summary']['ok']} documented, {report['summary']['failed']} failed, report written to "
+          f"{report_path}", file=sys.stderr)
+    return 1 if report["summary"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
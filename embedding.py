@@ -0,0 +1,170 @@
+import asyncio
+import functools
+import random
+import time
+
+
+DEFAULT_MAX_TOKENS_PER_BATCH = 20000
+# OpenAI accepts at most 2048 inputs per embeddings request
+DEFAULT_MAX_BATCH_SIZE = 2048
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 6
+
+@functools.lru_cache(maxsize=None)
+def get_encoding():
+    # loaded on first use, tiktoken downloads the encoding when it is not cached yet
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text):
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+class EmbeddingProgress:
+    """
+    Counters for the embedding stage, with an ETA based on the share of files done.
+    """
+
+    def __init__(self, total_files):
+        self.total_files = total_files
+        self.files = 0
+        self.nodes = 0
+        self.tokens = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def fraction(self):
+        if not self.total_files:
+            return 1.0
+        return min(self.files / self.total_files, 1.0)
+
+    @property
+    def eta(self):
+        """Estimated seconds left, or None before the first file is done."""
+        if not self.files:
+            return None
+        return self.elapsed / self.fraction - self.elapsed
+
+
+def batch_nodes(nodes, max_tokens=DEFAULT_MAX_TOKENS_PER_BATCH, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+    """
+    Group nodes into embedding requests that stay under a token budget.
+    Args:
+    - nodes (list): TextNodes to embed
+    - max_tokens (int): Token budget per request
+    - max_batch_size (int): Maximum number of inputs per request
+    Returns:
+    - list: (nodes, texts, token count) tuples, one per request
+    """
+    from llama_index.schema import MetadataMode
+
+    batches = []
+    batch, texts, tokens = [], [], 0
+    for node in nodes:
+        text = node.get_content(metadata_mode=MetadataMode.EMBED)
+        node_tokens = count_tokens(text)
+        if batch and (tokens + node_tokens > max_tokens or len(batch) == max_batch_size):
+            batches.append((batch, texts, tokens))
+            batch, texts, tokens = [], [], 0
+        batch.append(node)
+        texts.append(text)
+        tokens += node_tokens
+    if batch:
+        batches.append((batch, texts, tokens))
+    return batches
+
+
+def _is_rate_limit(exc):
+    # works for both openai<1 (openai.error.RateLimitError) and openai>=1 (openai.RateLimitError)
+    return type(exc).__name__ == "RateLimitError" or getattr(exc, "status_code", None) == 429
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _openai_client(embed_model):
+    # a new client for each run: the model's cached AsyncOpenAI keeps connections bound to the event loop
+    # of the first run, and asyncio.run closes that loop. Without client retries, rate limits reach _embed_batches
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=embed_model.api_key, base_url=embed_model.api_base, max_retries=0,
+                       timeout=embed_model.timeout, default_headers=embed_model.default_headers)
+
+
+async def _embed_batches(batches, embed_model, concurrency, progress):
+    semaphore = asyncio.Semaphore(concurrency)
+    client = _openai_client(embed_model) if embed_model.class_name() == "OpenAIEmbedding" else None
+    # shared across workers: once one request is rate limited, nobody sends until the pause is over
+    resume_at = 0.0
+
+    async def _request(texts):
+        if client is None:
+            # one request per batch; the public batch helpers re-split by embed_batch_size
+            return await embed_model._aget_text_embeddings(texts)
+        # the client directly instead of llama_index's helper, which retries with its own backoff
+        response = await client.embeddings.create(input=[text.replace("\n", " ") for text in texts],
+                                                  model=embed_model.model_name, **embed_model.additional_kwargs)
+        return [data.embedding for data in response.data]
+
+    async def _embed(nodes, texts, tokens):
+        nonlocal resume_at
+        async with semaphore:
+            for attempt in range(MAX_RETRIES + 1):
+                delay = resume_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    embeddings = await _request(texts)
+                    break
+                except Exception as exc:
+                    if not _is_rate_limit(exc) or attempt == MAX_RETRIES:
+                        raise
+                    if progress is not None:
+                        progress.rate_limited += 1
+                    backoff = _retry_after(exc) or min(2 ** attempt, 60) * (1 + random.random())
+                    resume_at = max(resume_at, time.monotonic() + backoff)
+
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+        if progress is not None:
+            progress.requests += 1
+            progress.nodes += len(nodes)
+            progress.tokens += tokens
+
+    try:
+        await asyncio.gather(*(_embed(*batch) for batch in batches))
+    finally:
+        if client is not None:
+            await client.close()
+
+
+def embed_nodes(nodes, embed_model, max_tokens=DEFAULT_MAX_TOKENS_PER_BATCH,
+                concurrency=DEFAULT_CONCURRENCY, progress=None):
+    """
+    Embed nodes in token-budgeted batches, several requests at a time, backing off on rate limits.
+    Args:
+    - nodes (list): TextNodes to embed, their embedding attribute is set in place
+    - embed_model (BaseEmbedding): llama_index embedding model
+    - max_tokens (int): Token budget per request
+    - concurrency (int): Maximum number of requests in flight
+    - progress (EmbeddingProgress): Optional counters to update
+    Returns:
+    - list: The same nodes, now with embeddings
+    """
+    batches = batch_nodes([node for node in nodes if node.embedding is None], max_tokens)
+    if batches:
+        asyncio.run(_embed_batches(batches, embed_model, concurrency, progress))
+    return nodes
@@ -0,0 +1,171 @@
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, limits are then only enforced by the wall-clock timeout
+    resource = None
+
+
+DEFAULT_WORKERS = 2
+DEFAULT_TIMEOUT = 30
+DEFAULT_CPU_SECONDS = 20
+DEFAULT_MEMORY_BYTES = 1024 ** 3
+
+
+def _set_memory_limit(memory_bytes):
+    if resource is None:
+        return
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    except (ValueError, OSError):
+        # RLIMIT_AS is not supported everywhere, e.g. macOS
+        pass
+
+
+def _set_cpu_limit(cpu_seconds):
+    # the worker is reused, so the limit is relative to the cpu time it has already used
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    limit = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, limit + 1))
+
+
+def _find_graph(namespace, graphviz):
+    graph_types = (graphviz.Graph, graphviz.Digraph, graphviz.Source)
+    graph = namespace.get("dot")
+    if isinstance(graph, graph_types):
+        return graph
+    for value in namespace.values():
+        if isinstance(value, graph_types):
+            return value
+    return None
+
+
+def _run(code, graphviz):
+    started = time.perf_counter()
+    namespace = {"__name__": "__gitdoc_graph__"}
+    try:
+        exec(code, namespace)
+    except MemoryError:
+        return {"ok": False, "error": "memory limit exceeded while running the diagram code"}
+    except BaseException:
+        return {"ok": False, "error": traceback.format_exc(limit=-1).strip().splitlines()[-1]}
+    exec_seconds = time.perf_counter() - started
+
+    graph = _find_graph(namespace, graphviz)
+    if graph is None:
+        return {"ok": False, "error": "the diagram code did not define a graphviz graph"}
+
+    try:
+        png = graph.pipe(format="png")
+    except Exception as e:
+        return {"ok": False, "error": f"graphviz failed to render the diagram: {e}"}
+
+    return {
+        "ok": True,
+        "dot_source": graph.source,
+        "png": png,
+        "timings": {"exec": exec_seconds, "render": time.perf_counter() - started - exec_seconds},
+    }
+
+
+def _worker_main(conn, cpu_seconds, memory_bytes):
+    # imported once per worker, so warm workers skip the import on every diagram
+    import graphviz
+
+    _set_memory_limit(memory_bytes)
+    while True:
+        try:
+            code = conn.recv()
+        except EOFError:
+            return
+        _set_cpu_limit(cpu_seconds)
+        conn.send(_run(code, graphviz))
+
+
+class _Worker:
+    def __init__(self, context, cpu_seconds, memory_bytes):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, cpu_seconds, memory_bytes),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class GraphSandbox:
+    """
+    Runs LLM-generated Graphviz code in separate worker processes.
+
+    Each run is limited in wall-clock time, CPU time and memory. Workers are started once and
+    reused; a worker that times out, crashes or hits a limit is killed and replaced. Runs return
+    the DOT source and the rendered PNG, or the reason for the failure, together with timings.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, cpu_seconds=DEFAULT_CPU_SECONDS,
+                 memory_bytes=DEFAULT_MEMORY_BYTES):
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        # spawn, because forking a multi-threaded Streamlit server is unsafe
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def _new_worker(self):
+        return _Worker(self._context, self.cpu_seconds, self.memory_bytes)
+
+    def run(self, code):
+        """
+        Execute diagram code and render the graph it defines.
+        Args:
+        - code (str): Python code defining a graphviz graph, preferably named dot
+        Returns:
+        - dict: ok, dot_source, png and timings on success; ok and error on failure;
+          wait and total seconds in both cases
+        """
+        requested = time.perf_counter()
+        with self._slots:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = self._new_worker()
+            started = time.perf_counter()
+
+            try:
+                worker.conn.send(code)
+                if worker.conn.poll(self.timeout):
+                    result = worker.conn.recv()
+                else:
+                    result = {"ok": False, "error": f"timed out after {self.timeout}s"}
+            except (EOFError, OSError):
+                worker.process.join(1)
+                result = {"ok": False, "error": f"worker exited with code {worker.process.exitcode}, "
+                                                f"most likely for exceeding its cpu or memory limit"}
+
+            # only healthy workers are reused, anything that failed is replaced by a fresh interpreter
+            if result["ok"]:
+                self._idle.put(worker)
+            else:
+                worker.kill()
+
+        result["wait"] = started - requested
+        result["total"] = time.perf_counter() - requested
+        return result
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
@@ -0,0 +1,45 @@
+from ingestion import make_doc_id
+
+
+def diff_files(old_files, new_files):
+    """
+    Compare two file manifests.
+    Args:
+    - old_files (dict): Manifest of the indexed commit
+    - new_files (dict): Manifest of the new commit
+    Returns:
+    - tuple: (added_or_modified, removed) lists of file paths
+    """
+    changed = [path for path, sha in new_files.items() if old_files.get(path) != sha]
+    removed = [path for path in old_files if path not in new_files]
+    return changed, removed
+
+
+def update_index(index, old_files, new_files, load_docs, insert_docs=None):
+    """
+    Bring an index built for an older commit up to date by re-embedding only changed files.
+    Args:
+    - index (VectorStoreIndex): Index of the older commit, modified in place
+    - old_files (dict): File manifest (path to blob SHA) of the indexed commit
+    - new_files (dict): File manifest of the new commit
+    - load_docs (callable): Takes a file manifest and returns an iterable of documents
+    - insert_docs (callable): Takes the index, the documents and their file count and inserts them,
+      defaults to index.insert for each document
+    Returns:
+    - tuple: (added_or_modified, removed) lists of file paths, a renamed file is removed and added
+    """
+    changed, removed = diff_files(old_files, new_files)
+
+    # documents are keyed by path and blob SHA, so files with identical content are indexed separately
+    for path in removed + changed:
+        if path in old_files:
+            index.delete_ref_doc(make_doc_id(path, old_files[path]), delete_from_docstore=True)
+
+    to_fetch = {path: new_files[path] for path in changed}
+    if insert_docs is not None:
+        insert_docs(index, load_docs(to_fetch), len(to_fetch))
+    else:
+        for doc in load_docs(to_fetch):
+            index.insert(doc)
+
+    return changed, removed
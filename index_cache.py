@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, the manifest is then only guarded within one process
+    fcntl = None
+
+from vector_store import load_vector_store
+
+
+# default embedding model used by ServiceContext.from_defaults
+EMBED_MODEL = "text-embedding-ada-002"
+
+# bump whenever chunking or node metadata changes, so stale indexes are not reused
+INDEX_FORMAT = "4"
+
+CACHE_DIR = os.getenv("GITDOC_CACHE_DIR", ".gitdoc_cache")
+MAX_CACHE_BYTES = int(os.getenv("GITDOC_INDEX_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+
+def resolve_commit_sha(github_client, owner, repo, branch):
+    """
+    Resolve a branch name to the SHA of its head commit.
+    Args:
+    - github_client (GithubClient): Authenticated llama_hub Github client
+    - owner (str): Repository owner
+    - repo (str): Repository name
+    - branch (str): Branch name
+    Returns:
+    - str: Commit SHA
+    """
+    # GitBranchResponseModel does not keep the commit SHA, so read it from the raw response
+    response = asyncio.run(github_client.request("getBranch", "GET", owner=owner, repo=repo, branch=branch))
+    response.raise_for_status()
+    return response.json()["commit"]["sha"]
+
+
+def make_repo_id(owner, repo, file_types, excludes=(), max_file_size=None, embed_model=EMBED_MODEL):
+    """
+    Build an identifier shared by all indexed commits of a repository with the same settings.
+    Args:
+    - owner (str): Repository owner
+    - repo (str): Repository name
+    - file_types (list): File extensions included in the index
+    - excludes (list): Path patterns excluded from the index
+    - max_file_size (int): Size cap applied when loading files
+    - embed_model (str): Name of the embedding model
+    Returns:
+    - str: Hex digest identifying the repository and settings
+    """
+    parts = [INDEX_FORMAT, owner, repo, ",".join(sorted(file_types)), ",".join(sorted(excludes)),
+             str(max_file_size), embed_model]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def make_key(owner, repo, commit_sha, file_types, excludes=(), max_file_size=None, embed_model=EMBED_MODEL):
+    """
+    Build the cache key for an index.
+    Args:
+    - owner (str): Repository owner
+    - repo (str): Repository name
+    - commit_sha (str): Resolved commit SHA
+    - file_types (list): File extensions included in the index
+    - excludes (list): Path patterns excluded from the index
+    - max_file_size (int): Size cap applied when loading files
+    - embed_model (str): Name of the embedding model
+    Returns:
+    - str: Hex digest identifying the index
+    """
+    repo_id = make_repo_id(owner, repo, file_types, excludes, max_file_size, embed_model)
+    return hashlib.sha256(f"{repo_id}\0{commit_sha}".encode("utf-8")).hexdigest()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class IndexCache:
+    """
+    On-disk store of persisted VectorStoreIndex objects with size-bounded LRU eviction.
+
+    Every index lives in its own directory under `<cache_dir>/indexes/<key>`. A small
+    manifest keeps the size and last access time of each entry so that eviction
+    does not have to walk the whole cache. The manifest is re-read under a file lock
+    before every change, so several processes (e.g. batch CLI workers) can share the cache.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = os.path.join(cache_dir, "indexes")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self._lock = threading.Lock()
+        # key -> [lock, number of threads using it], see building
+        self._building = {}
+        self._manifest_path = os.path.join(self.root, "manifest.json")
+        self._lock_path = os.path.join(self.root, "manifest.lock")
+        os.makedirs(self.root, exist_ok=True)
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # drop entries whose directory disappeared
+        return {key: entry for key, entry in manifest.items() if os.path.isdir(self._path(key))}
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # another process may have changed the manifest since we last read it
+            self._manifest = self._read_manifest()
+            yield
+
+    def _write_manifest(self):
+        tmp_path = f"{self._manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    @contextmanager
+    def building(self, key):
+        """
+        Hold while looking up and building an index, so threads building the same key wait for the first
+        one and then load its result instead of building it again.
+        Args:
+        - key (str): Cache key from make_key
+        """
+        with self._lock:
+            entry = self._building.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._building[key]
+
+    def __contains__(self, key):
+        with self._locked():
+            return key in self._manifest
+
+    def get(self, key, service_context=None):
+        """
+        Load a stored index.
+        Args:
+        - key (str): Cache key from make_key
+        - service_context (ServiceContext): Service context to attach to the loaded index
+        Returns:
+        - VectorStoreIndex or None: The index, or None on a cache miss
+        """
+        with self._locked():
+            entry = self._manifest.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry["last_access"] = time.time()
+            self.hits += 1
+            self._write_manifest()
+
+        from llama_index import StorageContext, load_index_from_storage
+
+        # embeddings are memory-mapped from the .npy file, older indexes are converted on load
+        path = self._path(key)
+        storage_context = StorageContext.from_defaults(persist_dir=path, vector_store=load_vector_store(path))
+        return load_index_from_storage(storage_context, service_context=service_context)
+
+    def get_files(self, key):
+        """
+        Return the file manifest stored with an index.
+        Args:
+        - key (str): Cache key from make_key
+        Returns:
+        - dict: Mapping of file path to blob SHA, empty if none was stored
+        """
+        try:
+            with open(os.path.join(self._path(key), "files.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def latest(self, repo_id):
+        """
+        Find the most recently stored index of a repository.
+        Args:
+        - repo_id (str): Identifier from make_repo_id
+        Returns:
+        - str or None: Cache key of the newest entry for the repository
+        """
+        with self._locked():
+            keys = [key for key, entry in self._manifest.items() if entry.get("repo_id") == repo_id]
+            if not keys:
+                return None
+            return max(keys, key=lambda k: self._manifest[k]["created"])
+
+    def put(self, key, index, files=None, extra=None):
+        """
+        Persist an index and evict least recently used entries above the size limit.
+        Args:
+        - key (str): Cache key from make_key
+        - index (VectorStoreIndex): Index to persist
+        - files (dict): Mapping of file path to blob SHA, used for incremental updates
+        - extra (dict): Optional metadata stored alongside the entry
+        """
+        path = self._path(key)
+        index.storage_context.persist(persist_dir=path)
+        if files is not None:
+            with open(os.path.join(path, "files.json"), "w") as f:
+                json.dump(files, f)
+
+        with self._locked():
+            self._manifest[key] = {
+                "size": _dir_size(path),
+                "created": time.time(),
+                "last_access": time.time(),
+                **(extra or {}),
+            }
+            if self._manifest[key].get("base_key"):
+                self.updates += 1
+            self._evict()
+            self._write_manifest()
+
+    def _evict(self):
+        total = sum(entry["size"] for entry in self._manifest.values())
+        by_age = sorted(self._manifest, key=lambda k: self._manifest[k]["last_access"])
+        # never evict the most recently used entry, even if it alone is over the limit
+        for key in by_age[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= self._manifest.pop(key)["size"]
+            shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache."""
+        with self._locked():
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "updates": self.updates,
+                "entries": len(self._manifest),
+                "bytes": sum(entry["size"] for entry in self._manifest.values()),
+            }
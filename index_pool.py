@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+MAX_POOL_BYTES = int(os.getenv("GITDOC_INDEX_POOL_MAX_BYTES", 2 * 1024 ** 3))
+# holds of sessions that have not used their index for this long are dropped
+DEFAULT_HOLD_TTL = 3600
+
+# CPython sizes: a float object, a list slot pointing to it, and an empty list
+_FLOAT_BYTES = sys.getsizeof(0.0) + 8
+_LIST_BYTES = sys.getsizeof([])
+
+
+def estimate_index_bytes(index):
+    """
+    Estimate the memory used by a loaded index: its embeddings and the text of its nodes.
+    Args:
+    - index (VectorStoreIndex): Loaded index
+    Returns:
+    - int: Approximate size in bytes
+    """
+    total = 0
+    vector_store = index.vector_store
+    data = getattr(vector_store, "_data", None)
+    embedding_dict = getattr(data, "embedding_dict", None)
+    if hasattr(vector_store, "nbytes"):
+        # vector_store.NumpyVectorStore, memory-mapped pages are counted although they can be paged out
+        total += vector_store.nbytes
+    elif embedding_dict:
+        for embedding in embedding_dict.values():
+            total += _LIST_BYTES + len(embedding) * _FLOAT_BYTES
+    for node in index.docstore.docs.values():
+        total += sys.getsizeof(node.get_content()) + sum(sys.getsizeof(str(v)) for v in node.metadata.values())
+    return total
+
+
+class _Entry:
+    def __init__(self, index, size, label):
+        self.index = index
+        self.size = size
+        self.label = label
+        self.holders = {}  # holder -> last access
+        self.last_access = time.time()
+
+
+class IndexPool:
+    """
+    Process-wide registry of loaded indexes shared by all sessions.
+
+    Indexes are keyed by their index cache key (repository, commit and settings), so sessions
+    documenting the same repository use one copy of its embeddings instead of one each. Every
+    session using an index holds a reference to it; least recently used indexes without holders
+    are evicted when the estimated memory of the pool is above the ceiling. Indexes in use are
+    never evicted, so the pool can temporarily be above the ceiling.
+    """
+
+    def __init__(self, max_bytes=MAX_POOL_BYTES, hold_ttl=DEFAULT_HOLD_TTL):
+        self.max_bytes = max_bytes
+        self.hold_ttl = hold_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, holder=None):
+        """
+        Return a loaded index without loading it.
+        Args:
+        - key (str): Index cache key
+        - holder (str): Session taking a reference, None for a short-lived use
+        Returns:
+        - VectorStoreIndex or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._touch(key, entry, holder)
+            return entry.index
+
+    def acquire(self, key, load, holder=None, label=None):
+        """
+        Return the index for a key, loading it once if it is not in the pool.
+        Args:
+        - key (str): Index cache key
+        - load (callable): Returns the index, or None if it cannot be loaded
+        - holder (str): Session taking a reference, None for a short-lived use
+        - label (str): Readable name shown in the memory report
+        Returns:
+        - VectorStoreIndex or None
+        """
+        index = self.get(key, holder)
+        if index is not None:
+            with self._lock:
+                self.hits += 1
+            return index
+
+        # concurrent requests for the same index wait for one load
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            index = self.get(key, holder)
+            if index is None:
+                with self._lock:
+                    self.misses += 1
+                index = load()
+                if index is not None:
+                    self.put(key, index, holder, label)
+        with self._lock:
+            self._loading.pop(key, None)
+        return index
+
+    def put(self, key, index, holder=None, label=None):
+        """
+        Add a loaded or freshly built index and evict above the memory ceiling.
+        """
+        size = estimate_index_bytes(index)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(index, size, label or key[:12])
+            self._touch(key, entry, holder)
+            self._evict()
+
+    def _touch(self, key, entry, holder):
+        # caller must hold the lock
+        entry.last_access = time.time()
+        if holder is not None:
+            entry.holders[holder] = entry.last_access
+        self._entries.move_to_end(key)
+
+    def release(self, holder, keep=None):
+        """
+        Drop the references of a session, except on the index it is still using.
+        Args:
+        - holder (str): Session id
+        - keep (str): Key of the index the session keeps
+        """
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key != keep:
+                    entry.holders.pop(holder, None)
+            self._evict()
+
+    def _evict(self):
+        # caller must hold the lock
+        cutoff = time.time() - self.hold_ttl
+        for entry in self._entries.values():
+            for holder in [h for h, last_access in entry.holders.items() if last_access < cutoff]:
+                del entry.holders[holder]
+
+        total = sum(entry.size for entry in self._entries.values())
+        for key in [key for key, entry in self._entries.items() if not entry.holders]:
+            if total <= self.max_bytes:
+                break
+            total -= self._entries.pop(key).size
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Return the counters and the memory used by each index, most recently used first.
+        """
+        with self._lock:
+            indexes = [{"key": key, "label": entry.label, "bytes": entry.size, "refs": len(entry.holders),
+                        "last_access": entry.last_access}
+                       for key, entry in reversed(self._entries.items())]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(indexes),
+                "bytes": sum(index["bytes"] for index in indexes),
+                "max_bytes": self.max_bytes,
+                "indexes": indexes,
+            }
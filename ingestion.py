@@ -0,0 +1,443 @@
+import asyncio
+import base64
+import binascii
+import contextlib
+import fnmatch
+import hashlib
+import mmap
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import urllib.request
+
+from index_cache import resolve_commit_sha
+
+
+# paths that rarely help documentation: vendored deps, tests and generated code
+DEFAULT_EXCLUDES = [
+    "vendor/*", "*/vendor/*",
+    "node_modules/*", "*/node_modules/*",
+    "third_party/*", "*/third_party/*",
+    "tests/*", "*/tests/*", "test/*", "*/test/*",
+    "*_pb2.py", "*_pb2_grpc.py",
+    "*.min.js", "*.min.css",
+    "dist/*", "build/*",
+]
+
+DEFAULT_MAX_FILE_SIZE = 200 * 1024
+
+GITHUB_API_URL = "https://api.github.com"
+
+# directory the app may read checkouts from with the Local Path source, the source is hidden while unset
+LOCAL_ROOT = os.getenv("GITDOC_LOCAL_ROOT")
+
+
+async def _list_tree(github_client, owner, repo, tree_sha, concurrent_requests=10):
+    # one request for the whole tree, Github truncates very large trees and those are walked level by level
+    tree = await github_client.get_tree(owner, repo, f"{tree_sha}?recursive=1")
+    if not tree.truncated:
+        return [(obj.path, obj.sha, obj.size) for obj in tree.tree if obj.type == "blob"]
+    return await _walk_tree(github_client, owner, repo, tree_sha, asyncio.Semaphore(concurrent_requests))
+
+
+async def _walk_tree(github_client, owner, repo, tree_sha, semaphore, prefix=""):
+    async with semaphore:
+        tree = await github_client.get_tree(owner, repo, tree_sha)
+    blobs = []
+    subtrees = []
+    for obj in tree.tree:
+        path = prefix + obj.path
+        if obj.type == "blob":
+            blobs.append((path, obj.sha, obj.size))
+        elif obj.type == "tree":
+            subtrees.append(_walk_tree(github_client, owner, repo, obj.sha, semaphore, path + "/"))
+
+    for sub_blobs in await asyncio.gather(*subtrees):
+        blobs.extend(sub_blobs)
+    return blobs
+
+
+def select_files(entries, file_types, excludes=(), max_file_size=None):
+    """
+    Filter tree entries by extension, exclude patterns and size.
+    Args:
+    - entries (list): (path, blob SHA, size in bytes) tuples
+    - file_types (list): File extensions to include
+    - excludes (list): fnmatch patterns matched against the file path
+    - max_file_size (int): Skip files larger than this many bytes, no limit if None
+    Returns:
+    - dict: Mapping of file path to blob SHA
+    """
+    files = {}
+    for path, sha, size in entries:
+        if os.path.splitext(path)[1] not in file_types:
+            continue
+        if any(fnmatch.fnmatch(path, pattern) for pattern in excludes):
+            continue
+        if max_file_size is not None and size is not None and size > max_file_size:
+            continue
+        files[path] = sha
+    return files
+
+
+def list_files(github_client, owner, repo, commit_sha, file_types, excludes=(), max_file_size=None,
+               concurrent_requests=10):
+    """
+    List the files of a commit together with their blob SHAs, without downloading them.
+    Args:
+    - github_client (GithubClient): Authenticated llama_hub Github client
+    - owner (str): Repository owner
+    - repo (str): Repository name
+    - commit_sha (str): Commit SHA
+    - file_types (list): File extensions to include
+    - excludes (list): fnmatch patterns of paths to skip
+    - max_file_size (int): Skip files larger than this many bytes
+    - concurrent_requests (int): Maximum number of tree requests in flight when a truncated tree is walked
+    Returns:
+    - dict: Mapping of file path to blob SHA
+    """
+    async def _list():
+        commit = await github_client.get_commit(owner, repo, commit_sha)
+        return await _list_tree(github_client, owner, repo, commit.commit.tree.sha, concurrent_requests)
+
+    return select_files(asyncio.run(_list()), file_types, excludes, max_file_size)
+
+
+def make_doc_id(path, sha):
+    """
+    Build the doc_id of a file, unique per path even for files with identical content.
+    Args:
+    - path (str): File path relative to the repository root
+    - sha (str): Blob SHA
+    Returns:
+    - str: "<path>@<sha>"
+    """
+    return f"{path}@{sha}"
+
+
+def split_doc_id(doc_id):
+    """Return the (path, blob SHA) of a doc_id built by make_doc_id."""
+    path, _, sha = doc_id.rpartition("@")
+    return path, sha
+
+
+def make_document(owner, repo, commit_sha, path, sha, content):
+    """
+    Build a Document the same way GithubRepositoryReader does.
+    Args:
+    - owner (str): Repository owner
+    - repo (str): Repository name
+    - commit_sha (str): Commit SHA the file was read at
+    - path (str): File path relative to the repository root
+    - sha (str): Blob SHA, part of the doc_id, see make_doc_id
+    - content (bytes): Raw file content, any bytes-like object such as an mmap
+    Returns:
+    - Document or None: None if the file is not utf-8 text
+    """
+    try:
+        text = str(content, "utf-8")
+    except UnicodeDecodeError:
+        return None
+    from llama_index import Document
+
+    url = os.path.join("https://github.com/", owner, repo, "blob/", commit_sha, path)
+    return Document(
+        text=text,
+        doc_id=make_doc_id(path, sha),
+        extra_info={"file_path": path, "file_name": path.split("/")[-1], "url": url},
+    )
+
+
+async def _fetch_document(github_client, owner, repo, commit_sha, path, sha):
+    blob = await github_client.get_blob(owner, repo, sha)
+    try:
+        content = base64.b64decode(blob.content)
+    except binascii.Error:
+        return None
+    return make_document(owner, repo, commit_sha, path, sha, content)
+
+
+async def _fetch_batch(github_client, owner, repo, commit_sha, batch):
+    # gathered inside a coroutine: outside a running loop gather needs a current event loop,
+    # and there is none once list_files has run asyncio.run
+    return await asyncio.gather(
+        *(_fetch_document(github_client, owner, repo, commit_sha, path, sha) for path, sha in batch)
+    )
+
+
+def iter_documents(github_client, owner, repo, commit_sha, files, concurrent_requests=10):
+    """
+    Fetch files from the Github API and yield them as documents as soon as each batch arrives.
+    Args:
+    - github_client (GithubClient): Authenticated llama_hub Github client
+    - owner (str): Repository owner
+    - repo (str): Repository name
+    - commit_sha (str): Commit SHA
+    - files (dict): Mapping of file path to blob SHA, see list_files
+    - concurrent_requests (int): Number of blobs fetched at once
+    Yields:
+    - Document: One document per utf-8 text file
+    """
+    loop = asyncio.new_event_loop()
+    items = list(files.items())
+    try:
+        for start in range(0, len(items), concurrent_requests):
+            batch = items[start:start + concurrent_requests]
+            docs = loop.run_until_complete(_fetch_batch(github_client, owner, repo, commit_sha, batch))
+            for doc in docs:
+                if doc is not None:
+                    yield doc
+    finally:
+        loop.close()
+
+
+def _blob_sha(data):
+    # same digest git uses for blobs, so local and API sources share doc_ids
+    digest = hashlib.sha1(b"blob %d\0" % len(data))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+@contextlib.contextmanager
+def _mapped(path):
+    size = os.path.getsize(path)
+    if size == 0:
+        # mmap cannot map empty files
+        yield b""
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+
+def _inside(real_root, full_path):
+    # symlinks are followed when reading, so their targets must stay in the checkout too
+    return os.path.commonpath([real_root, os.path.realpath(full_path)]) == real_root
+
+
+def list_local_files(root, file_types, excludes=(), max_file_size=None):
+    """
+    List the files of a local checkout together with their git blob SHAs.
+    Args:
+    - root (str): Directory of the checkout
+    - file_types (list): File extensions to include
+    - excludes (list): fnmatch patterns of paths to skip
+    - max_file_size (int): Skip files larger than this many bytes
+    Returns:
+    - dict: Mapping of file path (relative, with forward slashes) to blob SHA, files linking out of root are skipped
+    """
+    real_root = os.path.realpath(root)
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name != ".git"]
+        for name in filenames:
+            full_path = os.path.join(dirpath, name)
+            if not os.path.isfile(full_path) or not _inside(real_root, full_path):
+                continue
+            path = os.path.relpath(full_path, root).replace(os.sep, "/")
+            entries.append((path, full_path, os.path.getsize(full_path)))
+
+    # filter first so that only selected files are hashed
+    selected = select_files(entries, file_types, excludes, max_file_size)
+    files = {}
+    for path, full_path in selected.items():
+        with _mapped(full_path) as data:
+            files[path] = _blob_sha(data)
+    return files
+
+
+def iter_local_documents(root, owner, repo, commit_sha, files):
+    """
+    Read files of a local checkout as documents using memory-mapped reads.
+    Args:
+    - root (str): Directory of the checkout
+    - owner (str): Repository owner, used for the document url
+    - repo (str): Repository name, used for the document url
+    - commit_sha (str): Commit SHA of the checkout
+    - files (dict): Mapping of file path to blob SHA, see list_local_files
+    Yields:
+    - Document: One document per utf-8 text file
+    """
+    real_root = os.path.realpath(root)
+    for path, sha in files.items():
+        full_path = os.path.join(root, *path.split("/"))
+        if not _inside(real_root, full_path):
+            continue
+        with _mapped(full_path) as data:
+            doc = make_document(owner, repo, commit_sha, path, sha, data)
+        if doc is not None:
+            yield doc
+
+
+class GithubApiSource:
+    """Reads a repository file by file through the Github REST API."""
+
+    def __init__(self, github_client, owner, repo, branch, concurrent_requests=10):
+        self.github_client = github_client
+        self.owner = owner
+        self.repo = repo
+        self.branch = branch
+        self.concurrent_requests = concurrent_requests
+        self.commit_sha = None
+
+    def resolve(self):
+        """Resolve the branch to a commit SHA."""
+        if self.commit_sha is None:
+            self.commit_sha = resolve_commit_sha(self.github_client, self.owner, self.repo, self.branch)
+        return self.commit_sha
+
+    def list_files(self, file_types, excludes=(), max_file_size=None):
+        return list_files(self.github_client, self.owner, self.repo, self.resolve(),
+                          file_types, excludes, max_file_size, self.concurrent_requests)
+
+    def iter_documents(self, files):
+        return iter_documents(self.github_client, self.owner, self.repo, self.resolve(), files,
+                              self.concurrent_requests)
+
+    def close(self):
+        pass
+
+
+def resolve_local_path(path, root=LOCAL_ROOT):
+    """
+    Resolve a directory entered by a user against the allowed root.
+    Args:
+    - path (str): Directory, absolute or relative to root
+    - root (str): Directory the path must lie in
+    Returns:
+    - str or None: The real path, None if there is no root, or the path leaves it or is not a directory
+    """
+    if not root or not path:
+        return None
+    root = os.path.realpath(root)
+    # realpath resolves '..' and symlinks before the check
+    path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+        return None
+    return path
+
+
+class LocalSource:
+    """Reads a repository from a directory on disk, e.g. an existing checkout."""
+
+    def __init__(self, path, owner="local", repo=None):
+        self.root = os.path.abspath(path)
+        self.owner = owner
+        self.repo = repo or self.root
+        self.commit_sha = None
+
+    def resolve(self):
+        """
+        Return the checked out commit SHA, or a fingerprint of the files for directories outside git.
+        The fingerprint is appended when the directory differs from the commit: it has changed,
+        untracked or ignored files, or it is only a part of the repository.
+        """
+        if self.commit_sha is None:
+            try:
+                self.commit_sha = self._git("rev-parse", "HEAD")
+                top_level = self._git("rev-parse", "--show-toplevel")
+                # every file in the directory counts, the listing does not skip ignored files either
+                changes = self._git("status", "--porcelain", "--ignored", "--untracked-files=all", "--", ".")
+                if changes or os.path.realpath(top_level) != os.path.realpath(self.root):
+                    self.commit_sha += "-" + self._fingerprint()
+            except (OSError, subprocess.CalledProcessError):
+                self.commit_sha = self._fingerprint()
+        return self.commit_sha
+
+    def _git(self, *args):
+        return subprocess.run(["git", "-C", self.root, *args], capture_output=True, text=True,
+                              check=True).stdout.strip()
+
+    def _fingerprint(self):
+        digest = hashlib.sha1()
+        real_root = os.path.realpath(self.root)
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(name for name in dirnames if name != ".git")
+            for name in sorted(filenames):
+                full_path = os.path.join(dirpath, name)
+                if not os.path.isfile(full_path) or not _inside(real_root, full_path):
+                    continue
+                stat = os.stat(full_path)
+                digest.update(f"{dirpath}/{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+        return "local-" + digest.hexdigest()
+
+    def list_files(self, file_types, excludes=(), max_file_size=None):
+        return list_local_files(self.root, file_types, excludes, max_file_size)
+
+    def iter_documents(self, files):
+        return iter_local_documents(self.root, self.owner, self.repo, self.resolve(), files)
+
+    def close(self):
+        pass
+
+
+class ArchiveSource(LocalSource):
+    """
+    Downloads a single tarball of the commit and reads it from disk,
+    instead of one API call per file.
+    """
+
+    def __init__(self, github_client, owner, repo, branch, token=None, base_url=GITHUB_API_URL):
+        self.github_client = github_client
+        self.owner = owner
+        self.repo = repo
+        self.branch = branch
+        self.token = token
+        self.base_url = base_url
+        self.commit_sha = None
+        self._tmp_dir = None
+        self._root = None
+
+    def resolve(self):
+        if self.commit_sha is None:
+            self.commit_sha = resolve_commit_sha(self.github_client, self.owner, self.repo, self.branch)
+        return self.commit_sha
+
+    @property
+    def root(self):
+        # the archive is only downloaded once files are actually needed, i.e. on an index cache miss
+        if self._root is None:
+            self._tmp_dir = tempfile.mkdtemp(prefix="gitdoc-")
+            self._root = download_archive(self.owner, self.repo, self.resolve(), self._tmp_dir, self.token,
+                                          self.base_url)
+        return self._root
+
+    def close(self):
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+            self._root = None
+
+
+def download_archive(owner, repo, commit_sha, dest, token=None, base_url=GITHUB_API_URL):
+    """
+    Download and unpack the tarball of a commit.
+    Args:
+    - owner (str): Repository owner
+    - repo (str): Repository name
+    - commit_sha (str): Commit SHA
+    - dest (str): Directory to unpack into
+    - token (str): Github token, required for private repositories
+    - base_url (str): Github API URL, the same as the base_url of the GithubClient
+    Returns:
+    - str: Directory containing the repository files
+    """
+    request = urllib.request.Request(f"{base_url}/repos/{owner}/{repo}/tarball/{commit_sha}")
+    request.add_header("Accept", "application/vnd.github+json")
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+
+    archive_path = os.path.join(dest, "archive.tar.gz")
+    with urllib.request.urlopen(request) as response, open(archive_path, "wb") as f:
+        shutil.copyfileobj(response, f)
+
+    with tarfile.open(archive_path, "r:gz") as archive:
+        archive.extractall(dest, filter="data")
+    os.remove(archive_path)
+
+    # Github wraps the files in a single "<owner>-<repo>-<sha>" directory
+    entries = os.listdir(dest)
+    if len(entries) == 1 and os.path.isdir(os.path.join(dest, entries[0])):
+        return os.path.join(dest, entries[0])
+    return dest
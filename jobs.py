@@ -0,0 +1,249 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, jobs of other queues are then always taken over on restart
+    fcntl = None
+
+from index_cache import CACHE_DIR
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_WORKERS = int(os.getenv("GITDOC_JOB_WORKERS", 2))
+# finished jobs are kept this long so that sessions can still pick up their result
+DEFAULT_RETENTION = 24 * 3600
+
+
+class JobContext:
+    """
+    Handle passed to a job runner to report progress and stream output.
+
+    It has the `markdown` method of a Streamlit placeholder, so a StreamRenderer can write to it
+    and store the text at the renderer's bounded rate. `secrets` holds the credentials the job was
+    submitted with, which are only kept in memory.
+    """
+
+    def __init__(self, queue, job_id, secrets=None):
+        self.queue = queue
+        self.job_id = job_id
+        self.secrets = secrets or {}
+
+    def progress(self, fraction, message=None):
+        """
+        Report progress.
+        Args:
+        - fraction (float): Progress between 0 and 1
+        - message (str): Short description of the current step
+        """
+        self.queue._update(self.job_id, progress=fraction, message=message)
+
+    def markdown(self, text):
+        """Store the text generated so far."""
+        self.queue._update(self.job_id, output=text)
+
+    def summary(self, kind, name, text):
+        """
+        Store the latest intermediate result, e.g. a file or package summary of the map-reduce mode.
+        Args:
+        - kind (str): What was summarized, e.g. "file" or "package"
+        - name (str): Path of the file or package
+        - text (str): The summary
+        """
+        self.queue._update(self.job_id, summary=json.dumps({"kind": kind, "name": name, "text": text}))
+
+
+class JobQueue:
+    """
+    Runs long generations on a background thread pool, tracked in a SQLite table.
+
+    Jobs are keyed by everything that determines their result, so submitting the same repository,
+    commit and settings while a job for it is queued or running returns the existing job instead
+    of starting another. Status, progress and the text streamed so far are stored in the table,
+    where any session can poll them by job id. Jobs that were queued or running when the process
+    stopped are restarted, except jobs submitted with secrets: those are never written to the table,
+    so such jobs fail and have to be submitted again.
+
+    Each queue records itself as the owner of its jobs and holds a file lock for as long as its
+    process lives, so a queue started on the same database only takes over the jobs of queues
+    whose process is gone, not those of another process that is still running.
+    """
+
+    def __init__(self, runner, path=None, workers=DEFAULT_WORKERS, retention=DEFAULT_RETENTION):
+        """
+        Args:
+        - runner (callable): runner(params, job) does the work and returns a JSON serializable result,
+          job is a JobContext
+        - path (str): SQLite file, defaults to jobs.sqlite3 in the cache directory
+        - workers (int): Number of jobs run at once
+        - retention (int): Seconds finished jobs are kept
+        """
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "jobs.sqlite3")
+        self.runner = runner
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, key TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "progress REAL NOT NULL DEFAULT 0, message TEXT, output TEXT NOT NULL DEFAULT '', "
+            "result TEXT, error TEXT, created REAL NOT NULL, started REAL, finished REAL, "
+            "has_secrets INTEGER NOT NULL DEFAULT 0, owner TEXT, summary TEXT)"
+        )
+        for column in ("has_secrets INTEGER NOT NULL DEFAULT 0", "owner TEXT", "summary TEXT"):
+            try:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                # the column exists already
+                pass
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+        self._conn.commit()
+        self._secrets = {}
+        self._owners_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "job-owners")
+        self.owner = uuid.uuid4().hex
+        self._owner_lock = self._hold_owner_lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gitdoc-job")
+        self._restart()
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Hash the parts that determine the result of a job: repository, commit and settings.
+        """
+        return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def _hold_owner_lock(self):
+        # released by the operating system when the process ends, however it ends
+        if fcntl is None:
+            return None
+        os.makedirs(self._owners_dir, exist_ok=True)
+        lock_file = open(os.path.join(self._owners_dir, f"{self.owner}.lock"), "a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _owner_gone(self, owner):
+        if owner is None or fcntl is None:
+            return True
+        lock_path = os.path.join(self._owners_dir, f"{owner}.lock")
+        try:
+            with open(lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # nobody holds the lock of this owner anymore
+        with contextlib.suppress(OSError):
+            os.remove(lock_path)
+        return True
+
+    def _restart(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, params, has_secrets, owner FROM jobs WHERE status IN (?, ?)",
+                                      (QUEUED, RUNNING)).fetchall()
+        restarted = []
+        for job_id, params, has_secrets, owner in rows:
+            if not self._owner_gone(owner):
+                continue
+            with self._lock:
+                # only one queue takes over a job, even if several start at once
+                if has_secrets:
+                    # the secrets of these jobs were lost with the process, running them would need someone else's
+                    cursor = self._conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ? AND owner IS ?",
+                        (FAILED, "The server restarted before the job finished, please generate again.",
+                         time.time(), job_id, owner))
+                else:
+                    cursor = self._conn.execute(
+                        "UPDATE jobs SET status = ?, progress = 0, message = NULL, output = '', summary = NULL, "
+                        "owner = ? WHERE id = ? AND owner IS ?", (QUEUED, self.owner, job_id, owner))
+                self._conn.commit()
+            if cursor.rowcount and not has_secrets:
+                restarted.append((job_id, json.loads(params)))
+        for job_id, params in restarted:
+            self._pool.submit(self._run, job_id, params)
+
+    def submit(self, key, params, secrets=None):
+        """
+        Queue a job, or return the job already queued or running for the same key.
+        Args:
+        - key (str): Key from make_key, without the secrets: a job joined by another session keeps its own
+        - params (dict): JSON serializable arguments of the runner
+        - secrets (dict): Credentials of the job, passed to the runner as job.secrets and never stored
+        Returns:
+        - str: Job id
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM jobs WHERE key = ? AND status IN (?, ?)",
+                                     (key, QUEUED, RUNNING)).fetchone()
+            if row is not None:
+                return row[0]
+            job_id = uuid.uuid4().hex
+            self._conn.execute("INSERT INTO jobs (id, key, status, params, created, has_secrets, owner) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (job_id, key, QUEUED, json.dumps(params), now, bool(secrets), self.owner))
+            if secrets:
+                self._secrets[job_id] = secrets
+            self._conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?",
+                               (DONE, FAILED, now - self.retention))
+            self._conn.commit()
+        self._pool.submit(self._run, job_id, params)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _run(self, job_id, params):
+        self._update(job_id, status=RUNNING, started=time.time())
+        with self._lock:
+            secrets = self._secrets.pop(job_id, None)
+        try:
+            result = self.runner(params, JobContext(self, job_id, secrets))
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=f"{type(e).__name__}: {e}", finished=time.time())
+        else:
+            self._update(job_id, status=DONE, progress=1.0, result=json.dumps(result), error=None,
+                         finished=time.time())
+
+    def get(self, job_id):
+        """
+        Return the state of a job.
+        Args:
+        - job_id (str): Id returned by submit
+        Returns:
+        - dict or None: id, status, params, progress, message, output, the latest summary (kind, name, text),
+          result, error and timestamps, None if the job is unknown or expired
+        """
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([column[0] for column in cursor.description], row))
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        job["summary"] = json.loads(job["summary"]) if job["summary"] is not None else None
+        return job
+
+    def stats(self):
+        """Return the number of jobs in each status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, **dict(rows)}
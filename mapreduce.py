@@ -0,0 +1,202 @@
+import hashlib
+import os
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from index_cache import CACHE_DIR
+from ingestion import split_doc_id
+
+
+# bump when the prompts below change, so cached summaries are regenerated
+PROMPT_VERSION = "1"
+
+# characters of source or summaries sent in one request
+MAX_PROMPT_CHARS = 24000
+
+DEFAULT_WORKERS = 8
+
+FILE_PROMPT = """
+Summarize the file `{path}` for a {audience} audience. Describe its purpose, the main classes and functions
+with their parameters and return values, the dependencies, data sources or APIs it uses, and any edge cases
+or limitations. Be concise, use markdown bullet points and do not repeat the code.
+
+{content}
+"""
+
+PACKAGE_PROMPT = """
+Below are summaries of the files in the `{package}` package of a code repository. Combine them into one
+concise summary of the package for a {audience} audience: what it is responsible for, how the files work
+together, the public entry points, and its dependencies.
+
+{content}
+"""
+
+REPO_PROMPT = """
+Below are summaries of every package of a code repository. Using them, generate clear, concise, and
+comprehensive documentation for the repository ensuring you explain its functionality, usage, parameters,
+and any potential edge cases or limitations. Also, make sure to include any dependencies, data sources or
+APIs that are used.
+The documentation should be written for a {audience} audience.
+
+{content}
+"""
+
+
+class SummaryCache:
+    """
+    Stores generated summaries on disk, one file per key.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.root = os.path.join(cache_dir, "summaries")
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256("\0".join((PROMPT_VERSION,) + parts).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.root, key), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, summary):
+        # a unique temporary file, the same summary may be written by several threads or processes at once
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(summary)
+        os.replace(tmp_path, os.path.join(self.root, key))
+
+
+def files_from_index(index):
+    """
+    Rebuild file contents from the nodes stored in an index.
+    Args:
+    - index (VectorStoreIndex): Index built with chunking.CodeNodeParser
+    Returns:
+    - dict: Mapping of file path to (blob SHA, list of node texts in file order)
+    """
+    nodes_by_path = defaultdict(list)
+    for node in index.docstore.docs.values():
+        path = node.metadata.get("file_path")
+        if path:
+            nodes_by_path[path].append(node)
+
+    files = {}
+    for path, nodes in nodes_by_path.items():
+        nodes.sort(key=lambda node: node.metadata.get("start_line", 0))
+        files[path] = (split_doc_id(nodes[0].ref_doc_id)[1], [node.get_content() for node in nodes])
+    return files
+
+
+def _pack(texts, max_chars):
+    # group consecutive texts so that every group fits in one prompt
+    pieces = [text[start:start + max_chars] for text in texts for start in range(0, max(len(text), 1), max_chars)]
+    groups, group, size = [], [], 0
+    for piece in pieces:
+        if group and size + len(piece) > max_chars:
+            groups.append(group)
+            group, size = [], 0
+        group.append(piece)
+        size += len(piece)
+    if group:
+        groups.append(group)
+    return groups
+
+
+class MapReduceGenerator:
+    """
+    Documents a whole repository by summarizing every file, then every package, then the repository.
+
+    File summaries run in parallel on a thread pool and are cached by path and blob SHA, package summaries
+    are cached by the SHAs of their files, so regenerating after a small change only summarizes
+    the changed files and the packages they belong to.
+    """
+
+    def __init__(self, llm, model, audience, cache=None, workers=DEFAULT_WORKERS, max_chars=MAX_PROMPT_CHARS):
+        self.llm = llm
+        self.model = model
+        self.audience = audience
+        self.cache = cache if cache is not None else SummaryCache()
+        self.workers = workers
+        self.max_chars = max_chars
+
+    def _complete(self, prompt):
+        return self.llm.complete(prompt).text.strip()
+
+    def _summarize(self, template, name, texts):
+        # texts that do not fit in one prompt are summarized in parts and the parts combined
+        groups = _pack(texts, self.max_chars)
+        while len(groups) > 1:
+            parts = [self._complete(template.format(path=name, package=name, audience=self.audience,
+                                                    content="\n\n".join(group))) for group in groups]
+            groups = _pack(parts, self.max_chars)
+        return self._complete(template.format(path=name, package=name, audience=self.audience,
+                                              content="\n\n".join(groups[0])))
+
+    def _cached(self, key, fn, *args):
+        summary = self.cache.get(key)
+        if summary is None:
+            summary = fn(*args)
+            self.cache.put(key, summary)
+        return summary
+
+    def _run_level(self, jobs):
+        # jobs: name -> (cache key, template, texts); yields (name, summary) as each completes
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                pool.submit(self._cached, key, self._summarize, template, name, texts): name
+                for name, (key, template, texts) in jobs.items()
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def generate(self, files):
+        """
+        Run the map and reduce stages.
+        Args:
+        - files (dict): Mapping of file path to (blob SHA, list of text parts), see files_from_index
+        Yields:
+        - tuple: ("file" | "package", name, summary) as each summary completes,
+          then ("token", None, delta) for the streamed repository documentation
+        """
+        file_jobs = {
+            # the prompt names the file, so identical files at other paths get their own summary
+            path: (self.cache.make_key(self.model, self.audience, "file", path, sha), FILE_PROMPT,
+                   [f"```\n{text}\n```" for text in texts])
+            for path, (sha, texts) in files.items()
+        }
+        file_summaries = {}
+        for path, summary in self._run_level(file_jobs):
+            file_summaries[path] = summary
+            yield "file", path, summary
+
+        packages = defaultdict(list)
+        for path in sorted(files):
+            packages[os.path.dirname(path) or "."].append(path)
+
+        package_jobs = {}
+        for package, paths in packages.items():
+            shas = ",".join(f"{path}={files[path][0]}" for path in paths)
+            package_jobs[package] = (
+                self.cache.make_key(self.model, self.audience, "package", shas), PACKAGE_PROMPT,
+                [f"### {path}\n{file_summaries[path]}" for path in paths],
+            )
+        package_summaries = {}
+        for package, summary in self._run_level(package_jobs):
+            package_summaries[package] = summary
+            yield "package", package, summary
+
+        texts = [f"## {package}\n{package_summaries[package]}" for package in sorted(package_summaries)]
+        groups = _pack(texts, self.max_chars)
+        while len(groups) > 1:
+            texts = [self._complete(PACKAGE_PROMPT.format(package="repository", audience=self.audience,
+                                                          content="\n\n".join(group))) for group in groups]
+            groups = _pack(texts, self.max_chars)
+
+        prompt = REPO_PROMPT.format(audience=self.audience, content="\n\n".join(groups[0]) if groups else "")
+        for response in self.llm.stream_complete(prompt):
+            yield "token", None, response.delta
@@ -0,0 +1,87 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import Tracer
+
+
+DEFAULT_WORKERS = 2
+DEFAULT_CACHE_ENTRIES = 32
+
+
+def render_pdf(markdown_text, flowchart_png=None):
+    """
+    Convert the generated documentation and optional flowchart to a PDF.
+    Args:
+    - markdown_text (str): Generated documentation
+    - flowchart_png (bytes): Rendered flowchart, appended after the documentation
+    Returns:
+    - bytes: PDF content
+    """
+    # imported on first export, most sessions never export a PDF
+    import markdown
+    import pdfkit
+
+    # convert markdown to html for pdf export
+    html_output = markdown.markdown(markdown_text)
+
+    if flowchart_png is not None:
+        # Embed the base64 encoded image in HTML
+        encoded_image_data = base64.b64encode(flowchart_png).decode('utf-8')
+        html_output += f'<img src="data:image/png;base64,{encoded_image_data}" alt="Flowchart diagram" />'
+
+    # output_path=False returns the pdf bytes instead of writing a file
+    return pdfkit.from_string(html_output, False)
+
+
+class PdfExporter:
+    """
+    Renders PDFs on a bounded worker pool, off the Streamlit script thread.
+
+    Results are cached by a hash of the markdown and the flowchart, and concurrent requests
+    for the same content share one render. Renders are recorded as pdf_export spans.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, cache_entries=DEFAULT_CACHE_ENTRIES, tracer=None):
+        self.cache_entries = cache_entries
+        self.tracer = tracer if tracer is not None else Tracer()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-export")
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(markdown_text, flowchart_png=None):
+        digest = hashlib.sha256(markdown_text.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(flowchart_png or b"")
+        return digest.hexdigest()
+
+    def _render(self, markdown_text, flowchart_png, trace_id):
+        with self.tracer.span("pdf_export", trace_id=trace_id) as span:
+            pdf = render_pdf(markdown_text, flowchart_png)
+            span.set(bytes=len(pdf))
+            return pdf
+
+    def submit(self, markdown_text, flowchart_png=None, trace_id=None):
+        """
+        Start rendering a PDF, or return the render already started for the same content.
+        Args:
+        - markdown_text (str): Generated documentation
+        - flowchart_png (bytes): Rendered flowchart
+        - trace_id (str): Trace the render span belongs to
+        Returns:
+        - Future: Resolves to the PDF bytes
+        """
+        key = self.make_key(markdown_text, flowchart_png)
+        with self._lock:
+            future = self._futures.get(key)
+            # failed renders are retried on the next request
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._pool.submit(self._render, markdown_text, flowchart_png, trace_id)
+                self._futures[key] = future
+            self._futures.move_to_end(key)
+            while len(self._futures) > self.cache_entries:
+                self._futures.popitem(last=False)
+            return future
@@ -0,0 +1,674 @@
+import functools
+import os
+import re
+import time
+from contextlib import contextmanager
+
+from embedding import DEFAULT_CONCURRENCY, EmbeddingProgress, embed_nodes
+from graph_sandbox import GraphSandbox
+from index_cache import IndexCache, make_key, make_repo_id
+from incremental import update_index
+from ingestion import DEFAULT_EXCLUDES, DEFAULT_MAX_FILE_SIZE, ArchiveSource, GithubApiSource, LocalSource
+from mapreduce import REPO_PROMPT, MapReduceGenerator, SummaryCache, files_from_index
+from pdf_export import render_pdf
+from response_cache import ResponseCache, replay
+from static_graph import REFINE_PROMPT, AnalysisCache, build_graphs, call_graph_dot, extract_dot, import_graph_dot
+from streaming import StreamRenderer
+from tracing import Tracer, new_trace_id
+from vector_store import NumpyVectorStore
+
+
+SYSTEM_PROMPT = "You are a software development expert who is helping write code documentation for different audiences"
+
+DOC_PROMPT = """
+    Generate clear, concise, and comprehensive documentation for the code in context ensuring you explain its
+    functionality, usage, parameters, and any potential edge cases or limitations. Also, make sure to include any dependencies,
+    data sources or APIs that are used.
+    The documentation should be written for a {audience} audience.
+    """
+
+DIAGRAM_PROMPT = """
+    Create flowchart diagram for the code in context using Graphviz in Python.
+    Ensure that the diagram is clear and shows the most important parts of the code.
+    Use common naming conventions, and DO NOT render the dot variable.
+    DO NOT include pip install steps.
+    The diagram should be written for a {audience} audience.
+    """
+
+# the documentation the diagram is based on is shortened to its outline, long map-reduce output would not fit the prompt
+DIAGRAM_OUTLINE_CHARS = 6000
+
+GENERATION_MODES = ['Retrieval', 'Map-Reduce']
+DIAGRAM_MODES = ['LLM Flowchart', 'Static Call Graph', 'Static Import Graph']
+SOURCES = ['GitHub API', 'Archive Download', 'Local Path']
+
+
+def parse_github_url(url):
+    """
+    Split a GitHub URL into owner, repository and branch.
+    Args:
+    - url (str): e.g. https://github.com/owner/repo or https://github.com/owner/repo/tree/branch
+    Returns:
+    - tuple: (owner, repo, branch), branch defaults to main
+    """
+    # Regex pattern to match the structure of GitHub URL
+    pattern = re.compile(r"https?://github\.com/(?P<owner>[^/]+)/(?P<repo>[^/]+)(/tree/(?P<branch>[^/]+))?")
+
+    match = pattern.match(url)
+    if not match:
+        raise ValueError("Invalid GitHub URL")
+
+    # Extract the components from the URL
+    return match.group('owner'), match.group('repo'), match.group('branch') if match.group('branch') else 'main'
+
+
+def make_source(source, owner=None, repo=None, branch=None, local_path=None, token=None, commit_sha=None):
+    """
+    Build an ingestion backend.
+    Args:
+    - source (str): One of SOURCES
+    - owner, repo, branch (str): GitHub repository, unused for Local Path
+    - local_path (str): Checkout directory, only used for Local Path
+    - token (str): GitHub token, defaults to the GITHUB_TOKEN environment variable
+    - commit_sha (str): Commit the branch was already resolved to, pins the source to it
+    Returns:
+    - GithubApiSource, ArchiveSource or LocalSource
+    """
+    token = token or os.getenv("GITHUB_TOKEN")
+    if source == 'Local Path':
+        backend = LocalSource(local_path)
+    else:
+        from llama_hub.github_repo import GithubClient
+
+        if source == 'Archive Download':
+            backend = ArchiveSource(GithubClient(token), owner, repo, branch, token=token)
+        else:
+            backend = GithubApiSource(GithubClient(token), owner, repo, branch, concurrent_requests=10)
+    backend.commit_sha = commit_sha
+    return backend
+
+
+def get_service_context(model, api_key=None):
+    """
+    Return the service context (LLM client, embedding model and node parser) for a model and API key.
+    Service contexts are built on first use and shared by all pipelines of the process using the same key.
+    Args:
+    - model (str): OpenAI chat model
+    - api_key (str): OpenAI API key, defaults to the OPENAI_API_KEY environment variable
+    Returns:
+    - ServiceContext
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("No OpenAI API key, enter one or set OPENAI_API_KEY")
+    return _service_context(model, api_key)
+
+
+@functools.lru_cache(maxsize=16)
+def _service_context(model, api_key):
+    from llama_index import ServiceContext
+    from llama_index.embeddings import OpenAIEmbedding
+    from llama_index.llms import OpenAI
+
+    from chunking import CodeNodeParser
+
+    # the key is passed to the clients, never read from the openai module, which all sessions share
+    return ServiceContext.from_defaults(
+        llm=OpenAI(model=model, temperature=0, system_prompt=SYSTEM_PROMPT, api_key=api_key),
+        embed_model=OpenAIEmbedding(api_key=api_key), node_parser=CodeNodeParser())
+
+
+def format_progress(progress):
+    """
+    Describe indexing progress in one line.
+    Args:
+    - progress (EmbeddingProgress): Progress of Pipeline.insert_documents
+    Returns:
+    - str: Files, chunks and tokens done and the estimated time left
+    """
+    eta = f"{progress.eta:.0f}s" if progress.eta is not None else "..."
+    return (f"Indexing: {progress.files}/{progress.total_files} files, {progress.nodes} chunks, "
+            f"{progress.tokens:,} tokens embedded, ETA {eta}")
+
+
+def _process_code_block(block):
+    """
+    Process a code block so it can be executed in the graph sandbox.
+    Args:
+    - block (str): The extracted code block
+    Returns:
+    - str: Processed code block
+    """
+
+    block = block.replace('python', '').strip()
+
+    # if there are lines that start with dot.save, dot.render or dot.view, remove them
+    block = re.sub(r'dot\.(save|render|view)\(.*?\)', '', block)
+
+    # the sandbox has no Streamlit, the diagram is displayed by the app from the returned DOT source
+    block = re.sub(r'^\s*(import streamlit.*|st\..*)$', '', block, flags=re.MULTILINE)
+
+    return block
+
+
+def extract_code(gpt_response):
+    """
+    Extract code or SQL query from a GPT response.
+    Args:
+    - gpt_response (str): The string response from GPT
+    Returns:
+    - str: Extracted code or SQL query
+    """
+
+    # Search for text blocks enclosed by ```
+    pattern = r'```(.*?)```'
+    extracted_code_list = re.findall(pattern, gpt_response, re.DOTALL)
+
+    # If no code blocks are found, return an empty string
+    if not extracted_code_list:
+        return ""
+
+    # If there's only one block, process and return it
+    if len(extracted_code_list) == 1:
+        return _process_code_block(extracted_code_list[0])
+
+    # If bash is in the first code block (indicating pip install or similar commands),
+    # and there's a second block, return the second block
+    if "bash" in extracted_code_list[0] and len(extracted_code_list) > 1:
+        return _process_code_block(extracted_code_list[1])
+
+    # In other cases, just return the first block
+    return _process_code_block(extracted_code_list[0])
+
+
+def outline_markdown(text, max_chars=DIAGRAM_OUTLINE_CHARS):
+    """
+    Shorten markdown to its headings and the first paragraph of each section, without code blocks.
+    Args:
+    - text (str): Markdown, e.g. the generated documentation
+    - max_chars (int): Maximum length of the outline
+    Returns:
+    - str: The outline
+    """
+    lines, paragraph, in_code, done = [], [], False, False
+    for line in text.splitlines() + [""]:
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+            continue
+        if in_code:
+            continue
+        heading = re.match(r"^#{1,6}\s", line)
+        if paragraph and (heading or not line.strip()):
+            lines.append(" ".join(paragraph))
+            paragraph, done = [], True
+        if heading:
+            lines.append(line.strip())
+            done = False
+        elif line.strip() and not done:
+            paragraph.append(line.strip())
+    return "\n".join(lines)[:max_chars]
+
+
+def _doc_bytes(doc):
+    return {"bytes": len(doc.text.encode("utf-8"))}
+
+
+def retrieved_node_keys(retriever, query):
+    """
+    Return ids and content hashes of the nodes the context chat engine would retrieve for a query.
+    """
+    return [f"{result.node.node_id}:{result.node.hash}" for result in retriever.retrieve(query)]
+
+
+class Settings:
+    """
+    Options of a documentation run, set in the sidebar of the app or by the flags of the CLI.
+    """
+
+    def __init__(self, model='gpt-4', audience='technical', file_types=('.py',), excludes=DEFAULT_EXCLUDES,
+                 max_file_size=DEFAULT_MAX_FILE_SIZE, embed_concurrency=DEFAULT_CONCURRENCY,
+                 generation_mode='Retrieval', diagram_mode='LLM Flowchart', refine_diagram=False,
+                 use_response_cache=True):
+        self.model = model
+        self.audience = audience
+        self.file_types = list(file_types)
+        self.excludes = list(excludes)
+        self.max_file_size = max_file_size
+        self.embed_concurrency = embed_concurrency
+        self.generation_mode = generation_mode
+        # None skips the diagram
+        self.diagram_mode = diagram_mode
+        self.refine_diagram = refine_diagram
+        self.use_response_cache = use_response_cache
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class Pipeline:
+    """
+    The load -> index -> generate -> diagram -> export steps behind the app and the batch CLI.
+
+    Caches, the graph sandbox and the pool of loaded indexes are passed in so they can be shared,
+    by all sessions of the app or by all repositories handled by one CLI worker. Each step runs in a named stage whose wait
+    and run time are recorded in `timings`; `limits` optionally maps stage names to semaphores
+    that bound how many runs can be in a stage at once. The steps inside the stages are recorded as
+    spans of one trace on the tracer, see tracing.Tracer.
+    """
+
+    def __init__(self, settings, index_cache=None, response_cache=None, summary_cache=None, analysis_cache=None,
+                 graph_sandbox=None, index_pool=None, limits=None, on_progress=None, on_summary=None,
+                 tracer=None, trace_id=None, api_key=None):
+        self.settings = settings
+        # OpenAI API key of the session or job, see get_service_context
+        self.api_key = api_key
+        self.index_cache = index_cache if index_cache is not None else IndexCache()
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.summary_cache = summary_cache if summary_cache is not None else SummaryCache()
+        self.analysis_cache = analysis_cache if analysis_cache is not None else AnalysisCache()
+        self.graph_sandbox = graph_sandbox if graph_sandbox is not None else GraphSandbox()
+        # optional index_pool.IndexPool, without one every load reads the index from disk
+        self.index_pool = index_pool
+        self.limits = limits or {}
+        # on_progress(EmbeddingProgress or None when done), on_summary(kind, name, summary, done, total_files)
+        self.on_progress = on_progress
+        self.on_summary = on_summary
+        self.tracer = tracer if tracer is not None else Tracer()
+        # spans of all steps of one generation share a trace id, pass it on to continue a trace
+        self.trace_id = trace_id or new_trace_id()
+        self.timings = {}
+        self.commit_sha = None
+        self.index_key = None
+        self._service_context = None
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Run a block as a named stage, waiting for a free slot if the stage is limited.
+        """
+        requested = time.perf_counter()
+        limit = self.limits.get(name)
+        if limit is not None:
+            limit.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if limit is not None:
+                limit.release()
+            self.timings[name] = {"wait": started - requested, "seconds": time.perf_counter() - started}
+
+    def span(self, name, **attrs):
+        """Record a block as a span of this pipeline's trace."""
+        return self.tracer.span(name, trace_id=self.trace_id, **attrs)
+
+    def _traced_docs(self, docs):
+        # time spent fetching files, without the embedding done between them
+        return self.tracer.traced_iter("load_docs", docs, trace_id=self.trace_id, count="files", measure=_doc_bytes)
+
+    def service_context(self):
+        if self._service_context is None:
+            self._service_context = get_service_context(self.settings.model, self.api_key)
+        return self._service_context
+
+    def retriever(self, index):
+        """
+        Build a retriever over an index that embeds queries with this pipeline's embedding model.
+        Shared indexes keep the service context they were loaded with, and with it another session's key.
+        """
+        from retrieval import EmbeddingRetriever
+
+        return EmbeddingRetriever(index.as_retriever(), self.service_context().embed_model)
+
+    def chat_engine(self, index):
+        """
+        Build a context chat engine over an index with this pipeline's LLM.
+        Shared indexes keep the service context they were loaded with, which may use another model.
+        """
+        from llama_index.chat_engine import ContextChatEngine
+
+        return ContextChatEngine.from_defaults(retriever=self.retriever(index),
+                                               service_context=self.service_context())
+
+    def insert_documents(self, index, docs, total_files, batch_size=50):
+        """
+        Split, embed and insert documents into an index in batches as they arrive, reporting progress.
+        Embedding requests are packed up to a token budget and sent concurrently, see embedding.embed_nodes.
+        """
+        service_context = self.service_context()
+        progress = EmbeddingProgress(total_files)
+        seconds = {"chunk": 0.0, "embed": 0.0}
+        if self.on_progress is not None:
+            self.on_progress(progress)
+
+        def _insert(batch):
+            started = time.perf_counter()
+            nodes = service_context.node_parser.get_nodes_from_documents(batch)
+            chunked = time.perf_counter()
+            embed_nodes(nodes, service_context.embed_model, concurrency=self.settings.embed_concurrency,
+                        progress=progress)
+            seconds["chunk"] += chunked - started
+            seconds["embed"] += time.perf_counter() - chunked
+            index.insert_nodes(nodes)
+            for doc in batch:
+                index.docstore.set_document_hash(doc.get_doc_id(), doc.hash)
+            progress.files += len(batch)
+            if self.on_progress is not None:
+                self.on_progress(progress)
+
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) == batch_size:
+                _insert(batch)
+                batch = []
+        if batch:
+            _insert(batch)
+
+        self.tracer.record("chunk", seconds["chunk"], trace_id=self.trace_id, nodes=progress.nodes)
+        self.tracer.record("embed", seconds["embed"], trace_id=self.trace_id, nodes=progress.nodes,
+                           tokens=progress.tokens, requests=progress.requests, rate_limited=progress.rate_limited)
+        if self.on_progress is not None:
+            self.on_progress(None)
+
+    def load_index(self, docs, total_files):
+        """
+        Build an index from an iterable of documents.
+        Documents are embedded in batches as they arrive, so indexing overlaps with fetching
+        and the whole repository never has to be held in memory.
+        """
+        from llama_index import StorageContext, VectorStoreIndex
+
+        storage_context = StorageContext.from_defaults(vector_store=NumpyVectorStore())
+        index = VectorStoreIndex([], service_context=self.service_context(), storage_context=storage_context)
+        self.insert_documents(index, docs, total_files)
+        return index
+
+    def get_index(self, source):
+        """
+        Return the index for a repository source, reusing the on-disk copy if its commit was indexed before.
+        """
+        with self.span("load_index", repo=f"{source.owner}/{source.repo}") as span:
+            index = self._get_index(source, span)
+            span.set(commit_sha=self.commit_sha, cache_hit=span.attrs["cache"] in ("pool", "disk"))
+            return index
+
+    def _get_index(self, source, span):
+        with self.span("resolve"):
+            self.commit_sha = commit_sha = source.resolve()
+
+        settings = self.settings
+        cache_key = make_key(source.owner, source.repo, commit_sha, settings.file_types, settings.excludes,
+                             settings.max_file_size)
+        repo_id = make_repo_id(source.owner, source.repo, settings.file_types, settings.excludes,
+                               settings.max_file_size)
+
+        self.index_key = cache_key
+
+        # jobs that differ only in settings the index does not depend on, e.g. the audience, share one build
+        with self.index_cache.building(cache_key):
+            return self._lookup_or_build(source, span, cache_key, repo_id, commit_sha)
+
+    def _lookup_or_build(self, source, span, cache_key, repo_id, commit_sha):
+        settings = self.settings
+        if self.index_pool is not None:
+            index = self.index_pool.get(cache_key)
+            if index is not None:
+                span.set(cache="pool")
+                return index
+        index = self.index_cache.get(cache_key, service_context=self.service_context())
+        if index is not None:
+            span.set(cache="disk")
+            self._share(cache_key, index, source)
+            return index
+
+        with self.span("list_files") as list_span:
+            files = source.list_files(settings.file_types, settings.excludes, settings.max_file_size)
+            list_span.set(files=len(files))
+
+        # if an older commit of this repo is indexed, only re-embed the files that changed since
+        base_key = self.index_cache.latest(repo_id)
+        # the base index may have been evicted since latest()
+        index = self.index_cache.get(base_key, service_context=self.service_context()) if base_key else None
+        if index is not None:
+            span.set(cache="incremental")
+            update_index(index, self.index_cache.get_files(base_key), files,
+                         lambda changed: self._traced_docs(source.iter_documents(changed)),
+                         insert_docs=self.insert_documents)
+        else:
+            base_key = None
+            span.set(cache="miss")
+            index = self.load_index(self._traced_docs(source.iter_documents(files)), total_files=len(files))
+
+        with self.span("persist_index"):
+            self.index_cache.put(cache_key, index, files=files,
+                                 extra={"repo_id": repo_id, "commit_sha": commit_sha, "base_key": base_key})
+        self._share(cache_key, index, source)
+
+        return index
+
+    def _share(self, key, index, source):
+        # hand the index to the pool, so sessions pick it up without loading it again
+        if self.index_pool is not None:
+            self.index_pool.put(key, index, label=f"{source.owner}/{source.repo}@{self.commit_sha[:7]}")
+
+    def cached_index(self, key, holder=None):
+        """
+        Return an index stored by get_index, e.g. by a background job, from the pool or the index cache.
+        Args:
+        - key (str): index_key of the pipeline that built the index
+        - holder (str): Session keeping a reference to the index in the pool
+        Returns:
+        - VectorStoreIndex or None: The index, or None if it is not in the index cache
+        """
+        def load():
+            return self.index_cache.get(key, service_context=self.service_context())
+
+        if self.index_pool is None:
+            return load()
+        return self.index_pool.acquire(key, load, holder=holder)
+
+    def cached_response(self, name, cache_key, make_response):
+        """
+        Return a token stream for a response, replaying it from the response cache when possible.
+        With the cache disabled the response is always generated, and the stored copy refreshed.
+        The stream is recorded as a span with the given name, see tracing.Tracer.traced_iter.
+        """
+        tokens = None
+        if self.settings.use_response_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                tokens = replay(cached)
+        cache_hit = tokens is not None
+        if not cache_hit:
+            tokens = self.response_cache.record(cache_key, make_response())
+        return self.tracer.traced_iter(name, tokens, trace_id=self.trace_id, count="tokens",
+                                       measure=lambda token: {"chars": len(token)},
+                                       model=self.settings.model, cache_hit=cache_hit)
+
+    def _retrieved_node_keys(self, index, query):
+        with self.span("retrieve") as span:
+            keys = retrieved_node_keys(self.retriever(index), query)
+            span.set(nodes=len(keys))
+            return keys
+
+    def _map_reduce_tokens(self, files):
+        generator = MapReduceGenerator(self.service_context().llm, self.settings.model, self.settings.audience,
+                                       cache=self.summary_cache)
+        done = {"file": 0, "package": 0}
+        for kind, name, text in generator.generate(files):
+            if kind == "token":
+                yield text
+                continue
+            done[kind] += 1
+            if self.on_summary is not None:
+                self.on_summary(kind, name, text, done, len(files))
+
+    def generate_docs(self, index, chat_engine):
+        """
+        Return a token stream of the repository documentation, in the configured generation mode.
+        """
+        model, audience = self.settings.model, self.settings.audience
+        if self.settings.generation_mode == 'Map-Reduce':
+            files = files_from_index(index)
+            cache_key = ResponseCache.make_key('doc-map-reduce', model, audience, REPO_PROMPT,
+                                               *sorted(f"{path}={sha}" for path, (sha, _) in files.items()))
+            return self.cached_response("stream_map_reduce", cache_key, lambda: self._map_reduce_tokens(files))
+
+        doc_prompt = DOC_PROMPT.format(audience=audience)
+        cache_key = ResponseCache.make_key('doc', model, audience, doc_prompt,
+                                           *self._retrieved_node_keys(index, doc_prompt))
+        return self.cached_response("stream_chat", cache_key,
+                                    lambda: chat_engine.stream_chat(doc_prompt).response_gen)
+
+    def llm_diagram_code(self, index, chat_engine, output_text):
+        """
+        Ask the LLM for Graphviz code that draws a flowchart of the code in context.
+        """
+        from llama_index.llms import ChatMessage, MessageRole
+
+        audience = self.settings.audience
+        diagram_prompt = DIAGRAM_PROMPT.format(audience=audience)
+        # the documentation is generated by the job with its own chat engine and this one has no history,
+        # so it is passed as history: the message stays the short instruction the nodes are retrieved with
+        outline = outline_markdown(output_text)
+        history = [ChatMessage(role=MessageRole.USER, content=DOC_PROMPT.format(audience=audience)),
+                   ChatMessage(role=MessageRole.ASSISTANT, content=outline)]
+
+        # call LLM to get the diagram response
+        cache_key = ResponseCache.make_key('diagram', self.settings.model, audience, diagram_prompt, outline,
+                                           *self._retrieved_node_keys(index, diagram_prompt))
+        diagram_response = "".join(self.cached_response(
+            "chat", cache_key, lambda: [chat_engine.chat(diagram_prompt, chat_history=history).response]))
+
+        # extract code from response
+        return extract_code(diagram_response)
+
+    def static_dot(self, index):
+        """
+        Build a call or import graph of the indexed Python files without calling the LLM,
+        optionally letting the LLM relabel and prune it.
+        """
+        files = {path: (sha, "".join(texts)) for path, (sha, texts) in files_from_index(index).items()}
+        with self.span("static_analysis", files=len(files)):
+            import_edges, call_edges, _ = build_graphs(files, cache=self.analysis_cache)
+        if self.settings.diagram_mode == 'Static Call Graph':
+            dot = call_graph_dot(call_edges)
+        else:
+            dot = import_graph_dot(import_edges)
+
+        if self.settings.refine_diagram:
+            prompt = REFINE_PROMPT.format(audience=self.settings.audience, dot=dot)
+            cache_key = ResponseCache.make_key('diagram-refine', self.settings.model, prompt)
+            response = "".join(self.cached_response(
+                "refine_diagram", cache_key, lambda: [self.service_context().llm.complete(prompt).text]))
+            dot = extract_dot(response, fallback=dot)
+
+        return dot
+
+    def generate_graph(self, index, chat_engine, output_text):
+        """
+        Generate the diagram in the configured mode and render it in the graph sandbox.
+        Returns:
+        - dict: Result of GraphSandbox.run
+        """
+        with self.span("generate_graph", mode=self.settings.diagram_mode) as span:
+            if self.settings.diagram_mode == 'LLM Flowchart':
+                code = self.llm_diagram_code(index, chat_engine, output_text)
+            else:
+                code = f"import graphviz\ndot = graphviz.Source({self.static_dot(index)!r})"
+
+            # run the generated code in a separate, resource-limited process
+            result = self.graph_sandbox.run(code)
+            span.set(sandbox_wait=result["wait"], sandbox_seconds=result["total"] - result["wait"],
+                     bytes=len(result["png"]) if result["ok"] else 0)
+            if not result["ok"]:
+                # reported to the caller, the span keeps the failure and its cost visible
+                span.error = result["error"]
+            return result
+
+    def run(self, source, pdf=True):
+        """
+        Document one repository from start to end, without a UI.
+        Args:
+        - source: Ingestion backend, see make_source; closed when indexing is done
+        - pdf (bool): Whether to render the PDF
+        Returns:
+        - dict: commit_sha, markdown, tokens, dot_source, png, pdf and diagram_error,
+          None for skipped steps
+        """
+        with self.stage("index"):
+            try:
+                index = self.get_index(source)
+            finally:
+                source.close()
+        chat_engine = self.chat_engine(index)
+
+        with self.stage("generate"):
+            tokens = list(self.generate_docs(index, chat_engine))
+        result = {"commit_sha": self.commit_sha, "markdown": "".join(tokens).strip(), "tokens": len(tokens),
+                  "dot_source": None, "png": None, "pdf": None, "diagram_error": None}
+
+        if self.settings.diagram_mode is not None:
+            with self.stage("diagram"):
+                graph = self.generate_graph(index, chat_engine, result["markdown"])
+            if graph["ok"]:
+                result["dot_source"], result["png"] = graph["dot_source"], graph["png"]
+            else:
+                result["diagram_error"] = graph["error"]
+
+        if pdf:
+            with self.stage("pdf"), self.span("pdf_export") as span:
+                result["pdf"] = render_pdf(result["markdown"], result["png"])
+                span.set(bytes=len(result["pdf"]))
+
+        return result
+
+
+def document_job(params, job, **caches):
+    """
+    Runner for jobs.JobQueue: index a repository and stream its documentation into the job.
+    Args:
+    - params (dict): settings (Settings.to_dict()), source, owner, repo, branch, local_path, commit_sha
+      and optionally the trace_id of the request
+    - job (jobs.JobContext): Receives the progress and the generated text, its secrets hold the
+      openai_api_key and github_token of the session that submitted it
+    - caches: Caches and graph sandbox passed on to Pipeline
+    Returns:
+    - dict: owner and repo of the source, commit_sha, index_key, trace_id and the streaming metrics
+    """
+    def on_progress(progress):
+        if progress is not None:
+            job.progress(progress.fraction, format_progress(progress))
+
+    def on_summary(kind, name, text, done, total_files):
+        # the file, then the package summaries are shown while they complete, before the documentation
+        job.summary(kind, name, text)
+        job.progress(done["file"] / max(total_files, 1),
+                     f"Summarized {done['file']}/{total_files} files and {done['package']} packages")
+
+    pipeline = Pipeline(Settings(**params["settings"]), on_progress=on_progress, on_summary=on_summary,
+                        trace_id=params.get("trace_id"), api_key=job.secrets.get("openai_api_key"), **caches)
+    source = make_source(params["source"], params["owner"], params["repo"], params["branch"],
+                         local_path=params["local_path"], token=job.secrets.get("github_token"),
+                         commit_sha=params["commit_sha"])
+    job.progress(0.0, "Indexing...")
+    try:
+        index = pipeline.get_index(source)
+    finally:
+        source.close()
+
+    job.progress(1.0, "Generating documentation...")
+    chat_engine = pipeline.chat_engine(index)
+    # the job stores the text at the renderer's bounded rate, instead of once per token
+    renderer = StreamRenderer(job)
+    for token in pipeline.generate_docs(index, chat_engine):
+        renderer.write(token)
+    renderer.close()
+    metrics = renderer.metrics()
+    pipeline.tracer.record("render", metrics["render_seconds"], trace_id=pipeline.trace_id,
+                           tokens=metrics["tokens"], renders=metrics["renders"])
+
+    return {"owner": source.owner, "repo": source.repo, "commit_sha": pipeline.commit_sha,
+            "index_key": pipeline.index_key, "trace_id": pipeline.trace_id,
+            "metrics": metrics}
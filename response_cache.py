@@ -0,0 +1,118 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from index_cache import CACHE_DIR
+
+
+DEFAULT_TTL = int(os.getenv("GITDOC_RESPONSE_CACHE_TTL", 7 * 24 * 3600))
+MAX_RESPONSE_BYTES = int(os.getenv("GITDOC_RESPONSE_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+
+class ResponseCache:
+    """
+    SQLite store of LLM responses with a TTL and a total size limit.
+
+    Entries are keyed by a hash of everything that determines the response: model, audience,
+    prompt and the retrieved context. Least recently used entries are dropped above the size limit.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_bytes=MAX_RESPONSE_BYTES):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "responses.sqlite3")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Streamlit runs every session in its own thread, access is serialized by the lock;
+        # other processes sharing the file (batch CLI workers) are waited for up to the timeout
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Hash the parts that determine a response.
+        Args:
+        - parts (str): Model, audience, prompt, retrieved node ids and hashes, ...
+        Returns:
+        - str: Hex digest
+        """
+        return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Return the stored response, or None if missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        """
+        Store a response and enforce the TTL and size limit.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+                for old_key, size in rows:
+                    if total <= self.max_bytes or old_key == key:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= size
+            self._conn.commit()
+
+    def record(self, key, tokens):
+        """
+        Pass tokens through and store the full response once the stream completes.
+        Args:
+        - key (str): Cache key
+        - tokens (iterable): Streamed response tokens
+        Yields:
+        - str: The same tokens
+        """
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            yield token
+        self.put(key, "".join(parts))
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+
+def replay(text, chunk_size=64):
+    """
+    Yield a stored response in chunks so it goes through the same streaming path as a live response.
+    """
+    for start in range(0, len(text), chunk_size):
+        yield text[start:start + chunk_size]
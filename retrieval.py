@@ -0,0 +1,27 @@
+from llama_index.core.base_retriever import BaseRetriever
+
+
+class EmbeddingRetriever(BaseRetriever):
+    """
+    Retriever over a vector index that embeds queries with a given embedding model.
+
+    Shared indexes keep the service context they were loaded with, and with it the API key of
+    another session. Queries are embedded here and passed on to the index's retriever as a
+    QueryBundle that already has its embedding, which the index's retriever uses as is.
+    """
+
+    def __init__(self, retriever, embed_model):
+        self.retriever = retriever
+        self.embed_model = embed_model
+        super().__init__(callback_manager=retriever.callback_manager)
+
+    def _retrieve(self, query_bundle):
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self.embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+        return self.retriever.retrieve(query_bundle)
+
+    async def _aretrieve(self, query_bundle):
+        if query_bundle.embedding is None:
+            query_bundle.embedding = await self.embed_model.aget_agg_embedding_from_queries(
+                query_bundle.embedding_strs)
+        return await self.retriever.aretrieve(query_bundle)
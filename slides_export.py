@@ -0,0 +1,375 @@
+import hashlib
+import io
+import os
+import re
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import Tracer
+
+
+SCOPES = ['https://www.googleapis.com/auth/presentations',
+          'https://www.googleapis.com/auth/drive']
+
+SERVICE_ACCOUNT_FILE = os.getenv("GITDOC_SLIDES_CREDENTIALS", "service_acc.json")
+# template deck: slide 0 has {title} and {subtitle}, slide 1 {heading} and {body}, slide 2 {diagram_title}
+TEMPLATE_ID = os.getenv("GITDOC_SLIDES_TEMPLATE_ID")
+FOLDER_ID = os.getenv("GITDOC_SLIDES_FOLDER_ID")
+
+TITLE_SLIDE, SECTION_SLIDE, DIAGRAM_SLIDE = 0, 1, 2
+# text that still fits a body placeholder at a readable size
+MAX_BODY_CHARS = 1200
+# retries of googleapiclient on 429 and 5xx responses, with exponential backoff
+NUM_RETRIES = 5
+DEFAULT_WORKERS = 4
+DEFAULT_CACHE_ENTRIES = 32
+
+# only what the builder needs to index slides and find placeholders
+_DECK_FIELDS = ("pageSize,slides(objectId,pageElements(objectId,shape(text(textElements(textRun(content)))),"
+                "table(tableRows(tableCells(text(textElements(textRun(content))))))))")
+
+
+def is_configured():
+    """Whether a template deck and service account credentials are available."""
+    return bool(TEMPLATE_ID) and os.path.exists(SERVICE_ACCOUNT_FILE)
+
+
+def build_services(service_account_file=SERVICE_ACCOUNT_FILE):
+    """
+    Build the Google Drive and Slides API clients from a service account file.
+    The clients are not thread-safe, build one pair per thread.
+    Returns:
+    - tuple: (drive_service, slides_service)
+    """
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+
+    creds = service_account.Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
+    return (build('drive', 'v3', credentials=creds, cache_discovery=False),
+            build('slides', 'v1', credentials=creds, cache_discovery=False))
+
+
+def _slide_text(slide):
+    texts = []
+    for element in slide.get('pageElements', []):
+        containers = [element.get('shape', {})]
+        for row in element.get('table', {}).get('tableRows', []):
+            containers.extend(row.get('tableCells', []))
+        for container in containers:
+            for text_element in container.get('text', {}).get('textElements', []):
+                if 'textRun' in text_element:
+                    texts.append(text_element['textRun']['content'])
+    return "".join(texts)
+
+
+def _new_object_id():
+    # object ids must be 5 to 50 characters and start with a letter or digit
+    return f"gd{uuid.uuid4().hex}"
+
+
+class PresentationBuilder:
+    """
+    Queues changes to a Google Slides deck and sends them in a single batchUpdate.
+
+    The deck is fetched once and indexed by slide position. Queued duplicates and deletions
+    update the local index, so slide indexes passed to later calls refer to the deck as it will
+    be once the queued requests are applied. Slides applies the requests of a batch in order and
+    atomically: either all of them succeed or none.
+    """
+
+    def __init__(self, slides_service, presentation_id):
+        self.slides_service = slides_service
+        self.presentation_id = presentation_id
+        self.page_size = None
+        self.requests = []
+        self._slide_ids = None
+        self._texts = {}  # slide id -> text, to only queue replacements for placeholders a slide has
+
+    def load(self):
+        """Fetch the deck, once."""
+        if self._slide_ids is None:
+            presentation = self.slides_service.presentations().get(
+                presentationId=self.presentation_id, fields=_DECK_FIELDS).execute(num_retries=NUM_RETRIES)
+            slides = presentation.get('slides', [])
+            self.page_size = presentation.get('pageSize')
+            self._slide_ids = [slide['objectId'] for slide in slides]
+            self._texts = {slide['objectId']: _slide_text(slide) for slide in slides}
+        return self
+
+    @property
+    def slide_ids(self):
+        return list(self.load()._slide_ids)
+
+    def slide_id(self, slide_index):
+        return self.load()._slide_ids[slide_index]
+
+    def index_of(self, slide_id):
+        return self.load()._slide_ids.index(slide_id)
+
+    def replace_text(self, slide_index, replacements):
+        """
+        Queue placeholder replacements on one slide.
+        Args:
+        - slide_index (int): Index of the slide
+        - replacements (dict): Placeholder -> replacement text
+        Returns:
+        - int: Number of placeholders found on the slide
+        """
+        slide_id = self.slide_id(slide_index)
+        found = 0
+        for placeholder, replacement in replacements.items():
+            if placeholder in self._texts[slide_id]:
+                self.requests.append({'replaceAllText': {
+                    'containsText': {'text': placeholder, 'matchCase': True},
+                    'replaceText': replacement,
+                    'pageObjectIds': [slide_id],  # Apply only to this slide
+                }})
+                found += 1
+        return found
+
+    def insert_image(self, slide_index, image_url, x_pos, y_pos, width, height):
+        """
+        Queue an image from a URL at a position and size in EMUs.
+        """
+        self.requests.append({'createImage': {
+            'url': image_url,
+            'elementProperties': {
+                'pageObjectId': self.slide_id(slide_index),
+                'size': {'height': {'magnitude': height, 'unit': 'EMU'},
+                         'width': {'magnitude': width, 'unit': 'EMU'}},
+                'transform': {'scaleX': 1, 'scaleY': 1, 'translateX': x_pos, 'translateY': y_pos, 'unit': 'EMU'},
+            },
+        }})
+
+    def duplicate_slide(self, slide_index):
+        """
+        Queue a copy of a slide, placed right after it.
+        Returns:
+        - int: Index of the copy
+        """
+        slide_id = self.slide_id(slide_index)
+        new_id = _new_object_id()
+        self.requests.append({'duplicateObject': {'objectId': slide_id, 'objectIds': {slide_id: new_id}}})
+        self._slide_ids.insert(slide_index + 1, new_id)
+        self._texts[new_id] = self._texts[slide_id]
+        return slide_index + 1
+
+    def delete_slide(self, slide_index):
+        """Queue the deletion of a slide."""
+        slide_id = self.slide_id(slide_index)
+        del self._slide_ids[slide_index]
+        self.requests.append({'deleteObject': {'objectId': slide_id}})
+
+    def commit(self):
+        """
+        Send all queued requests in one batchUpdate.
+        Returns:
+        - dict or None: batchUpdate response, None if nothing was queued
+        """
+        if not self.requests:
+            return None
+        requests, self.requests = self.requests, []
+        return self.slides_service.presentations().batchUpdate(
+            presentationId=self.presentation_id, body={'requests': requests}).execute(num_retries=NUM_RETRIES)
+
+
+def copy_presentation(drive_service, presentation_id, title, folder_id=None):
+    """
+    Copy a deck with the Drive API.
+    Returns:
+    - str: Presentation id of the copy
+    """
+    body = {'name': title}
+    if folder_id:
+        body['parents'] = [folder_id]  # Place the file in the specified folder
+    copy = drive_service.files().copy(fileId=presentation_id, body=body, fields='id').execute(
+        num_retries=NUM_RETRIES)
+    return copy['id']
+
+
+def upload_image(drive_service, png, folder_id=None):
+    """
+    Upload a PNG to Drive and make it readable by link, so Slides can fetch it by URL.
+    Returns:
+    - tuple: (file id, URL), delete the file once the image is inserted
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+
+    body = {'name': f"gitdoc-{uuid.uuid4().hex}.png"}
+    if folder_id:
+        body['parents'] = [folder_id]
+    uploaded = drive_service.files().create(body=body, fields='id', media_body=MediaIoBaseUpload(
+        io.BytesIO(png), mimetype='image/png')).execute(num_retries=NUM_RETRIES)
+    drive_service.permissions().create(fileId=uploaded['id'], body={'type': 'anyone', 'role': 'reader'}).execute(
+        num_retries=NUM_RETRIES)
+    return uploaded['id'], f"https://drive.google.com/uc?export=download&id={uploaded['id']}"
+
+
+def _plain(text):
+    # markdown markers render literally on slides
+    text = re.sub(r"```\w*\n?", "", text)
+    text = re.sub(r"(\*\*|__|`)", "", text)
+    return re.sub(r"^\s*[-*]\s+", "• ", text, flags=re.MULTILINE).strip()
+
+
+def split_sections(markdown_text, max_chars=MAX_BODY_CHARS):
+    """
+    Split documentation into (heading, body) slides at markdown headings.
+    Long sections are continued on more slides, cut at paragraph boundaries where possible.
+    """
+    sections, heading, lines, in_code = [], "Overview", [], False
+
+    def _add(heading, lines):
+        body = _plain("\n".join(lines))
+        part = 0
+        while body:
+            cut = len(body) if len(body) <= max_chars else (body.rfind("\n\n", 0, max_chars) + 1 or max_chars)
+            sections.append((heading if not part else f"{heading} (cont.)", body[:cut].strip()))
+            body = body[cut:].strip()
+            part += 1
+
+    for line in markdown_text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        # comments in code blocks are not headings
+        match = None if in_code else re.match(r"^#{1,3}\s+(.*)", line)
+        if not match:
+            lines.append(line)
+            continue
+        _add(heading, lines)
+        heading, lines = _plain(match.group(1)) or heading, []
+    # also when an unclosed code block runs to the end of the text
+    _add(heading, lines)
+    return sections
+
+
+def _png_size(png):
+    # width and height from the IHDR chunk
+    return struct.unpack(">II", png[16:24])
+
+
+def _fit(page_size, image_width, image_height, margin=0.08, top=0.2):
+    page_width, page_height = page_size['width']['magnitude'], page_size['height']['magnitude']
+    box_width, box_height = page_width * (1 - 2 * margin), page_height * (1 - top - margin)
+    scale = min(box_width / image_width, box_height / image_height)
+    width, height = image_width * scale, image_height * scale
+    return (page_width - width) / 2, page_height * top, width, height
+
+
+def export_to_slides(drive_service, slides_service, title, markdown_text, flowchart_png=None,
+                     template_id=TEMPLATE_ID, folder_id=FOLDER_ID, subtitle="Generated with GitDoc"):
+    """
+    Build a deck from generated documentation and its flowchart with one deck fetch and one batchUpdate.
+    Args:
+    - drive_service, slides_service: API clients, see build_services
+    - title (str): Deck title
+    - markdown_text (str): Generated documentation, one slide per section
+    - flowchart_png (bytes): Rendered flowchart, shown on the diagram slide, which is removed without one
+    - template_id (str): Template deck, see TITLE_SLIDE, SECTION_SLIDE and DIAGRAM_SLIDE
+    - folder_id (str): Drive folder of the new deck
+    Returns:
+    - dict: presentation_id, url, slides and the number of requests sent
+    """
+    presentation_id = copy_presentation(drive_service, template_id, title, folder_id)
+    builder = PresentationBuilder(slides_service, presentation_id).load()
+    section_id = builder.slide_id(SECTION_SLIDE)
+    diagram_id = builder.slide_id(DIAGRAM_SLIDE)
+
+    builder.replace_text(TITLE_SLIDE, {"{title}": title, "{subtitle}": subtitle})
+    # each copy is placed right after the template slide, so copy for the last section first
+    for heading, body in reversed(split_sections(markdown_text)):
+        copy = builder.duplicate_slide(builder.index_of(section_id))
+        builder.replace_text(copy, {"{heading}": heading, "{body}": body})
+    builder.delete_slide(builder.index_of(section_id))
+
+    image_file = None
+    if flowchart_png is not None:
+        image_file, image_url = upload_image(drive_service, flowchart_png, folder_id)
+        diagram_index = builder.index_of(diagram_id)
+        builder.replace_text(diagram_index, {"{diagram_title}": "Flowchart Diagram"})
+        builder.insert_image(diagram_index, image_url, *_fit(builder.page_size, *_png_size(flowchart_png)))
+    else:
+        builder.delete_slide(builder.index_of(diagram_id))
+
+    requests = len(builder.requests)
+    try:
+        builder.commit()
+    finally:
+        if image_file is not None:
+            # Slides copies the image into the deck, the uploaded file is not needed anymore
+            drive_service.files().delete(fileId=image_file).execute(num_retries=NUM_RETRIES)
+
+    return {"presentation_id": presentation_id, "slides": len(builder.slide_ids), "requests": requests,
+            "url": f"https://docs.google.com/presentation/d/{presentation_id}/edit"}
+
+
+class SlidesExporter:
+    """
+    Exports decks on a bounded worker pool, off the Streamlit script thread.
+
+    Each worker thread builds its own API clients, since they are not thread-safe. Exports are
+    cached by a hash of the title, markdown and flowchart, so asking again for the same content
+    returns the existing deck instead of copying the template again. Exports are recorded as
+    slides_export spans.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, cache_entries=DEFAULT_CACHE_ENTRIES, tracer=None,
+                 service_account_file=SERVICE_ACCOUNT_FILE, template_id=TEMPLATE_ID, folder_id=FOLDER_ID):
+        self.cache_entries = cache_entries
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.service_account_file = service_account_file
+        self.template_id = template_id
+        self.folder_id = folder_id
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="slides-export")
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(title, markdown_text, flowchart_png=None):
+        digest = hashlib.sha256(title.encode("utf-8"))
+        for part in (markdown_text.encode("utf-8"), flowchart_png or b""):
+            digest.update(b"\0")
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _export(self, title, markdown_text, flowchart_png, trace_id):
+        if not hasattr(self._local, "services"):
+            self._local.services = build_services(self.service_account_file)
+        with self.tracer.span("slides_export", trace_id=trace_id) as span:
+            result = export_to_slides(*self._local.services, title, markdown_text, flowchart_png,
+                                      template_id=self.template_id, folder_id=self.folder_id)
+            span.set(requests=result["requests"])
+            return result
+
+    def submit(self, title, markdown_text, flowchart_png=None, trace_id=None):
+        """
+        Start exporting a deck, or return the export already started for the same content.
+        Returns:
+        - Future: Resolves to the result of export_to_slides
+        """
+        key = self.make_key(title, markdown_text, flowchart_png)
+        with self._lock:
+            future = self._futures.get(key)
+            # failed exports are retried on the next request
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._pool.submit(self._export, title, markdown_text, flowchart_png, trace_id)
+                self._futures[key] = future
+            self._futures.move_to_end(key)
+            while len(self._futures) > self.cache_entries:
+                self._futures.popitem(last=False)
+            return future
+
+    def export_many(self, decks):
+        """
+        Export many decks concurrently.
+        Args:
+        - decks (list): (title, markdown_text, flowchart_png) tuples
+        Returns:
+        - list: Results of export_to_slides, or the exception of failed exports, in the same order
+        """
+        futures = [self.submit(*deck) for deck in decks]
+        return [future.exception() or future.result() for future in futures]
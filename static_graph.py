@@ -0,0 +1,260 @@
+import ast
+import json
+import os
+import re
+import tempfile
+from collections import Counter
+
+from index_cache import CACHE_DIR
+
+
+# bump when the analysis below changes, so cached results are recomputed
+ANALYSIS_VERSION = "2"
+
+DEFAULT_MAX_NODES = 60
+
+REFINE_PROMPT = """
+Below is a Graphviz DOT graph generated by static analysis of a code repository. Improve it for a {audience}
+audience: give the important nodes short descriptive labels and remove nodes and edges that are not essential
+to understand the code. Do not add nodes or edges and keep the node ids unchanged.
+Return only the DOT source in a ```dot code block.
+
+{dot}
+"""
+
+
+def module_name(path):
+    """
+    Convert a file path to a dotted module name, e.g. pkg/mod.py -> pkg.mod.
+    """
+    name = os.path.splitext(path)[0].replace("/", ".")
+    if name.endswith(".__init__"):
+        name = name[:-len(".__init__")]
+    return name
+
+
+class _Analyzer(ast.NodeVisitor):
+    def __init__(self):
+        self.imports = {}  # local name -> dotted target
+        self.imported = []  # full dotted targets of all imports, relative ones start with one dot per level
+        self.functions = {}  # qualified name -> list of called expressions
+        self._scope = []
+        self._current = None
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imported.append(alias.name)
+            if alias.asname:
+                self.imports[alias.asname] = alias.name
+            else:
+                # "import a.b" binds "a", calls then look like a.b.f()
+                first = alias.name.split(".")[0]
+                self.imports[first] = first
+
+    def visit_ImportFrom(self, node):
+        # "from . import b" is ".b", "from .a import b" is ".a.b"
+        prefix = "." * node.level + (f"{node.module}." if node.module else "")
+        for alias in node.names:
+            if alias.name == "*":
+                self.imported.append(prefix[:-1] if node.module else prefix)
+                continue
+            self.imports[alias.asname or alias.name] = prefix + alias.name
+            self.imported.append(prefix + alias.name)
+
+    def visit_ClassDef(self, node):
+        self._scope.append(node.name)
+        self.generic_visit(node)
+        self._scope.pop()
+
+    def _visit_function(self, node):
+        qualified = ".".join(self._scope + [node.name])
+        self.functions[qualified] = []
+        outer, self._current = self._current, qualified
+        self._scope.append(node.name)
+        self.generic_visit(node)
+        self._scope.pop()
+        self._current = outer
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_Call(self, node):
+        if self._current is not None:
+            callee = _dotted(node.func)
+            if callee:
+                self.functions[self._current].append(callee)
+        self.generic_visit(node)
+
+
+def _dotted(node):
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return None
+
+
+def analyze_source(source):
+    """
+    Collect the imports, functions and calls of a Python file.
+    Args:
+    - source (str): Python source code
+    Returns:
+    - dict: imports (local name -> dotted target), imported (all dotted targets) and functions
+      (qualified name -> called expressions), or None if the file does not parse
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    analyzer = _Analyzer()
+    analyzer.visit(tree)
+    return {"imports": analyzer.imports, "imported": analyzer.imported, "functions": analyzer.functions}
+
+
+class AnalysisCache:
+    """
+    Stores per-file analysis results on disk, keyed by blob SHA.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.root = os.path.join(cache_dir, "static")
+        os.makedirs(self.root, exist_ok=True)
+
+    def analyze(self, sha, source):
+        path = os.path.join(self.root, f"{ANALYSIS_VERSION}-{sha}.json")
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+        result = analyze_source(source)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+        return result
+
+
+def _resolve_import(target, module, modules, is_package=False):
+    # turn a (possibly relative) import target into an internal module or module.symbol name
+    if target.startswith("."):
+        level = len(target) - len(target.lstrip("."))
+        # one dot is the package of the module, which is the module itself for an __init__.py
+        package = module.split(".") if is_package else module.split(".")[:-1]
+        if level - 1 > len(package):
+            return None, None
+        target = ".".join(package[:len(package) - (level - 1)] + [target.lstrip(".")]).strip(".")
+    parts = target.split(".")
+    for end in range(len(parts), 0, -1):
+        candidate = ".".join(parts[:end])
+        if candidate in modules:
+            return candidate, ".".join(parts[end:])
+    return None, None
+
+
+def build_graphs(files, cache=None):
+    """
+    Build the module import graph and the function call graph of the Python files of a repository.
+    Args:
+    - files (dict): Mapping of file path to (blob SHA, source)
+    - cache (AnalysisCache): Optional cache of per-file analysis results
+    Returns:
+    - tuple: (import edges, call edges, functions by module), edges are sets of (source, target) names
+    """
+    analyses = {}
+    packages = set()
+    for path, (sha, source) in files.items():
+        if not path.endswith(".py"):
+            continue
+        analysis = cache.analyze(sha, source) if cache is not None else analyze_source(source)
+        if analysis is not None:
+            analyses[module_name(path)] = analysis
+            if os.path.basename(path) == "__init__.py":
+                packages.add(module_name(path))
+    modules = set(analyses)
+
+    import_edges = set()
+    call_edges = set()
+    functions = {module: set(analysis["functions"]) for module, analysis in analyses.items()}
+    for module, analysis in analyses.items():
+        for target in analysis["imported"]:
+            target_module, _ = _resolve_import(target, module, modules, module in packages)
+            if target_module is not None and target_module != module:
+                import_edges.add((module, target_module))
+
+        for caller, callees in analysis["functions"].items():
+            class_name = caller.rsplit(".", 1)[0] if "." in caller else None
+            for callee in callees:
+                head, _, rest = callee.partition(".")
+                target = None
+                if head == "self" and class_name and f"{class_name}.{rest}" in functions[module]:
+                    target = (module, f"{class_name}.{rest}")
+                elif callee in functions[module]:
+                    target = (module, callee)
+                elif head in analysis["imports"]:
+                    full = ".".join(part for part in (analysis["imports"][head], rest) if part)
+                    target_module, symbol = _resolve_import(full, module, modules, module in packages)
+                    if target_module is not None and symbol in functions[target_module]:
+                        target = (target_module, symbol)
+                if target is not None:
+                    call_edges.add((f"{module}:{caller}", f"{target[0]}:{target[1]}"))
+
+    return import_edges, call_edges, functions
+
+
+def _prune(edges, max_nodes):
+    # keep the most connected nodes, so large repos still give a readable diagram
+    degree = Counter(node for edge in edges for node in edge)
+    keep = {node for node, _ in degree.most_common(max_nodes)}
+    return {(a, b) for a, b in edges if a in keep and b in keep}
+
+
+def _quote(name):
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def import_graph_dot(import_edges, max_nodes=DEFAULT_MAX_NODES):
+    """
+    Emit the module import graph as DOT source.
+    """
+    lines = ["digraph imports {", "    rankdir=LR;", "    node [shape=box, style=rounded];"]
+    for a, b in sorted(_prune(import_edges, max_nodes)):
+        lines.append(f"    {_quote(a)} -> {_quote(b)};")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def call_graph_dot(call_edges, max_nodes=DEFAULT_MAX_NODES):
+    """
+    Emit the function call graph as DOT source, with one cluster per module.
+    """
+    edges = _prune(call_edges, max_nodes)
+    by_module = {}
+    for node in {node for edge in edges for node in edge}:
+        module, function = node.split(":", 1)
+        by_module.setdefault(module, []).append((node, function))
+
+    lines = ["digraph calls {", "    rankdir=LR;", "    node [shape=box, style=rounded];"]
+    for i, module in enumerate(sorted(by_module)):
+        lines.append(f"    subgraph cluster_{i} {{")
+        lines.append(f"        label={_quote(module)};")
+        for node, function in sorted(by_module[module]):
+            lines.append(f"        {_quote(node)} [label={_quote(function)}];")
+        lines.append("    }")
+    for a, b in sorted(edges):
+        lines.append(f"    {_quote(a)} -> {_quote(b)};")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def extract_dot(response, fallback):
+    """
+    Return the DOT source from an LLM response, or the fallback if the response has none.
+    """
+    match = re.search(r"```(?:dot|graphviz)?\s*(.*?)```", response, re.DOTALL)
+    dot = match.group(1).strip() if match else response.strip()
+    return dot if re.match(r"^(strict\s+)?(di)?graph\b", dot) else fallback
@@ -0,0 +1,70 @@
+import io
+import time
+
+
+class StreamRenderer:
+    """
+    Renders a token stream into a Streamlit placeholder at a bounded rate.
+
+    Tokens are appended to a buffer and the placeholder is only re-rendered when enough
+    time has passed since the last render, or when a large amount of text is pending.
+    This keeps the per-token cost constant instead of re-joining and re-rendering the
+    whole response for every token.
+    """
+
+    def __init__(self, placeholder, max_renders_per_sec=8, max_pending_chars=4096):
+        self.placeholder = placeholder
+        self.interval = 1.0 / max_renders_per_sec
+        self.max_pending_chars = max_pending_chars
+        self.tokens = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+        self.first_token_at = None
+        self._buffer = io.StringIO()
+        self._pending_chars = 0
+        self._started = time.perf_counter()
+        self._last_render = 0.0
+
+    def write(self, token):
+        """
+        Append a token and render if a threshold is reached.
+        """
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self._buffer.write(token)
+        self.tokens += 1
+        self._pending_chars += len(token)
+        if now - self._last_render >= self.interval or self._pending_chars >= self.max_pending_chars:
+            self._render(now)
+
+    def _render(self, now):
+        self.placeholder.markdown(self.text)
+        self.render_seconds += time.perf_counter() - now
+        self.renders += 1
+        self._pending_chars = 0
+        self._last_render = now
+
+    def close(self):
+        """
+        Render whatever is still pending and return the full text.
+        """
+        if self._pending_chars or not self.renders:
+            self._render(time.perf_counter())
+        return self.text
+
+    @property
+    def text(self):
+        return self._buffer.getvalue().strip()
+
+    def metrics(self):
+        """Return token count, render count and time, throughput and time to first token."""
+        elapsed = time.perf_counter() - self._started
+        return {
+            "tokens": self.tokens,
+            "renders": self.renders,
+            "render_seconds": self.render_seconds,
+            "tokens_per_sec": self.tokens / elapsed if elapsed > 0 else 0.0,
+            "time_to_first_token": self.first_token_at - self._started if self.first_token_at else None,
+            "elapsed": elapsed,
+        }
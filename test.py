@@ -5,15 +5,12 @@ import os.path
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 import time
+from slides_export import PresentationBuilder, SCOPES
 
 
 # Define the path to your Service Account credentials file
 SERVICE_ACCOUNT_FILE = 'service_acc.json'
 
-# Define the scope for Google Slides API
-SCOPES = ['https://www.googleapis.com/auth/presentations',
-          'https://www.googleapis.com/auth/drive']
-
 creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
 
 # Build the service for both Google Drive and Google Slides APIs
@@ -45,6 +42,9 @@ def make_copy_of_presentation(presentation_id, copy_title, folder_id):
     return copy.get('id')
 
 
+# The helpers below each fetch the deck and send one batchUpdate. To make several changes,
+# queue them on one PresentationBuilder and commit once instead, see the example at the bottom.
+
 # Function to replace text in a slide based on the slide index and replacement dictionary
 def replace_text_in_slide_by_index(presentation_id, slide_index, replacements):
     """
@@ -54,42 +54,11 @@ def replace_text_in_slide_by_index(presentation_id, slide_index, replacements):
     :param slide_index: The index of the slide (0 for the first slide, 1 for the second, etc.).
     :param replacements: A dictionary where the keys are placeholders and the values are the replacement text.
     """
-    # Fetch the presentation and get all the slides
-    presentation = slides_service.presentations().get(presentationId=presentation_id).execute()
-    slides = presentation.get('slides')
-
-    # Get the slide by index
-    target_slide = slides[slide_index]
-    slide_id = target_slide.get('objectId')
-
-    # List to store all replacement requests
-    requests = []
-
-    # Iterate over all shapes in the slide and replace text based on the dictionary
-    for element in target_slide.get('pageElements'):
-        shape = element.get('shape')
-        if shape:
-            text_content = shape.get('text')
-            if text_content:
-                for text_element in text_content.get('textElements', []):
-                    for placeholder, replacement in replacements.items():
-                        if 'textRun' in text_element and placeholder in text_element['textRun']['content']:
-                            # Prepare a replaceAllText request for each placeholder-replacement pair
-                            requests.append({
-                                'replaceAllText': {
-                                    'containsText': {
-                                        'text': placeholder,
-                                        'matchCase': True
-                                    },
-                                    'replaceText': replacement,
-                                    'pageObjectIds': [slide_id]  # Apply only to this slide
-                                }
-                            })
-
-    # If there are requests to process, send them in a batch update
-    if requests:
-        body = {'requests': requests}
-        response = slides_service.presentations().batchUpdate(presentationId=presentation_id, body=body).execute()
+    builder = PresentationBuilder(slides_service, presentation_id)
+
+    # Queue a replaceAllText request for each placeholder found on the slide
+    if builder.replace_text(slide_index, replacements):
+        builder.commit()
         print(f"Replaced text in slide index {slide_index}")
     else:
         print(f"No placeholders found in the slide.")
@@ -107,42 +76,15 @@ def insert_image_on_slide(presentation_id, image_url, slide_index, x_pos, y_pos,
     :param width: The width of the image (in EMUs).
     :param height: The height of the image (in EMUs).
     """
-    # Fetch the presentation and get all the slides
-    presentation = slides_service.presentations().get(presentationId=presentation_id).execute()
-    slides = presentation.get('slides')
+    builder = PresentationBuilder(slides_service, presentation_id)
 
     # Ensure the slide index is within range
-    if slide_index >= len(slides):
+    if slide_index >= len(builder.slide_ids):
         print(f"Slide index {slide_index} is out of range.")
         return
 
-    # Get the slide by index
-    slide_id = slides[slide_index].get('objectId')
-
-    # Prepare the image insert request
-    image_request = {
-        'createImage': {
-            'url': image_url,
-            'elementProperties': {
-                'pageObjectId': slide_id,  # Slide where the image will be placed
-                'size': {
-                    'height': {'magnitude': height, 'unit': 'EMU'},  # Image height in EMUs
-                    'width': {'magnitude': width, 'unit': 'EMU'},  # Image width in EMUs
-                },
-                'transform': {
-                    'scaleX': 1,
-                    'scaleY': 1,
-                    'translateX': x_pos,  # X position in EMUs
-                    'translateY': y_pos,  # Y position in EMUs
-                    'unit': 'EMU'
-                }
-            }
-        }
-    }
-
-    # Execute the request
-    body = {'requests': [image_request]}
-    response = slides_service.presentations().batchUpdate(presentationId=presentation_id, body=body).execute()
+    builder.insert_image(slide_index, image_url, x_pos, y_pos, width, height)
+    builder.commit()
     print(f"Inserted image on slide index {slide_index} at position ({x_pos}, {y_pos}) with size ({width}x{height}).")
 
 
@@ -153,23 +95,10 @@ def delete_slide_by_index(presentation_id, slide_index):
     :param presentation_id: The ID of the Google Slides presentation.
     :param slide_index: The index of the slide to delete (0 for the first slide, 1 for the second slide, etc.).
     """
-    # Fetch the presentation and get all the slides
-    presentation = slides_service.presentations().get(presentationId=presentation_id).execute()
-    slides = presentation.get('slides')
-
-    # Get the slide by index
-    slide_id = slides[slide_index].get('objectId')
-
-    # Create the deleteObject request to delete the slide
-    delete_request = {
-        'deleteObject': {
-            'objectId': slide_id
-        }
-    }
-
-    # Execute the request to delete the slide
-    body = {'requests': [delete_request]}
-    slides_service.presentations().batchUpdate(presentationId=presentation_id, body=body).execute()
+    builder = PresentationBuilder(slides_service, presentation_id)
+    slide_id = builder.slide_id(slide_index)
+    builder.delete_slide(slide_index)
+    builder.commit()
 
     print(f"Deleted slide index {slide_index} with ID {slide_id}.")
 
@@ -202,11 +131,14 @@ if __name__ == '__main__':
         "{p4}": "Updated text for placeholder 4"
     }
 
-    # Call the function for the first slide (index 0)
-    replace_text_in_slide_by_index(presentation_id, slide_index=0, replacements=replacements_slide_0)
+    # The deck is fetched once and all changes below are sent in a single batchUpdate
+    builder = PresentationBuilder(slides_service, presentation_id)
+
+    # Queue the replacements for the first slide (index 0)
+    builder.replace_text(0, replacements_slide_0)
 
-    # Call the function for the second slide (index 1)
-    replace_text_in_slide_by_index(presentation_id, slide_index=1, replacements=replacements_slide_1)
+    # Queue the replacements for the second slide (index 1)
+    builder.replace_text(1, replacements_slide_1)
 
     # Image URL to be inserted
     image_url = 'https://logo.clearbit.com/apple.com'
@@ -220,8 +152,16 @@ if __name__ == '__main__':
     width = 3000000  # 3 inches wide
     height = 3000000  # 3 inches high
 
-    # Insert the image
-    insert_image_on_slide(presentation_id, image_url, slide_index, x_pos, y_pos, width, height)
+    # Queue the image
+    builder.insert_image(slide_index, image_url, x_pos, y_pos, width, height)
+
+    # Send everything at once
+    builder.commit()
+    print(f"Updated presentation {presentation_id}")
+
+    # A whole deck from generated documentation, with a template made for GitDoc:
+    # slides_export.export_to_slides(drive_service, slides_service, 'owner/repo', markdown_text, flowchart_png,
+    #                                 template_id=template_id, folder_id=folder_id)
 
 
 
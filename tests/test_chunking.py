@@ -0,0 +1,91 @@
+import pytest
+
+pytest.importorskip("llama_index")
+
+from chunking import CodeNodeParser
+
+
+SOURCE = '''import os
+
+CONSTANT = 1
+
+
+@cache
+def load(path):
+    return open(path).read()
+
+
+# the loaded configuration
+class Config:
+    """A configuration."""
+
+    def get(self, key):
+        return key
+'''
+
+
+def _chunks(text, extension=".py", max_chars=3000):
+    lines = text.splitlines(keepends=True)
+    return [(chunk.symbol, chunk.symbol_type, chunk.get_text(lines))
+            for chunk in CodeNodeParser(max_chars=max_chars).get_chunks(text, extension)]
+
+
+def test_python_files_split_at_functions_and_classes():
+    chunks = _chunks(SOURCE)
+    assert [(symbol, symbol_type) for symbol, symbol_type, _ in chunks] == [
+        ("<module>", "module"), ("load", "function"), ("Config", "class")]
+    # decorators stay with their function, comments and blank lines go to the following chunk
+    assert chunks[1][2].startswith("@cache\ndef load(path):")
+    assert chunks[2][2].startswith("\n\n# the loaded configuration\nclass Config:")
+    assert "".join(text for _, _, text in chunks) == SOURCE
+
+
+def test_large_classes_split_into_header_and_methods():
+    source = ('class Big:\n    """Doc."""\n    size = 1\n\n'
+              + "".join(f"    def method_{i}(self):\n        return '{'x' * 40}'\n\n" for i in range(3))
+              + "    trailing = 2\n")
+    chunks = _chunks(source, max_chars=120)
+    assert [symbol for symbol, _, _ in chunks] == ["Big", "Big.method_0", "Big.method_1", "Big.method_2", "Big"]
+    assert chunks[0][2].startswith('class Big:\n    """Doc."""')
+    assert chunks[-1][2].strip() == "trailing = 2"
+    assert "".join(text for _, _, text in chunks) == source
+
+
+def test_long_functions_split_at_blank_lines():
+    body = "".join(f"    x{i} = {i}\n" + ("\n" if i % 5 == 4 else "") for i in range(40))
+    source = f"def long():\n{body}"
+    chunks = _chunks(source, max_chars=100)
+    assert len(chunks) > 1
+    assert all(len(text) <= 100 for _, _, text in chunks)
+    assert all(symbol == "long" for symbol, _, _ in chunks)
+    assert "".join(text for _, _, text in chunks) == source
+
+
+def test_lines_longer_than_max_chars_are_split():
+    source = "DATA = [" + "1, " * 100 + "]\n"
+    chunks = _chunks(source, max_chars=50)
+    assert all(len(text) <= 50 for _, _, text in chunks)
+    assert "".join(text for _, _, text in chunks) == source
+
+
+def test_other_languages_split_at_boundary_patterns():
+    source = "import x from 'x';\n\nexport function a() {\n  return 1;\n}\n\nclass B {\n}\n"
+    chunks = _chunks(source, extension=".js")
+    assert [symbol for symbol, _, _ in chunks] == ["<module>", "a", "B"]
+
+
+def test_invalid_python_falls_back_to_one_chunk():
+    assert _chunks("def broken(:\n    pass\n") == [("<module>", "module", "def broken(:\n    pass\n")]
+
+
+def test_nodes_carry_file_and_symbol_metadata():
+    from llama_index import Document
+    from llama_index.schema import NodeRelationship
+
+    doc = Document(text=SOURCE, doc_id="config.py@sha", extra_info={"file_path": "pkg/config.py"})
+    nodes = CodeNodeParser().get_nodes_from_documents([doc])
+    assert [(node.metadata["symbol"], node.metadata["start_line"], node.metadata["end_line"]) for node in nodes] == [
+        ("<module>", 1, 5), ("load", 6, 8), ("Config", 9, 16)]
+    assert all(node.metadata["file_path"] == "pkg/config.py" for node in nodes)
+    assert all(node.relationships[NodeRelationship.SOURCE].node_id == "config.py@sha" for node in nodes)
+    assert NodeRelationship.NEXT not in nodes[0].relationships
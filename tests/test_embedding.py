@@ -0,0 +1,81 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("llama_index")
+
+import embedding
+from embedding import EmbeddingProgress, embed_nodes
+
+
+@pytest.fixture
+def embeddings_server():
+    """Local OpenAI embeddings endpoint, rate limiting the requests listed in `rate_limited`."""
+    state = {"requests": 0, "rate_limited": set()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            state["requests"] += 1
+            if state["requests"] in state["rate_limited"]:
+                self.send_response(429)
+                self.send_header("retry-after", "0.05")
+                out = b'{"error": {"message": "Rate limit reached", "type": "requests"}}'
+            else:
+                self.send_response(200)
+                out = json.dumps({"object": "list", "model": body["model"],
+                                  "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                                  "data": [{"object": "embedding", "index": i, "embedding": [float(len(text)), 1.0]}
+                                           for i, text in enumerate(body["input"])]}).encode()
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}/v1"
+    yield state
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def no_tiktoken(monkeypatch):
+    # tiktoken downloads its encoding on first use
+    monkeypatch.setattr(embedding, "count_tokens", len)
+
+
+def _nodes(count):
+    from llama_index.schema import TextNode
+
+    return [TextNode(text=f"text {i}") for i in range(count)]
+
+
+def test_runs_share_one_model(embeddings_server):
+    from llama_index.embeddings import OpenAIEmbedding
+
+    # like the cached service context, one model for every batch and job of the process
+    model = OpenAIEmbedding(api_key="test", api_base=embeddings_server["url"])
+    for _ in range(3):
+        nodes = embed_nodes(_nodes(3), model)
+        assert [node.embedding for node in nodes] == [[6.0, 1.0]] * 3
+
+
+def test_rate_limits_back_off(embeddings_server):
+    from llama_index.embeddings import OpenAIEmbedding
+
+    embeddings_server["rate_limited"] = {1, 2}
+    model = OpenAIEmbedding(api_key="test", api_base=embeddings_server["url"])
+    progress = EmbeddingProgress(1)
+    nodes = embed_nodes(_nodes(2), model, progress=progress)
+    assert all(node.embedding for node in nodes)
+    assert progress.rate_limited == 2
+    assert progress.requests == 1
+    assert embeddings_server["requests"] == 3
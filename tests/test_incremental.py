@@ -0,0 +1,97 @@
+import pytest
+
+pytest.importorskip("llama_index")
+
+import embedding
+from incremental import diff_files, update_index
+from ingestion import make_document
+
+
+@pytest.fixture(autouse=True)
+def no_tiktoken(monkeypatch):
+    # tiktoken downloads its encoding on first use
+    monkeypatch.setattr(embedding, "count_tokens", len)
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    from benchmarks.fakes import FakePipeline
+    from index_cache import IndexCache
+    from pipeline import Settings
+
+    return FakePipeline(Settings(), index_cache=IndexCache(str(tmp_path / "cache")))
+
+
+def _docs(contents, files):
+    return [make_document("owner", "repo", "commit", path, sha, contents[sha].encode("utf-8"))
+            for path, sha in files.items()]
+
+
+def _indexed(index):
+    """Map each indexed file path to its text, checking that every node is in the vector store once."""
+    nodes = list(index.docstore.docs.values())
+    assert index.vector_store.count == len(nodes)
+    texts = {}
+    for node in sorted(nodes, key=lambda node: node.metadata.get("start_line", 0)):
+        texts[node.metadata["file_path"]] = texts.get(node.metadata["file_path"], "") + node.get_content()
+    return texts
+
+
+CONTENTS = {"sha-a": "def a():\n    return 1\n", "sha-b": "def b():\n    return 2\n",
+            "sha-b2": "def b():\n    return 3\n"}
+
+
+def _update(pipeline, old_files, new_files):
+    index = pipeline.load_index(_docs(CONTENTS, old_files), total_files=len(old_files))
+    fetched = []
+
+    def load_docs(files):
+        fetched.extend(files)
+        return _docs(CONTENTS, files)
+
+    result = update_index(index, old_files, new_files, load_docs, insert_docs=pipeline.insert_documents)
+    return index, result, fetched
+
+
+def test_diff_files():
+    assert diff_files({"a.py": "1", "b.py": "2", "c.py": "3"},
+                      {"a.py": "1", "b.py": "22", "d.py": "4"}) == (["b.py", "d.py"], ["c.py"])
+
+
+def test_added_file_with_the_content_of_an_unchanged_file(pipeline):
+    index, _, fetched = _update(pipeline, {"a.py": "sha-a"}, {"a.py": "sha-a", "copy.py": "sha-a"})
+    assert fetched == ["copy.py"]
+    assert _indexed(index) == {"a.py": CONTENTS["sha-a"], "copy.py": CONTENTS["sha-a"]}
+
+
+def test_modified_file(pipeline):
+    index, result, fetched = _update(pipeline, {"a.py": "sha-a", "b.py": "sha-b"},
+                                     {"a.py": "sha-a", "b.py": "sha-b2"})
+    assert result == (["b.py"], []) and fetched == ["b.py"]
+    assert _indexed(index) == {"a.py": CONTENTS["sha-a"], "b.py": CONTENTS["sha-b2"]}
+
+
+def test_deleting_one_of_two_identical_files(pipeline):
+    index, result, fetched = _update(pipeline, {"a.py": "sha-a", "copy.py": "sha-a"}, {"copy.py": "sha-a"})
+    assert result == ([], ["a.py"]) and fetched == []
+    assert _indexed(index) == {"copy.py": CONTENTS["sha-a"]}
+
+
+def test_renamed_file(pipeline):
+    index, result, _ = _update(pipeline, {"a.py": "sha-a", "b.py": "sha-b"}, {"a.py": "sha-a", "new.py": "sha-b"})
+    assert result == (["new.py"], ["b.py"])
+    assert _indexed(index) == {"a.py": CONTENTS["sha-a"], "new.py": CONTENTS["sha-b"]}
+
+
+def test_evicted_base_index_falls_back_to_a_full_build(pipeline, tmp_path, monkeypatch):
+    from ingestion import LocalSource
+
+    (tmp_path / "repo").mkdir()
+    (tmp_path / "repo" / "a.py").write_text(CONTENTS["sha-a"])
+    pipeline.get_index(LocalSource(str(tmp_path / "repo"), repo="repo"))
+
+    (tmp_path / "repo" / "b.py").write_text(CONTENTS["sha-b"])
+    # the base index is found by latest(), but evicted before it is loaded
+    monkeypatch.setattr(pipeline.index_cache, "get", lambda key, service_context=None: None)
+    index = pipeline.get_index(LocalSource(str(tmp_path / "repo"), repo="repo"))
+    assert _indexed(index) == {"a.py": CONTENTS["sha-a"], "b.py": CONTENTS["sha-b"]}
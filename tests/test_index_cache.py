@@ -0,0 +1,35 @@
+import threading
+import time
+
+from index_cache import IndexCache, make_key
+
+
+def test_builds_of_the_same_key_wait_for_each_other(tmp_path):
+    cache = IndexCache(str(tmp_path))
+    active, overlaps, built = [], [], []
+
+    def build(key):
+        with cache.building(key):
+            active.append(key)
+            overlaps.append(active.count(key))
+            time.sleep(0.05)
+            built.append(key)
+            active.remove(key)
+
+    threads = [threading.Thread(target=build, args=(key,)) for key in ["a", "a", "a", "b"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(overlaps) == 1
+    assert sorted(built) == ["a", "a", "a", "b"]
+    # the locks are dropped once nobody uses them
+    assert cache._building == {}
+
+
+def test_key_depends_on_commit_and_file_settings():
+    key = make_key("owner", "repo", "sha1", [".py"])
+    assert key == make_key("owner", "repo", "sha1", [".py"])
+    assert key != make_key("owner", "repo", "sha2", [".py"])
+    assert key != make_key("owner", "repo", "sha1", [".py", ".md"])
+    assert key != make_key("owner", "repo", "sha1", [".py"], max_file_size=10)
@@ -0,0 +1,87 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import index_pool
+from index_pool import IndexPool
+
+
+def _index(nbytes=100):
+    return SimpleNamespace(vector_store=SimpleNamespace(nbytes=nbytes), docstore=SimpleNamespace(docs={}))
+
+
+def test_acquire_loads_once_and_then_hits():
+    pool = IndexPool()
+    index = _index()
+    assert pool.acquire("a", lambda: index, holder="s1") is index
+    assert pool.acquire("a", lambda: _index(), holder="s2") is index
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"], stats["indexes"][0]["refs"]) == (1, 1, 2)
+
+
+def test_concurrent_acquires_share_one_load():
+    pool = IndexPool()
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.05)
+        return _index()
+
+    threads = [threading.Thread(target=pool.acquire, args=("a", load)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+
+
+def test_failed_load_is_not_pooled():
+    pool = IndexPool()
+    assert pool.acquire("a", lambda: None) is None
+    assert pool.get("a") is None
+
+
+def test_least_recently_used_unheld_index_is_evicted():
+    pool = IndexPool(max_bytes=250)
+    pool.put("a", _index())
+    pool.put("b", _index())
+    pool.get("a")
+    pool.put("c", _index())
+    assert [index["key"] for index in pool.stats()["indexes"]] == ["c", "a"]
+    assert pool.stats()["evictions"] == 1
+
+
+def test_held_indexes_are_not_evicted():
+    pool = IndexPool(max_bytes=150)
+    pool.put("a", _index(), holder="s1")
+    pool.put("b", _index(), holder="s2")
+    # both are in use, so the pool stays above the ceiling
+    assert pool.stats()["entries"] == 2
+
+    pool.release("s1")
+    assert [index["key"] for index in pool.stats()["indexes"]] == ["b"]
+
+
+def test_release_keeps_the_index_in_use():
+    pool = IndexPool(max_bytes=150)
+    pool.put("a", _index(), holder="s1")
+    pool.put("b", _index(), holder="s1")
+    pool.release("s1", keep="b")
+    assert [index["key"] for index in pool.stats()["indexes"]] == ["b"]
+    assert pool.stats()["indexes"][0]["refs"] == 1
+
+
+def test_idle_holds_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(index_pool.time, "time", lambda: now[0])
+    pool = IndexPool(max_bytes=150, hold_ttl=60)
+    pool.put("a", _index(), holder="idle")
+    now[0] += 30
+    pool.put("b", _index(), holder="active")
+    assert pool.stats()["entries"] == 2
+
+    now[0] += 45
+    # the hold on a is older than the TTL, b was used 45 seconds ago
+    pool.put("c", _index(), holder="active")
+    assert [index["key"] for index in pool.stats()["indexes"]] == ["c", "b"]
@@ -0,0 +1,102 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from ingestion import LocalSource, list_local_files, resolve_local_path
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _git(root, *args):
+    subprocess.run(["git", "-C", str(root), "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   check=True, capture_output=True)
+
+
+@pytest.fixture
+def checkout(tmp_path):
+    root = tmp_path / "repo"
+    (root / "pkg").mkdir(parents=True)
+    (root / "app.py").write_text("print('app')\n")
+    (root / "pkg" / "mod.py").write_text("x = 1\n")
+    _git(root, "init", "-q")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "init")
+    return root
+
+
+def _head(root):
+    return subprocess.run(["git", "-C", str(root), "rev-parse", "HEAD"], capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+
+def test_clean_checkout_is_keyed_by_commit(checkout):
+    assert LocalSource(str(checkout)).resolve() == _head(checkout)
+
+
+def test_changed_files_change_the_key(checkout):
+    before = LocalSource(str(checkout)).resolve()
+    (checkout / "pkg" / "mod.py").write_text("x = 2\n")
+    edited = LocalSource(str(checkout)).resolve()
+    (checkout / "new.py").write_text("y = 1\n")
+    added = LocalSource(str(checkout)).resolve()
+    assert len({before, edited, added}) == 3
+    assert edited.startswith(_head(checkout) + "-")
+
+
+def test_subdirectory_is_not_keyed_by_the_repository_commit(checkout):
+    assert LocalSource(str(checkout / "pkg")).resolve() != _head(checkout)
+
+
+def test_directory_outside_git_uses_a_fingerprint(tmp_path):
+    (tmp_path / "a.py").write_text("a = 1\n")
+    before = LocalSource(str(tmp_path)).resolve()
+    (tmp_path / "a.py").write_text("a = 22\n")
+    assert before.startswith("local-")
+    assert LocalSource(str(tmp_path)).resolve() != before
+
+
+def test_symlinks_out_of_the_root_are_skipped(tmp_path):
+    secret = tmp_path / "secret.py"
+    secret.write_text("KEY = 'secret'\n")
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "inside.py").write_text("a = 1\n")
+    os.symlink(secret, root / "outside.py")
+    os.symlink(root / "inside.py", root / "alias.py")
+    assert sorted(list_local_files(str(root), [".py"])) == ["alias.py", "inside.py"]
+
+
+def test_resolve_local_path_stays_under_root(tmp_path):
+    (tmp_path / "repo").mkdir()
+    assert resolve_local_path("repo", root=str(tmp_path)) == os.path.realpath(tmp_path / "repo")
+    assert resolve_local_path("../", root=str(tmp_path / "repo")) is None
+    assert resolve_local_path("repo", root=None) is None
+
+
+@pytest.fixture
+def github_tree(tmp_path):
+    pytest.importorskip("llama_hub")
+    pytest.importorskip("llama_index")
+    for path in ["a.py", "pkg/b.py", "pkg/sub/c.py", "pkg/sub/d.txt", "docs/e.py"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(f"# {path}\n")
+    return tmp_path
+
+
+@pytest.mark.parametrize("max_tree_entries", [100, 3])
+def test_list_files_from_the_github_api(github_tree, max_tree_entries):
+    from llama_hub.github_repo import GithubClient
+
+    from benchmarks.fakes import FakeGithubServer
+    from ingestion import _blob_sha, list_files
+
+    with FakeGithubServer(str(github_tree), max_tree_entries=max_tree_entries) as server:
+        client = GithubClient("offline", base_url=server.url)
+        files = list_files(client, server.owner, server.repo, server.commit_sha, [".py"])
+        requests = server.requests
+    assert files == {path: _blob_sha(f"# {path}\n".encode("utf-8"))
+                     for path in ["a.py", "pkg/b.py", "pkg/sub/c.py", "docs/e.py"]}
+    # the commit and one recursive tree request, truncated trees are walked one request per directory
+    assert requests == (2 if max_tree_entries == 100 else 2 + 4)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from jobs import DONE, FAILED, QUEUED, JobQueue
+
+
+def _wait(queue, job_id, status, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {queue.get(job_id)['status']}, not {status}")
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def test_same_key_joins_the_running_job(db):
+    release = threading.Event()
+    queue = JobQueue(lambda params, job: release.wait(5) and params, path=db)
+    first = queue.submit("key", {"n": 1})
+    assert queue.submit("key", {"n": 1}) == first
+    assert queue.submit("other", {"n": 2}) != first
+    release.set()
+    assert _wait(queue, first, DONE)["result"] == {"n": 1}
+
+
+def test_secrets_reach_the_runner_but_not_the_table(db):
+    queue = JobQueue(lambda params, job: job.secrets.get("openai_api_key") == "sk-test", path=db)
+    job_id = queue.submit("key", {}, secrets={"openai_api_key": "sk-test"})
+    assert _wait(queue, job_id, DONE)["result"] is True
+    assert "sk-test" not in str(queue._conn.execute("SELECT * FROM jobs").fetchall())
+
+
+def test_jobs_of_a_live_queue_are_not_taken_over(db):
+    release = threading.Event()
+    first = JobQueue(lambda params, job: release.wait(5), path=db)
+    job_id = first.submit("key", {})
+    _wait(first, job_id, "running")
+
+    second = JobQueue(lambda params, job: "second", path=db)
+    release.set()
+    job = _wait(first, job_id, DONE)
+    assert job["result"] is True
+    assert job["error"] is None
+    assert second.stats()[DONE] == 1
+
+
+def test_jobs_of_a_gone_queue_are_restarted(db):
+    queue = JobQueue(lambda params, job: params, path=db)
+    now = time.time()
+    with queue._lock:
+        queue._conn.executemany(
+            "INSERT INTO jobs (id, key, status, params, created, has_secrets, owner) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [("plain", "k1", "running", '{"n": 1}', now, 0, "gone"),
+             ("secret", "k2", QUEUED, "{}", now, 1, "gone"),
+             ("legacy", "k3", QUEUED, '{"n": 3}', now, 0, None)])
+        queue._conn.commit()
+
+    restarted = JobQueue(lambda params, job: params, path=db)
+    assert _wait(restarted, "plain", DONE)["result"] == {"n": 1}
+    assert _wait(restarted, "legacy", DONE)["result"] == {"n": 3}
+    assert "restarted" in _wait(restarted, "secret", FAILED)["error"]
+
+
+def test_latest_summary_is_stored_with_the_job(db):
+    def runner(params, job):
+        job.summary("file", "a.py", "summary of a.py")
+        job.summary("package", ".", "summary of the package")
+        return None
+
+    queue = JobQueue(runner, path=db)
+    job = _wait(queue, queue.submit("key", {}), DONE)
+    assert job["summary"] == {"kind": "package", "name": ".", "text": "summary of the package"}
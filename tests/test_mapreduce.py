@@ -0,0 +1,45 @@
+import re
+from types import SimpleNamespace
+
+from mapreduce import MapReduceGenerator, SummaryCache
+
+
+class RecordingLLM:
+    """Answers every prompt with the name it is about, recording the prompts."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def complete(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text="summary of " + re.search(r"`([^`]+)`", prompt).group(1))
+
+    def stream_complete(self, prompt):
+        self.prompts.append(prompt)
+        yield SimpleNamespace(delta="docs")
+
+
+def _generate(llm, cache, files):
+    return list(MapReduceGenerator(llm, "model", "technical", cache=cache, workers=2).generate(files))
+
+
+def test_levels_are_yielded_in_order(tmp_path):
+    files = {"a.py": ("sha-a", ["x = 1"]), "pkg/b.py": ("sha-b", ["y = 2"])}
+    kinds = [kind for kind, _, _ in _generate(RecordingLLM(), SummaryCache(str(tmp_path)), files)]
+    assert kinds == ["file", "file", "package", "package", "token"]
+
+
+def test_identical_files_at_other_paths_are_summarized_separately(tmp_path):
+    files = {"a/util.py": ("same-sha", ["x = 1"]), "b/util.py": ("same-sha", ["x = 1"])}
+    results = _generate(RecordingLLM(), SummaryCache(str(tmp_path)), files)
+    summaries = {name: text for kind, name, text in results if kind == "file"}
+    assert summaries == {"a/util.py": "summary of a/util.py", "b/util.py": "summary of b/util.py"}
+
+
+def test_unchanged_files_are_not_summarized_again(tmp_path):
+    cache = SummaryCache(str(tmp_path))
+    _generate(RecordingLLM(), cache, {"a.py": ("sha-a", ["x = 1"]), "b.py": ("sha-b", ["y = 2"])})
+    llm = RecordingLLM()
+    _generate(llm, cache, {"a.py": ("sha-a", ["x = 1"]), "b.py": ("sha-b2", ["y = 3"])})
+    file_prompts = [prompt for prompt in llm.prompts if prompt.lstrip().startswith("Summarize the file")]
+    assert len(file_prompts) == 1 and "`b.py`" in file_prompts[0]
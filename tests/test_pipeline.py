@@ -0,0 +1,43 @@
+import pytest
+
+from pipeline import outline_markdown
+
+
+def test_outline_keeps_headings_and_first_paragraphs():
+    text = ("Intro\ncontinued\n\nmore intro\n"
+            "# Usage\nRun it.\n\nDetails.\n"
+            "## Example\n```python\n# not a heading\nrun()\n```\nCall run.\n"
+            "## Empty\n")
+    assert outline_markdown(text) == "Intro continued\n# Usage\nRun it.\n## Example\nCall run.\n## Empty"
+
+
+def test_outline_is_capped():
+    text = "\n".join(f"# Section {i}\n{'word ' * 50}" for i in range(100))
+    assert len(outline_markdown(text, max_chars=500)) == 500
+
+
+def test_retriever_embeds_queries_with_the_pipeline_model(monkeypatch):
+    pytest.importorskip("llama_index")
+    import embedding
+    from benchmarks.fakes import FakeEmbedding, FakePipeline
+    from ingestion import make_document
+    from pipeline import Settings
+
+    monkeypatch.setattr(embedding, "count_tokens", len)
+
+    class CountingEmbedding(FakeEmbedding):
+        queries: list = []
+
+        def _get_query_embedding(self, query):
+            self.queries.append(query)
+            return super()._get_query_embedding(query)
+
+    # the index keeps the service context of the pipeline that built it, like a shared index
+    owner = FakePipeline(Settings(), embed_model=CountingEmbedding(dim=64, queries=[]))
+    index = owner.load_index([make_document("o", "r", "c", "a.py", "sha", b"def load_config():\n    pass\n")], 1)
+    session = FakePipeline(Settings(), embed_model=CountingEmbedding(dim=64, queries=[]))
+
+    results = session.retriever(index).retrieve("load config")
+    assert [result.node.metadata["file_path"] for result in results] == ["a.py"]
+    assert session.embed_model.queries == ["load config"]
+    assert owner.embed_model.queries == []
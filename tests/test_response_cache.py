@@ -0,0 +1,110 @@
+import pytest
+
+from response_cache import ResponseCache, replay
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "responses.sqlite3"))
+
+
+def test_key_depends_on_every_part():
+    key = ResponseCache.make_key("doc", "gpt-4", "technical", "prompt", "node:hash")
+    assert key == ResponseCache.make_key("doc", "gpt-4", "technical", "prompt", "node:hash")
+    assert len({key,
+                ResponseCache.make_key("doc", "gpt-3.5-turbo", "technical", "prompt", "node:hash"),
+                ResponseCache.make_key("doc", "gpt-4", "technical", "other prompt", "node:hash"),
+                ResponseCache.make_key("doc", "gpt-4", "technical", "prompt", "node:new-hash"),
+                # parts are separated, moving text between them changes the key
+                ResponseCache.make_key("doc", "gpt-4", "technical", "promptnode:hash")}) == 5
+
+
+def test_hit_and_miss(cache):
+    assert cache.get("key") is None
+    cache.put("key", "response")
+    assert cache.get("key") == "response"
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "bytes": len("response")}
+
+
+def test_expired_responses_are_dropped(tmp_path, monkeypatch):
+    import response_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), ttl=60)
+    cache.put("key", "response")
+    now[0] += 59
+    assert cache.get("key") == "response"
+    now[0] += 2
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path, monkeypatch):
+    import response_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_bytes=20)
+    for key in ["a", "b"]:
+        cache.put(key, "x" * 8)
+        now[0] += 1
+    cache.get("a")
+    now[0] += 1
+    cache.put("c", "x" * 8)
+    assert [cache.get(key) is not None for key in "abc"] == [True, False, True]
+    # a response larger than the limit is still kept until the next one is stored
+    cache.put("big", "x" * 30)
+    assert cache.get("big") is not None
+
+
+def test_record_stores_completed_streams(cache):
+    stream = cache.record("key", iter(["Hello", ", ", "world"]))
+    assert next(stream) == "Hello"
+    assert cache.get("key") is None
+    assert "".join(stream) == ", world"
+    assert cache.get("key") == "Hello, world"
+    assert "".join(replay("Hello, world", chunk_size=5)) == "Hello, world"
+
+
+@pytest.fixture
+def docs_run(tmp_path, monkeypatch):
+    pytest.importorskip("llama_index")
+    import embedding
+    from benchmarks.fakes import FakePipeline
+    from index_cache import IndexCache
+    from ingestion import make_document
+    from pipeline import Settings
+
+    monkeypatch.setattr(embedding, "count_tokens", len)
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    index_cache = IndexCache(str(tmp_path / "indexes"))
+    # like the index cache, one index per commit
+    indexes = {}
+
+    def run(commit="c1", content=b"def load():\n    return 1\n", **settings):
+        pipeline = FakePipeline(Settings(**settings), index_cache=index_cache, response_cache=cache)
+        if commit not in indexes:
+            doc = make_document("o", "r", commit, "a.py", f"sha-{commit}", content)
+            indexes[commit] = pipeline.load_index([doc], 1)
+        index = indexes[commit]
+        text = "".join(pipeline.generate_docs(index, pipeline.chat_engine(index)))
+        return text, cache.hits
+
+    return run
+
+
+def test_documentation_is_replayed_until_the_model_prompt_or_commit_changes(docs_run):
+    text, hits = docs_run()
+    assert hits == 0
+    assert docs_run() == (text, 1)
+    assert docs_run(model="gpt-3.5-turbo")[1] == 1
+    # the audience is part of the prompt
+    assert docs_run(audience="beginner")[1] == 1
+    assert docs_run(commit="c2", content=b"def load():\n    return 2\n")[1] == 1
+    assert docs_run(commit="c2")[1] == 2
+
+
+def test_disabled_cache_regenerates(docs_run):
+    docs_run()
+    assert docs_run(use_response_cache=False)[1] == 0
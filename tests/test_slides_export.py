@@ -0,0 +1,23 @@
+from slides_export import split_sections
+
+
+def test_sections_split_at_headings():
+    sections = split_sections("Intro text\n# Usage\nRun it\n## Options\n- verbose\n")
+    assert sections == [("Overview", "Intro text"), ("Usage", "Run it"), ("Options", "• verbose")]
+
+
+def test_comments_in_code_blocks_are_not_headings():
+    sections = split_sections("# Example\n```python\n# not a heading\nx = 1\n```\n")
+    assert sections == [("Example", "# not a heading\nx = 1")]
+
+
+def test_unclosed_code_block_keeps_the_last_section():
+    sections = split_sections("# Intro\nText\n# Example\n```python\nx = 1\n")
+    assert sections == [("Intro", "Text"), ("Example", "x = 1")]
+
+
+def test_long_sections_continue_on_more_slides():
+    sections = split_sections("# Long\n" + "\n\n".join(["word " * 10] * 4), max_chars=120)
+    assert len(sections) > 1
+    assert sections[0][0] == "Long"
+    assert all(heading == "Long (cont.)" for heading, _ in sections[1:])
@@ -0,0 +1,57 @@
+from static_graph import build_graphs
+
+
+def _graphs(files):
+    return build_graphs({path: (f"sha-{path}", source) for path, source in files.items()})
+
+
+def test_from_dot_import_module():
+    import_edges, _, _ = _graphs({
+        "pkg/__init__.py": "",
+        "pkg/a.py": "from . import b\n",
+        "pkg/b.py": "",
+    })
+    assert ("pkg.a", "pkg.b") in import_edges
+    assert ("pkg.a", "pkg") not in import_edges
+
+
+def test_from_dot_dot_import_module():
+    import_edges, _, _ = _graphs({
+        "pkg/__init__.py": "",
+        "pkg/b.py": "",
+        "pkg/sub/__init__.py": "",
+        "pkg/sub/x.py": "from .. import b\nfrom ..b import helper\n",
+    })
+    assert ("pkg.sub.x", "pkg.b") in import_edges
+    assert ("pkg.sub.x", "pkg") not in import_edges
+
+
+def test_relative_imports_in_init():
+    import_edges, _, _ = _graphs({
+        "pkg/__init__.py": "from . import b\nfrom .c import f\n",
+        "pkg/b.py": "",
+        "pkg/c.py": "def f():\n    pass\n",
+        "pkg/sub/__init__.py": "from .. import b\n",
+    })
+    assert ("pkg", "pkg.b") in import_edges
+    assert ("pkg", "pkg.c") in import_edges
+    assert ("pkg.sub", "pkg.b") in import_edges
+
+
+def test_import_dotted_module():
+    import_edges, call_edges, _ = _graphs({
+        "main.py": "import pkg.b\n\ndef run():\n    pkg.b.helper()\n",
+        "pkg/__init__.py": "",
+        "pkg/b.py": "def helper():\n    pass\n",
+    })
+    assert ("main", "pkg.b") in import_edges
+    assert ("main:run", "pkg.b:helper") in call_edges
+
+
+def test_calls_through_relative_import():
+    _, call_edges, _ = _graphs({
+        "pkg/__init__.py": "",
+        "pkg/a.py": "from . import b\n\ndef run():\n    b.helper()\n",
+        "pkg/b.py": "def helper():\n    pass\n",
+    })
+    assert ("pkg.a:run", "pkg.b:helper") in call_edges
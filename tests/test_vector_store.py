@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from vector_store import NumpyVectorStore, load_vector_store
+
+
+class Node:
+    """The parts of a llama_index node the store reads."""
+
+    def __init__(self, node_id, ref_doc_id, embedding):
+        self.node_id = node_id
+        self.ref_doc_id = ref_doc_id
+        self.embedding = embedding
+
+    def get_embedding(self):
+        return self.embedding
+
+
+def _unit(i, dim=8):
+    vector = [0.0] * dim
+    vector[i % dim] = 1.0
+    return vector
+
+
+def _store(dtype="float32", docs=4, nodes_per_doc=3):
+    store = NumpyVectorStore(dtype)
+    store.add([Node(f"d{d}-n{n}", f"d{d}", _unit(d * nodes_per_doc + n))
+               for d in range(docs) for n in range(nodes_per_doc)])
+    return store
+
+
+def _query(store, embedding, top_k=3, **kwargs):
+    types = pytest.importorskip("llama_index.vector_stores.types")
+    return store.query(types.VectorStoreQuery(query_embedding=embedding, similarity_top_k=top_k, **kwargs))
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_add_and_get(dtype):
+    store = _store(dtype)
+    assert store.count == 12
+    np.testing.assert_allclose(store.get("d1-n2"), _unit(5), atol=1e-2)
+
+
+def test_add_replaces_nodes_with_the_same_id():
+    store = _store()
+    store.add([Node("d0-n0", "d3", _unit(7))])
+    assert store.count == 12
+    np.testing.assert_allclose(store.get("d0-n0"), _unit(7))
+    # the replaced node now belongs to d3, deleting d0 keeps it
+    store.delete("d0")
+    assert "d0-n0" in store._rows
+    store.delete("d3")
+    assert "d0-n0" not in store._rows
+
+
+def test_delete_compacts_once_enough_rows_are_gone():
+    store = _store(docs=8)
+    store.delete("d0")
+    assert store.count == 21 and store._size == 24
+    store.delete("d1")
+    store.delete("d2")
+    # compacted below (1 - COMPACT_RATIO) of the rows
+    assert store.count == 15 and store._size == 15
+    assert sorted(store._rows) == sorted(f"d{d}-n{n}" for d in range(3, 8) for n in range(3))
+    for node_id, row in store._rows.items():
+        assert store._ids[row] == node_id
+    np.testing.assert_allclose(store.get("d5-n1"), _unit(16))
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_persist_and_reload_memory_mapped(tmp_path, dtype):
+    store = _store(dtype)
+    store.delete("d1")
+    path = str(tmp_path / "default__vector_store.json")
+    store.persist(path)
+
+    loaded = load_vector_store(str(tmp_path))
+    assert isinstance(loaded._vectors, np.memmap)
+    assert sorted(loaded._rows) == sorted(store._rows)
+    np.testing.assert_allclose(loaded.get("d2-n0"), store.get("d2-n0"))
+    # writes copy the memory map first
+    loaded.add([Node("new", "d9", _unit(3))])
+    loaded.delete("d2")
+    assert loaded.count == 7
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_empty_store_reloads(tmp_path, dtype):
+    path = str(tmp_path / "default__vector_store.json")
+    NumpyVectorStore(dtype).persist(path)
+    loaded = NumpyVectorStore.from_persist_path(path)
+    assert loaded.count == 0
+    loaded.add([Node("a", "d0", _unit(0))])
+    assert loaded.count == 1
+
+
+def test_converts_simple_vector_store_data():
+    store = NumpyVectorStore.from_embeddings({"a": _unit(0), "b": _unit(1)}, {"a": "d0"}, dtype="float32")
+    store.delete("None")
+    assert sorted(store._rows) == ["a"]
+
+
+def test_query_returns_the_nearest_nodes():
+    result = _query(_store(), _unit(4), top_k=2)
+    assert result.ids[0] == "d1-n1"
+    assert result.similarities[0] == pytest.approx(1.0)
+    assert len(result.ids) == 2
+
+
+def test_query_filters_by_node_and_doc_ids():
+    store = _store()
+    result = _query(store, _unit(4), node_ids=["d0-n0", "d2-n2", "missing"])
+    assert sorted(result.ids) == ["d0-n0", "d2-n2"]
+    result = _query(store, _unit(4), top_k=10, doc_ids=["d3"])
+    assert sorted(result.ids) == ["d3-n0", "d3-n1", "d3-n2"]
+
+
+def test_query_skips_deleted_nodes():
+    store = _store()
+    store.delete("d1")
+    result = _query(store, _unit(4), top_k=12)
+    assert len(result.ids) == 9
+    assert not any(node_id.startswith("d1-") for node_id in result.ids)
@@ -0,0 +1,266 @@
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# finished spans kept in memory for the debug panel and the batch report
+MAX_SPANS = 5000
+# upper bounds of the duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# numeric span attributes summed into counters
+COUNTERS = ("tokens", "chars", "bytes", "files", "nodes", "requests", "rate_limited")
+
+LOG_SPANS = bool(os.getenv("GITDOC_TRACE_LOG"))
+METRICS_PORT = int(os.getenv("GITDOC_METRICS_PORT", 0))
+
+logger = logging.getLogger("gitdoc.trace")
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    """
+    One timed step of a generation request, with attributes such as token counts, bytes or cache hits.
+    """
+
+    def __init__(self, name, trace_id=None, **attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.attrs = attrs
+        self.start = time.time()
+        self.seconds = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {"name": self.name, "trace_id": self.trace_id, "start": self.start, "seconds": self.seconds,
+                "error": self.error, **self.attrs}
+
+
+class _Stats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Tracer:
+    """
+    Records spans of the pipeline stages and aggregates them into metrics.
+
+    Finished spans are kept in a bounded buffer, grouped by trace id so the spans of one generation
+    can be shown together, and summed per span name into counts, errors, a duration histogram,
+    counters and cache hits. The metrics are exported in the Prometheus text format; with `log`
+    set, every span is also logged as one logfmt line on the gitdoc.trace logger.
+    """
+
+    def __init__(self, max_spans=MAX_SPANS, log=LOG_SPANS):
+        self.log = log
+        self._spans = deque(maxlen=max_spans)
+        self._stats = {}
+        self._lock = threading.Lock()
+        if log and not logger.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+    @contextmanager
+    def span(self, name, trace_id=None, **attrs):
+        """
+        Time a block as a span. Exceptions are recorded as the span error and re-raised.
+        Yields:
+        - Span: Set attributes on it with span.set, or an error without raising with span.error
+        """
+        span = Span(name, trace_id, **attrs)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.seconds = time.perf_counter() - started
+            self._finish(span)
+
+    def record(self, name, seconds, trace_id=None, error=None, **attrs):
+        """Record a span measured elsewhere, e.g. time accumulated over many small calls."""
+        span = Span(name, trace_id, **attrs)
+        span.seconds = seconds
+        span.error = error
+        self._finish(span)
+
+    def traced_iter(self, name, iterable, trace_id=None, count="items", measure=None, **attrs):
+        """
+        Wrap an iterator, such as a token stream or a stream of fetched files, and record one span
+        for it once it is exhausted or closed.
+
+        The span duration is the time spent waiting for items, not the time the consumer spends on
+        them, so streaming a response and rendering it are measured separately.
+        Args:
+        - name (str): Span name
+        - iterable (iterable): Iterator to wrap
+        - trace_id (str): Trace the span belongs to
+        - count (str): Attribute the number of items is stored in, e.g. tokens or files
+        - measure (callable): measure(item) returns a dict of numbers summed into the span attributes
+        Yields:
+        - The items of the iterable
+        """
+        span = Span(name, trace_id, **attrs)
+        span.attrs[count] = 0
+        waited = 0.0
+        try:
+            iterator = iter(iterable)
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    waited += time.perf_counter() - started
+                    break
+                waited += time.perf_counter() - started
+                if not span.attrs[count]:
+                    span.attrs["first_item_seconds"] = time.time() - span.start
+                span.attrs[count] += 1
+                if measure is not None:
+                    for key, value in measure(item).items():
+                        span.attrs[key] = span.attrs.get(key, 0) + value
+                yield item
+        except GeneratorExit:
+            span.error = "closed before the end"
+            raise
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.seconds = waited
+            self._finish(span)
+
+    def _finish(self, span):
+        with self._lock:
+            self._spans.append(span)
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = _Stats()
+            stats.count += 1
+            stats.errors += span.error is not None
+            stats.seconds += span.seconds
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.seconds <= bound:
+                    stats.buckets[i] += 1
+            for key in COUNTERS:
+                value = span.attrs.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stats.counters[key] += value
+            if span.attrs.get("cache_hit") is True:
+                stats.cache_hits += 1
+            elif span.attrs.get("cache_hit") is False:
+                stats.cache_misses += 1
+        if self.log:
+            logger.info(format_span(span))
+
+    def spans(self, trace_id=None):
+        """
+        Return finished spans as dicts, oldest first.
+        Args:
+        - trace_id (str): Only return the spans of this trace
+        """
+        with self._lock:
+            return [span.to_dict() for span in self._spans if trace_id is None or span.trace_id == trace_id]
+
+    def metrics(self):
+        """Return the aggregated metrics per span name."""
+        with self._lock:
+            return {name: {"count": stats.count, "errors": stats.errors, "seconds": stats.seconds,
+                           "cache_hits": stats.cache_hits, "cache_misses": stats.cache_misses,
+                           **{key: value for key, value in stats.counters.items() if value}}
+                    for name, stats in self._stats.items()}
+
+    def prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        lines = ["# HELP gitdoc_span_seconds Duration of pipeline stages.", "# TYPE gitdoc_span_seconds histogram"]
+        with self._lock:
+            stats = sorted(self._stats.items())
+            for name, s in stats:
+                for bound, value in zip(DURATION_BUCKETS, s.buckets):
+                    lines.append(f'gitdoc_span_seconds_bucket{{span="{name}",le="{bound}"}} {value}')
+                lines.append(f'gitdoc_span_seconds_bucket{{span="{name}",le="+Inf"}} {s.count}')
+                lines.append(f'gitdoc_span_seconds_sum{{span="{name}"}} {s.seconds}')
+                lines.append(f'gitdoc_span_seconds_count{{span="{name}"}} {s.count}')
+
+            lines += ["# HELP gitdoc_span_errors_total Failed pipeline stages.",
+                      "# TYPE gitdoc_span_errors_total counter"]
+            lines += [f'gitdoc_span_errors_total{{span="{name}"}} {s.errors}' for name, s in stats]
+            lines += ["# HELP gitdoc_cache_requests_total Cache lookups of pipeline stages.",
+                      "# TYPE gitdoc_cache_requests_total counter"]
+            for name, s in stats:
+                if s.cache_hits or s.cache_misses:
+                    lines.append(f'gitdoc_cache_requests_total{{span="{name}",result="hit"}} {s.cache_hits}')
+                    lines.append(f'gitdoc_cache_requests_total{{span="{name}",result="miss"}} {s.cache_misses}')
+            for key in COUNTERS:
+                lines += [f"# TYPE gitdoc_{key}_total counter"]
+                lines += [f'gitdoc_{key}_total{{span="{name}"}} {s.counters[key]}' for name, s in stats
+                          if s.counters[key]]
+        return "\n".join(lines) + "\n"
+
+
+def format_span(span):
+    """Format a span as one logfmt line."""
+    fields = {"span": span.name, "trace": span.trace_id, "ms": round(span.seconds * 1000, 1), **span.attrs}
+    if span.error is not None:
+        fields["error"] = span.error
+    parts = []
+    for key, value in fields.items():
+        if isinstance(value, float):
+            value = round(value, 4)
+        value = str(value)
+        parts.append(f"{key}={value!r}" if " " in value or "=" in value else f"{key}={value}")
+    return " ".join(parts)
+
+
+def serve_metrics(tracer, port=METRICS_PORT, host="0.0.0.0", ready=None):
+    """
+    Serve the metrics of a tracer at /metrics on a background thread.
+    With `ready`, a callable, /ready answers 200 once it returns true and 503 before, for readiness probes.
+    Returns:
+    - ThreadingHTTPServer: Call shutdown() to stop it
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/ready" and ready is not None:
+                status, body = (200, b"ready\n") if ready() else (503, b"warming up\n")
+            elif path == "/metrics":
+                status, body = 200, tracer.prometheus().encode("utf-8")
+            else:
+                self.send_error(404)
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gitdoc-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,297 @@
+import json
+import os
+
+import numpy as np
+
+
+DTYPES = ("float32", "float16", "int8")
+DEFAULT_DTYPE = os.getenv("GITDOC_VECTOR_DTYPE", "float16")
+
+# rows scored at once, bounds the temporary float32 copy made for int8 vectors
+QUERY_CHUNK_ROWS = 2048
+
+# compact the arrays once this share of the rows has been deleted
+COMPACT_RATIO = 0.25
+
+_NAMESPACE_SEP = "__"
+_PERSIST_FNAME = "vector_store.json"
+
+
+def _paths(persist_path):
+    base = os.path.splitext(persist_path)[0]
+    return persist_path, base + ".npy", base + ".scales.npy"
+
+
+def _quantize(vectors, dtype):
+    # vectors are normalized first, so the dot product with a normalized query is the cosine similarity
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    if dtype != "int8":
+        return vectors.astype(dtype), None
+    # symmetric per-vector scale
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class NumpyVectorStore:
+    """
+    Vector store keeping all embeddings in one contiguous NumPy array.
+
+    Embeddings are normalized and stored as float16 (default), int8 with a per-vector scale,
+    or float32, instead of Python lists of floats. Persisted stores are written as .npy files
+    next to the JSON the storage context expects and memory-mapped on load, so loading an index
+    does not parse its embeddings and pages are only read when queried. Queries score all
+    vectors with one matrix product and select the top k with argpartition.
+
+    Implements the llama_index VectorStore protocol for VectorStoreIndex.
+    """
+
+    stores_text = False
+    is_embedding_query = True
+
+    def __init__(self, dtype=DEFAULT_DTYPE):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+        self.dtype = dtype
+        self._vectors = None
+        self._scales = None
+        self._size = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids = []
+        self._ref_doc_ids = []
+        self._rows = {}
+        # document id -> rows of its nodes, may include rows of replaced nodes
+        self._doc_rows = {}
+
+    @property
+    def client(self):
+        return None
+
+    @property
+    def nbytes(self):
+        """Bytes of the embedding arrays, including spare capacity and memory-mapped pages."""
+        total = self._vectors.nbytes if self._vectors is not None else 0
+        return total + (self._scales.nbytes if self._scales is not None else 0) + self._alive.nbytes
+
+    @property
+    def count(self):
+        # not __len__: the storage context tests `if vector_store:`, an empty store must stay truthy
+        return len(self._rows)
+
+    def _reserve(self, rows, dim):
+        # grow by doubling, and copy memory-mapped arrays into memory before the first write
+        if self._size == 0 and self._vectors is not None and self._vectors.shape[1] != dim:
+            # an empty store takes the dimension of the first embeddings
+            self._vectors = self._scales = None
+        capacity = 0 if self._vectors is None else len(self._vectors)
+        if self._vectors is not None and self._vectors.shape[1] != dim:
+            raise ValueError(f"embedding dimension {dim} does not match the store dimension "
+                             f"{self._vectors.shape[1]}")
+        needed = self._size + rows
+        if needed <= capacity and not isinstance(self._vectors, np.memmap):
+            return
+        capacity = max(needed, 2 * capacity, 1024)
+        vectors = np.empty((capacity, dim), dtype=self.dtype)
+        alive = np.zeros(capacity, dtype=bool)
+        if self._vectors is not None:
+            vectors[:self._size] = self._vectors[:self._size]
+            alive[:self._size] = self._alive[:self._size]
+        self._vectors, self._alive = vectors, alive
+        if self.dtype == "int8":
+            scales = np.ones(capacity, dtype=np.float32)
+            if self._scales is not None:
+                scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+
+    def add(self, nodes, **add_kwargs):
+        """Add nodes with embeddings, replacing nodes with the same id."""
+        if not nodes:
+            return []
+        for node in nodes:
+            if node.node_id in self._rows:
+                self._alive[self._rows.pop(node.node_id)] = False
+        vectors, scales = _quantize([node.get_embedding() for node in nodes], self.dtype)
+        self._reserve(len(nodes), vectors.shape[1])
+        start, end = self._size, self._size + len(nodes)
+        self._vectors[start:end] = vectors
+        if scales is not None:
+            self._scales[start:end] = scales
+        self._alive[start:end] = True
+        for row, node in enumerate(nodes, start):
+            self._ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id or "None")
+            self._rows[node.node_id] = row
+            self._doc_rows.setdefault(self._ref_doc_ids[-1], []).append(row)
+        self._size = end
+        return [node.node_id for node in nodes]
+
+    async def async_add(self, nodes, **kwargs):
+        return self.add(nodes, **kwargs)
+
+    def delete(self, ref_doc_id, **delete_kwargs):
+        """Delete the nodes of a document. Rows are only marked, and compacted in bulk later."""
+        for row in self._doc_rows.pop(ref_doc_id, []):
+            if self._alive[row]:
+                self._alive[row] = False
+                del self._rows[self._ids[row]]
+        if self._size and len(self._rows) < (1 - COMPACT_RATIO) * self._size:
+            self._compact()
+
+    async def adelete(self, ref_doc_id, **delete_kwargs):
+        self.delete(ref_doc_id, **delete_kwargs)
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._vectors = np.ascontiguousarray(self._vectors[keep])
+        if self._scales is not None:
+            self._scales = np.ascontiguousarray(self._scales[keep])
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._ids = [self._ids[row] for row in keep]
+        self._ref_doc_ids = [self._ref_doc_ids[row] for row in keep]
+        self._size = len(keep)
+        self._index_rows()
+
+    def _index_rows(self):
+        self._rows = {node_id: row for row, node_id in enumerate(self._ids)}
+        self._doc_rows = {}
+        for row, doc_id in enumerate(self._ref_doc_ids):
+            self._doc_rows.setdefault(doc_id, []).append(row)
+
+    def get(self, text_id):
+        """Return the stored (normalized, dequantized) embedding of a node."""
+        row = self._rows[text_id]
+        vector = self._vectors[row].astype(np.float32)
+        if self._scales is not None:
+            vector *= self._scales[row]
+        return vector.tolist()
+
+    def _scores(self, query):
+        scores = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, QUERY_CHUNK_ROWS):
+            end = min(start + QUERY_CHUNK_ROWS, self._size)
+            block = self._vectors[start:end]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            scores[start:end] = block @ query
+        if self._scales is not None:
+            scores *= self._scales[:self._size]
+        return scores
+
+    def query(self, query, **kwargs):
+        """Return the ids and cosine similarities of the top k nodes."""
+        from llama_index.vector_stores.types import VectorStoreQueryMode, VectorStoreQueryResult
+
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Unsupported query mode: {query.mode}")
+        if query.filters is not None:
+            raise ValueError("Metadata filters are not supported by NumpyVectorStore")
+        if not self._rows:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        vector = np.asarray(query.query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        scores = self._scores(vector / norm if norm else vector)
+
+        mask = self._alive[:self._size].copy()
+        if query.node_ids is not None:
+            mask &= np.isin(np.arange(self._size), [self._rows[i] for i in query.node_ids if i in self._rows])
+        if query.doc_ids is not None:
+            mask &= np.isin(np.asarray(self._ref_doc_ids[:self._size], dtype=object), query.doc_ids)
+        scores[~mask] = -np.inf
+
+        k = min(query.similarity_top_k, int(mask.sum()))
+        if k <= 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return VectorStoreQueryResult(similarities=scores[top].tolist(), ids=[self._ids[row] for row in top])
+
+    def persist(self, persist_path, fs=None):
+        """
+        Write the embeddings to <name>.npy and the ids to the JSON file the storage context expects.
+        """
+        if self._size and len(self._rows) < self._size:
+            self._compact()
+        json_path, vectors_path, scales_path = _paths(persist_path)
+        os.makedirs(os.path.dirname(json_path) or ".", exist_ok=True)
+        dim = self._vectors.shape[1] if self._vectors is not None else 0
+        arrays = [(vectors_path, self._vectors[:self._size] if self._vectors is not None
+                   else np.empty((0, 0), dtype=self.dtype))]
+        if self.dtype == "int8":
+            # also for an empty store, which has no scales yet, from_persist_path loads them for int8
+            arrays.append((scales_path, self._scales[:self._size] if self._scales is not None
+                           else np.empty(0, dtype=np.float32)))
+        for path, array in arrays:
+            # a new file instead of writing through a memory map that may point to it
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(path + ".tmp", path)
+        with open(json_path, "w") as f:
+            json.dump({"format": "numpy", "dtype": self.dtype, "dim": dim,
+                       "ids": self._ids[:self._size], "ref_doc_ids": self._ref_doc_ids[:self._size]}, f)
+
+    @classmethod
+    def from_persist_path(cls, persist_path, mmap=True):
+        json_path, vectors_path, scales_path = _paths(persist_path)
+        with open(json_path, "r") as f:
+            data = json.load(f)
+        store = cls(data["dtype"])
+        mmap_mode = "r" if mmap else None
+        store._vectors = np.load(vectors_path, mmap_mode=mmap_mode)
+        # empty int8 stores persisted by older versions have no scales file
+        if data["dtype"] == "int8" and (data["ids"] or os.path.exists(scales_path)):
+            store._scales = np.load(scales_path, mmap_mode=mmap_mode)
+        store._size = len(data["ids"])
+        store._alive = np.ones(store._size, dtype=bool)
+        store._ids = data["ids"]
+        store._ref_doc_ids = data["ref_doc_ids"]
+        store._index_rows()
+        return store
+
+    @classmethod
+    def from_embeddings(cls, embedding_dict, ref_doc_ids, dtype=DEFAULT_DTYPE):
+        """
+        Build a store from the data of a SimpleVectorStore.
+        Args:
+        - embedding_dict (dict): Node id -> embedding
+        - ref_doc_ids (dict): Node id -> document id
+        - dtype (str): One of DTYPES
+        """
+        store = cls(dtype)
+        if embedding_dict:
+            ids = list(embedding_dict)
+            vectors, scales = _quantize([embedding_dict[i] for i in ids], dtype)
+            store._vectors, store._scales = vectors, scales
+            store._size = len(ids)
+            store._alive = np.ones(len(ids), dtype=bool)
+            store._ids = ids
+            store._ref_doc_ids = [ref_doc_ids.get(i, "None") for i in ids]
+            store._index_rows()
+        return store
+
+
+def load_vector_store(persist_dir, namespace="default", dtype=DEFAULT_DTYPE):
+    """
+    Load the vector store of a persisted index as a NumpyVectorStore.
+    Indexes persisted with the default SimpleVectorStore are converted in memory.
+    Args:
+    - persist_dir (str): Directory the index was persisted to
+    - namespace (str): Vector store namespace
+    - dtype (str): Storage type for converted stores
+    Returns:
+    - NumpyVectorStore or None: None if the directory has no vector store
+    """
+    json_path = os.path.join(persist_dir, f"{namespace}{_NAMESPACE_SEP}{_PERSIST_FNAME}")
+    if not os.path.exists(json_path):
+        # stores persisted by old llama_index versions have no namespace prefix
+        json_path = os.path.join(persist_dir, _PERSIST_FNAME)
+        if not os.path.exists(json_path):
+            return None
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    if data.get("format") == "numpy":
+        return NumpyVectorStore.from_persist_path(json_path)
+    return NumpyVectorStore.from_embeddings(data.get("embedding_dict", {}),
+                                            data.get("text_id_to_ref_doc_id", {}), dtype)
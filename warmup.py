@@ -0,0 +1,92 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+from tracing import Tracer
+
+
+# imported on first use by the pipeline, see pipeline.get_service_context, make_source and pdf_export
+HEAVY_MODULES = ("openai", "llama_index", "llama_index.llms", "llama_index.chat_engine", "llama_hub.github_repo",
+                 "markdown", "pdfkit")
+DEFAULT_MODEL = os.getenv("GITDOC_WARMUP_MODEL", "gpt-4")
+
+_ready = threading.Event()
+
+
+def is_ready():
+    """Whether a warm-up has finished in this process."""
+    return _ready.is_set()
+
+
+def warmup(model=DEFAULT_MODEL, tracer=None, modules=HEAVY_MODULES):
+    """
+    Load the heavy dependencies and build the shared resources ahead of the first request.
+
+    Imports the modules the pipeline loads lazily, loads the tokenizer used to pack embedding
+    requests and, when OPENAI_API_KEY is set, builds the shared service context with the LLM
+    client and embedding model of `model`. Every step is recorded as a warmup span; a failing
+    step is recorded and the next one still runs.
+    Args:
+    - model (str): OpenAI chat model of the service context
+    - tracer (Tracer): Tracer the spans are recorded on
+    - modules (tuple): Modules to import
+    Returns:
+    - dict: Step name -> {"seconds", "error"}
+    """
+    from embedding import get_encoding
+    from pipeline import get_service_context
+
+    tracer = tracer if tracer is not None else Tracer()
+    steps = [(f"import {name}", lambda name=name: importlib.import_module(name)) for name in modules]
+    steps.append(("tokenizer", get_encoding))
+    if os.getenv("OPENAI_API_KEY"):
+        # without a key the embedding model cannot be built, the app then builds it with the key of the session
+        steps.append((f"service_context {model}", lambda: get_service_context(model)))
+
+    report = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        error = None
+        try:
+            step()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - started
+        tracer.record("warmup", seconds, error=error, step=name)
+        report[name] = {"seconds": seconds, "error": error}
+    _ready.set()
+    return report
+
+
+def start_warmup(model=DEFAULT_MODEL, tracer=None):
+    """
+    Run warmup on a background thread, so the first page renders while the dependencies load.
+    Returns:
+    - threading.Thread: The warm-up thread, is_ready() turns true when it finishes
+    """
+    thread = threading.Thread(target=warmup, kwargs={"model": model, "tracer": tracer}, name="gitdoc-warmup",
+                              daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the heavy dependencies and the tokenizer ahead of the first "
+                                                 "request and report the time of each step as JSON. Run at image "
+                                                 "build time, it also stores the tokenizer in TIKTOKEN_CACHE_DIR.")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    report = warmup(args.model)
+    json.dump({"seconds": time.perf_counter() - started, "steps": report}, sys.stdout, indent=2)
+    print()
+    return 0 if all(step["error"] is None for step in report.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())